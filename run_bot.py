@@ -1,11 +1,33 @@
-from dotenv import load_dotenv
+from src.utils import startup_timer
 import os
-from src.bot import main
+
+
+def load_env() -> None:
+    """加载 .env 文件；dotenv 只在这里导入，spawn 子进程重新导入本模块时不会加载"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
 
 if __name__ == "__main__":
-    load_dotenv()  # 加载 .env 文件
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not token:
-        raise ValueError("请设置环境变量 TELEGRAM_BOT_TOKEN")
-    
-    main(token)
+    load_env()
+    startup_timer.mark("加载 .env")
+    # 在加载环境变量之后再导入，telegram 等依赖的导入占冷启动的大部分时间
+    from src.bot import main, main_multi
+    startup_timer.mark("导入模块")
+
+    # 多机器人模式: TELEGRAM_BOTS=名称1=token1,名称2=token2
+    bots_config = os.getenv("TELEGRAM_BOTS")
+    if bots_config:
+        bots = []
+        for item in bots_config.split(","):
+            name, _, token = item.strip().partition("=")
+            if not name or not token:
+                raise ValueError(f"TELEGRAM_BOTS 格式错误: {item}")
+            bots.append((name.strip(), token.strip()))
+        main_multi(bots)
+    else:
+        token = os.getenv("TELEGRAM_BOT_TOKEN")
+        if not token:
+            raise ValueError("请设置环境变量 TELEGRAM_BOT_TOKEN")
+        
+        main(token)
@@ -0,0 +1,104 @@
+"""快照写入与冷启动读取的基准测试
+
+用法: python scripts/bench_snapshot.py [群组数量 ...]
+默认分别测试 10k / 100k / 1M 个群组（用户数量与群组相同）。
+"""
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.chat_group import ChatGroup
+from src.models.user import User
+from src.repositories.journal_persistence import (
+    LEGACY_SNAPSHOT_VERSION,
+    SNAPSHOT_CODECS,
+    _empty_state,
+    _load_snapshot,
+    _write_snapshot,
+    zstandard,
+)
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+
+def build_state(group_count: int) -> dict:
+    """生成与线上结构一致的合成 bot_data"""
+    now = int(time.time())
+    groups = {}
+    users = {}
+    for i in range(group_count):
+        group_id = -1_000_000_000_000 - i
+        groups[str(group_id)] = ChatGroup(
+            id=group_id,
+            title=f"group-{i}",
+            type='supergroup',
+            is_ad_group=random.random() < 0.05,
+            joined_at=now - i,
+        ).encode()
+        users[i + 1] = User(
+            id=i + 1,
+            is_admin=i < 3,
+            joined_at=now - i,
+            username=f"user{i}",
+            first_name=f"name{i}",
+        ).encode()
+    state = _empty_state()
+    state['bot_data'] = {
+        'groups': groups,
+        'users': users,
+        'ads': {},
+        'ad_order': [],
+        'banned_words': [],
+        'settings': {'target_channel_id': -1001234567890},
+        'record_format': 1,
+    }
+    return state
+
+
+def write_legacy(path: Path, state: dict) -> None:
+    with path.open('wb') as file:
+        pickle.dump((LEGACY_SNAPSHOT_VERSION, state), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def bench(group_count: int, directory: Path) -> None:
+    state = build_state(group_count)
+    print(f"\n== {group_count:,} 个群组 / {group_count:,} 个用户 ==")
+    print(f"{'格式':<10}{'大小(MB)':>12}{'写入(s)':>10}{'读取(s)':>10}")
+
+    writers = [('pickle', write_legacy)]
+    for codec in SNAPSHOT_CODECS.values():
+        if codec == 'zstd' and zstandard is None:
+            continue
+        writers.append((codec, lambda path, data, codec=codec: _write_snapshot(path, data, codec)))
+
+    for name, writer in writers:
+        path = directory / f"bench-{name}.snapshot"
+        started = time.perf_counter()
+        writer(path, state)
+        write_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        loaded = _load_snapshot(path)
+        load_seconds = time.perf_counter() - started
+        assert len(loaded['bot_data']['groups']) == group_count
+
+        size_mb = path.stat().st_size / 1024 / 1024
+        print(f"{name:<10}{size_mb:>12.2f}{write_seconds:>10.2f}{load_seconds:>10.2f}")
+        path.unlink()
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            bench(size, Path(directory))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ from telegram.ext import ContextTypes
 from src.services.ad_service import AdService
 from src.api.handlers.base_handler import BaseHandler, admin_required
 from src.utils.logger import log_telegram
+from datetime import datetime
 
 class AdHandler(BaseHandler):
     def __init__(self, application):
@@ -124,7 +125,7 @@ class AdHandler(BaseHandler):
                 f"欢迎语: {ad.welcome_text}\n"
                 f"广告语: {ad.ad_text}\n"
                 f"按钮列表:\n{buttons_info}\n"
-                f"创建时间: {ad.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
+                f"创建时间: {datetime.fromtimestamp(ad.created_at).strftime('%Y-%m-%d %H:%M:%S')}"
             )
             await update.message.reply_text(message)
             log_telegram(f"User {update.message.from_user.id} listed all ads")
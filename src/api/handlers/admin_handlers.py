@@ -4,7 +4,11 @@ from src.services.admin_service import AdminService
 from src.api.handlers.base_handler import BaseHandler, admin_required
 from src.utils.logger import log_telegram, log_error
 from src.services.message_service import MessageService
+from src.services.campaign_scheduler import DEFAULT_AD_SCHEDULE, get_campaign_scheduler
 from src.models.chat_group import ChatGroup
+from src.api.handlers.banned_word_handlers import describe_scope, parse_options
+from src.utils.cron import CronError, CronExpression, QuietHours
+from datetime import datetime
 
 class AdminHandler(BaseHandler):
     def __init__(self, application):
@@ -123,15 +127,18 @@ class AdminHandler(BaseHandler):
                     is_ad_group=True
                 )
             else:
-                # 如果群组存在，更新其广告群状态
+                # 如果群组存在，更新其广告群状态（已停用的群组重新启用）
                 group.is_ad_group = True
+                group.is_active = True
+                group.failure_count = 0
             
             # 保存群组信息
             success = await self.repository.save_group(group)
             
-            # 设置为目标群组
+            # 设置为目标群组，并让投放调度器加入新的广告群
             if success:
                 await self.repository.set_target_group(target_group_id)
+                get_campaign_scheduler(self.app).request_reload()
             
             # 验证保存结果
             saved_group = await self.repository.get_group(target_group_id)
@@ -162,6 +169,8 @@ class AdminHandler(BaseHandler):
         try:
             target_channel_id = int(context.args[0])
             await self.repository.set_target_channel(target_channel_id)
+            # 后台预先获取新频道的信息和链接，提醒消息无需再请求
+            MessageService(self.repository).refresh_channel_info(context.bot)
             await self.send_success_message(update, f"已成功设置目标频道ID为：{target_channel_id}")
         except ValueError:
             await self.send_error_message(update, "无效的频道ID，请提供正确的数字ID。")
@@ -181,9 +190,12 @@ class AdminHandler(BaseHandler):
             "广告管理命令:\n"
             "• /add_ad - 添加新广告\n"
             "• /list_ads - 查看所有广告\n"
-            "• /delete_ad - 删除指定广告\n\n"
+            "• /delete_ad - 删除指定广告\n"
+            "• /set_schedule [--here | --chat=<群组ID>] <cron 表达式 | default> - 设置投放时间\n"
+            "• /set_quiet_hours <HH:MM-HH:MM | off> - 设置免打扰时段\n"
+            "• /show_schedule - 查看投放时间\n\n"
             "禁言管理命令:\n"
-            "• /add_banned_word - 添加禁言词\n"
+            "• /add_banned_word [--here | --chat=<群组ID>] [--word | --wildcard | --regex] - 添加禁言词（默认全局包含匹配）\n"
             "• /list_banned_words - 查看所有禁言词\n"
             "• /delete_banned_word - 删除禁言词\n\n"
             "其他命令:\n"
@@ -211,6 +223,7 @@ class AdminHandler(BaseHandler):
                     f"• 标题: {group.title}\n"
                     f"• 类型: {group.type}\n"
                     f"• 是否为广告群: {'是' if group.is_ad_group else '否'}"
+                    + ("" if group.is_active else "\n• 状态: 已停用（多次无法发送广告）")
                 )
             else:
                 await update.message.reply_text(
@@ -221,6 +234,17 @@ class AdminHandler(BaseHandler):
             log_error(e, "获取目标群组信息失败")
             await self.send_error_message(update, "获取目标群组信息失败")
 
+    def _subscription_cache_summary(self) -> str:
+        """订阅状态缓存的命中统计"""
+        stats = MessageService(self.repository).get_subscription_stats()
+        return (
+            f"• 订阅缓存: {stats['size']}/{stats['maxsize']} 条，"
+            f"命中 {stats['hits']} 次，未命中 {stats['misses']} 次，"
+            f"命中率 {stats['hit_rate']:.0%}\n"
+            f"• 成员查询: 请求 {stats['requests']} 次，合并并发查询 {stats['coalesced']} 次\n"
+            f"• 成员表: {stats['members_known']} 人，命中 {stats['member_hits']} 次"
+        )
+
     @admin_required
     async def handle_show_target_channel(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """处理 /show_target_channel 命令"""
@@ -238,12 +262,14 @@ class AdminHandler(BaseHandler):
                     f"• ID: {channel.id}\n"
                     f"• 标题: {channel.title}\n"
                     f"• 类型: {channel.type}\n"
-                    f"• 用户名: @{channel.username or '无'}"
+                    f"• 用户名: @{channel.username or '无'}\n"
+                    f"{self._subscription_cache_summary()}"
                 )
             except Exception as e:
                 await update.message.reply_text(
                     f"📍 当前目标频道ID：{target_channel_id}\n"
-                    "⚠️ 注意：无法获取该频道的详细信息"
+                    "⚠️ 注意：无法获取该频道的详细信息\n"
+                    f"{self._subscription_cache_summary()}"
                 )
         except Exception as e:
             log_error(e, "获取目标频道信息失败")
@@ -267,6 +293,112 @@ class AdminHandler(BaseHandler):
         except Exception as e:
             await self.send_error_message(update, f"操作失败: {str(e)}")
 
+    @admin_required
+    async def handle_set_schedule(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """处理 /set_schedule 命令"""
+        try:
+            chat_id, _, args = parse_options(update, context.args or [])
+        except ValueError as e:
+            await self.send_error_message(update, str(e))
+            return
+        if not args:
+            await self.send_error_message(
+                update,
+                "请提供投放时间（cron 表达式：分 时 日 月 星期）\n"
+                "用法: /set_schedule [--here | --chat=<群组ID>] <cron 表达式 | default>\n"
+                f"例如: /set_schedule {DEFAULT_AD_SCHEDULE}（每两小时整点）\n"
+                "不带群组选项时设置全局投放时间，default 表示恢复默认"
+            )
+            return
+
+        expression = ' '.join(args)
+        schedule = None if expression == 'default' else expression
+        if schedule:
+            try:
+                CronExpression(schedule).next_after(datetime.now())
+            except CronError as e:
+                await self.send_error_message(update, f"无效的投放时间: {e}")
+                return
+
+        try:
+            if chat_id is None:
+                success = await self.repository.set_ad_schedule(schedule)
+            else:
+                group = await self.repository.get_group(chat_id)
+                if not group or not group.is_ad_group:
+                    await self.send_error_message(update, f"群组 {chat_id} 不是广告群")
+                    return
+                group.schedule = schedule
+                success = await self.repository.save_group(group)
+            if not success:
+                await self.send_error_message(update, "设置投放时间失败")
+                return
+            get_campaign_scheduler(self.app).request_reload()
+            await self.send_success_message(
+                update,
+                f"已将{describe_scope(chat_id)}的投放时间设置为: {schedule or '默认'}"
+            )
+        except Exception as e:
+            log_error(e, "设置投放时间失败")
+            await self.send_error_message(update, "设置投放时间失败")
+
+    @admin_required
+    async def handle_set_quiet_hours(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """处理 /set_quiet_hours 命令"""
+        if not context.args:
+            await self.send_error_message(
+                update,
+                "请提供免打扰时段\n"
+                "用法: /set_quiet_hours <HH:MM-HH:MM | off>\n"
+                "例如: /set_quiet_hours 23:00-08:00"
+            )
+            return
+
+        value = context.args[0]
+        quiet_hours = None
+        if value != 'off':
+            try:
+                quiet_hours = str(QuietHours.parse(value))
+            except CronError as e:
+                await self.send_error_message(update, str(e))
+                return
+
+        if await self.repository.set_quiet_hours(quiet_hours):
+            get_campaign_scheduler(self.app).request_reload()
+            await self.send_success_message(
+                update,
+                f"已设置免打扰时段: {quiet_hours}" if quiet_hours else "已关闭免打扰时段"
+            )
+        else:
+            await self.send_error_message(update, "设置免打扰时段失败")
+
+    @admin_required
+    async def handle_show_schedule(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """处理 /show_schedule 命令"""
+        try:
+            schedule = await self.repository.get_ad_schedule()
+            quiet_hours = await self.repository.get_quiet_hours()
+            ad_groups = await MessageService(self.repository).get_ad_groups()
+            scheduler = get_campaign_scheduler(self.app)
+            next_send_at = scheduler.next_send_at()
+
+            lines = [
+                "广告投放时间：",
+                f"• 全局: {schedule or DEFAULT_AD_SCHEDULE}{'' if schedule else '（默认）'}",
+                f"• 免打扰时段: {quiet_hours or '无'}",
+                f"• 错开窗口: {scheduler.stagger_window // 60} 分钟",
+                f"• 已调度群组: {scheduler.scheduled_groups}/{len(ad_groups)}",
+                f"• 下一次发送: {next_send_at.strftime('%m-%d %H:%M:%S') if next_send_at else '无'}",
+            ]
+            custom = [group for group in ad_groups if group.schedule]
+            if custom:
+                lines.append("\n单独设置的群组：")
+                lines.extend(f"• {group.title} ({group.id}): {group.schedule}" for group in custom)
+            await update.message.reply_text("\n".join(lines))
+        except Exception as e:
+            log_error(e, "获取投放时间失败")
+            await self.send_error_message(update, "获取投放时间失败")
+
     async def handle_get_id(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """处理 /getid 命令"""
         if not update.effective_chat:
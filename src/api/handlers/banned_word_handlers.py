@@ -1,7 +1,48 @@
+from typing import List, Optional, Tuple
 from telegram import Update
 from telegram.ext import ContextTypes
 from src.api.handlers.base_handler import BaseHandler, admin_required
 from src.services.banned_word_service import BannedWordService
+from src.utils.pattern_rules import MATCH_SUBSTRING, MATCH_TYPE_NAMES, MATCH_TYPES
+
+SCOPE_USAGE = (
+    "选项: --here 仅当前群组生效，--chat=<群组ID> 仅指定群组生效，"
+    "不指定时全局生效"
+)
+MATCH_TYPE_USAGE = (
+    "规则类型: --word 整词匹配，--wildcard 通配符（* 任意字符，? 单个字符），"
+    "--regex 正则表达式（匹配转小写、全角/繁体等归一化后保留标点的文本），不指定时为包含匹配"
+)
+
+
+def parse_options(update: Update, args: List[str]) -> Tuple[Optional[int], str, List[str]]:
+    """解析命令中的选项，返回 (群组ID 或 None, 规则类型, 剩余参数)"""
+    chat_id = None
+    match_type = MATCH_SUBSTRING
+    rest = []
+    args = iter(args)
+    for arg in args:
+        if arg.startswith('--') and arg[2:] in MATCH_TYPES:
+            match_type = arg[2:]
+        elif arg == '--here':
+            if not update.effective_chat or update.effective_chat.type == 'private':
+                raise ValueError("--here 只能在群组中使用")
+            chat_id = update.effective_chat.id
+        elif arg == '--global':
+            chat_id = None
+        elif arg == '--chat' or arg.startswith('--chat='):
+            value = arg.partition('=')[2] or next(args, '')
+            try:
+                chat_id = int(value)
+            except ValueError:
+                raise ValueError(f"无效的群组ID: {value}")
+        else:
+            rest.append(arg)
+    return chat_id, match_type, rest
+
+
+def describe_scope(chat_id: Optional[int]) -> str:
+    return "全局" if chat_id is None else f"群组 {chat_id}"
 
 class BannedWordHandler(BaseHandler):
     def __init__(self, application):
@@ -11,19 +52,32 @@ class BannedWordHandler(BaseHandler):
     @admin_required
     async def handle_add_banned_word(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """处理添加禁言词命令"""
-        if not context.args:
+        try:
+            chat_id, match_type, args = parse_options(update, context.args or [])
+        except ValueError as e:
+            await self.send_error_message(update, str(e))
+            return
+        if not args:
             await self.send_error_message(
                 update,
                 "请提供要禁用的关键词\n"
-                "用法: /add_banned_word <关键词>"
+                "用法: /add_banned_word [选项] <关键词>\n"
+                f"{SCOPE_USAGE}\n"
+                f"{MATCH_TYPE_USAGE}"
             )
             return
         
-        word = ' '.join(context.args).lower()
-        if await self.banned_word_service.add_banned_word(word, update.effective_user.id):
-            await self.send_success_message(update, f"已添加禁言词: {word}")
-        else:
-            await self.send_error_message(update, "添加禁言词失败")
+        word = ' '.join(args)
+        error = await self.banned_word_service.add_banned_word(
+            word, update.effective_user.id, chat_id, match_type
+        )
+        if error:
+            await self.send_error_message(update, f"无法添加禁言词: {error}")
+            return
+        await self.send_success_message(
+            update,
+            f"已添加{describe_scope(chat_id)}禁言词（{MATCH_TYPE_NAMES[match_type]}）: {word}"
+        )
     
     @admin_required
     async def handle_list_banned_words(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -33,26 +87,37 @@ class BannedWordHandler(BaseHandler):
             await update.message.reply_text("当前没有禁言词")
             return
         
-        words_list = "\n".join([f"- {word.word}" for word in banned_words])
+        words_list = "\n".join([
+            f"- {word.word}"
+            + ("" if word.match_type == MATCH_SUBSTRING else f" [{MATCH_TYPE_NAMES.get(word.match_type, word.match_type)}]")
+            + ("" if word.chat_id is None else f"（群组 {word.chat_id}）")
+            for word in banned_words
+        ])
         await update.message.reply_text(
             f"📋 禁言词列表：\n{words_list}\n\n"
             "删除禁言词请使用：\n"
-            "/delete_banned_word <关键词>"
+            "/delete_banned_word [--here | --chat=<群组ID>] <关键词>"
         )
     
     @admin_required
     async def handle_delete_banned_word(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """处理删除禁言词命令"""
-        if not context.args:
+        try:
+            chat_id, _, args = parse_options(update, context.args or [])
+        except ValueError as e:
+            await self.send_error_message(update, str(e))
+            return
+        if not args:
             await self.send_error_message(
                 update,
                 "请提供要删除的关键词\n"
-                "用法: /delete_banned_word <关键词>"
+                "用法: /delete_banned_word [选项] <关键词>\n"
+                f"{SCOPE_USAGE}"
             )
             return
         
-        word = ' '.join(context.args).lower()
-        if await self.banned_word_service.delete_banned_word(word):
-            await self.send_success_message(update, f"已删除禁言词: {word}")
+        word = ' '.join(args)
+        if await self.banned_word_service.delete_banned_word(word, chat_id):
+            await self.send_success_message(update, f"已删除{describe_scope(chat_id)}禁言词: {word}")
         else:
-            await self.send_error_message(update, f"删除失败：未找到禁言词 {word}") 
\ No newline at end of file
+            await self.send_error_message(update, f"删除失败：未找到{describe_scope(chat_id)}禁言词 {word}") 
\ No newline at end of file
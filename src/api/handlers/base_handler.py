@@ -1,7 +1,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from src.services.admin_service import AdminService
-from src.repositories.data_repository import DataRepository
+from src.repositories.repository_factory import create_repository
 from src.utils.logger import log_error
 from functools import wraps
 from typing import Callable, Any
@@ -13,7 +13,7 @@ def admin_required(func: Callable) -> Callable:
         if not update.effective_user:
             return
             
-        repository = DataRepository(context.application)
+        repository = create_repository(context.application)
         admin_service = AdminService(repository)
         
         if not await admin_service.is_admin(update.effective_user.id):
@@ -28,7 +28,7 @@ class BaseHandler:
     
     def __init__(self, application):
         self.app = application
-        self.repository = DataRepository(application)
+        self.repository = create_repository(application)
     
     async def send_error_message(self, update: Update, message: str) -> None:
         """发送错误消息"""
@@ -1,12 +1,12 @@
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import ContextTypes
-from src.models.chat_group import ChatGroup
+from telegram import Message, MessageEntity, Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
 from src.services.ad_service import AdService
+from src.services.broadcast_service import BroadcastService
 from src.services.message_service import MessageService
 from src.api.handlers.base_handler import BaseHandler
+from src.utils.deletion_queue import get_deletion_queue
 from src.utils.logger import log_info, log_error, log_warning
 from datetime import datetime
-import asyncio
 from src.services.banned_word_service import BannedWordService
 
 class MessageHandler(BaseHandler):
@@ -40,6 +40,50 @@ class MessageHandler(BaseHandler):
             # 如果发送错误消息时出现问题，记录该错误
             log_error(f"Failed to send error message to admin: {e}")
     
+    @staticmethod
+    def _moderation_text(message: Message) -> str:
+        """拼接需要检查的内容：正文或说明文字，以及文字链接背后的网址"""
+        parts = [message.text or message.caption or '']
+        entities = message.entities or message.caption_entities
+        parts.extend(
+            entity.url for entity in entities
+            if entity.type == MessageEntity.TEXT_LINK and entity.url
+        )
+        return '\n'.join(parts)
+
+    async def handle_moderation(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """检查群组中的文本、说明文字和编辑后的消息是否包含禁言词，每条更新只匹配一次"""
+        message = update.effective_message
+        chat = update.effective_chat
+        user = update.effective_user
+        if not message or not chat or not user:
+            return
+
+        text = self._moderation_text(message)
+        if not text:
+            return
+
+        match = await self.banned_word_service.find_match(text, chat.id)
+        if not match:
+            return
+
+        rules = "、".join(match.rules) or "直接匹配"
+        source = "编辑后的消息" if update.edited_message else "消息"
+        log_info(f"群组 {chat.id} 用户 {user.id} 的{source}命中禁言词 {match.word}（{rules}）")
+        # 刷屏时同一群组的删除会合并为一次 deleteMessages
+        deletion_queue = get_deletion_queue(context.application)
+        deletion_queue.delete(chat.id, message.message_id)
+        try:
+            warning = await context.bot.send_message(
+                chat_id=chat.id,
+                text=f"⚠️ {user.first_name}，您的消息包含禁用词，已被删除。"
+            )
+            deletion_queue.delete_later(chat.id, warning.message_id, 10)
+        except Exception as e:
+            log_error(e, "处理禁言消息失败")
+        # 消息已加入删除队列，不再交给后续处理器
+        raise ApplicationHandlerStop
+
     async def handle_new_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """处理新消息"""
         if not update.effective_chat or not update.effective_user or not update.message or not update.message.text:
@@ -48,46 +92,19 @@ class MessageHandler(BaseHandler):
         chat = update.effective_chat
         user = update.effective_user
         
-        # 检查消息是否包含禁言词
-        if await self.banned_word_service.check_message(update.message.text):
-            try:
-                await update.message.delete()
-                warning = await context.bot.send_message(
-                    chat_id=chat.id,
-                    text=f"⚠️ {user.first_name}，您的消息包含禁用词，已被删除。"
-                )
-                asyncio.create_task(self._delete_message_later(warning, 10))
-                return
-            except Exception as e:
-                log_error(e, "处理禁言消息失败")
-        
         log_info(f"收到群组 {chat.title} ({chat.id}) 的消息")
         
-        # 获取并更新群组信息
-        existing_group = await self.repository.get_group(chat.id)
-        if existing_group:
-            existing_group.title = chat.title
-            existing_group.type = chat.type
-            group = existing_group
-        else:
-            group = ChatGroup(
-                id=chat.id,
-                title=chat.title,
-                type=chat.type,
-                is_ad_group=False
-            )
-        
-        await self.repository.save_group(group)
+        # 更新群组信息（标题和类型未变化时不会写入）
+        group = await self.repository.update_group_info(chat.id, chat.title, chat.type)
         
         # 如果是广告群，检查用户是否关注了目标频道
-        if group.is_ad_group and update.message:
+        if group and group.is_ad_group and update.message:
             # 先检查频道验证功能是否启用
             verification_enabled = await self.repository.get_channel_verification_status()
             if not verification_enabled:
                 return
 
-            settings = self.repository.app.bot_data.get('settings', {})
-            target_channel_id = settings.get('target_channel_id')
+            target_channel_id = await self.repository.get_target_channel_id()
             
             if not target_channel_id:
                 log_warning("未设置目标频道ID")
@@ -98,30 +115,9 @@ class MessageHandler(BaseHandler):
             is_subscribed = await self.message_service.check_channel_subscription(user.id, context.bot)
             if not is_subscribed:
                 try:
-                    # 尝试获取频道信息
-                    try:
-                        channel = await context.bot.get_chat(target_channel_id)
-                        log_info(f"成功获取频道信息: {channel.title} ({channel.id})")
-                    except Exception as e:
-                        log_error(e, f"获取频道信息失败: {target_channel_id}")
-                        # 如果获取频道信息失败，仍然尝试创建链接
-                        channel = None
-                    
-                    # 创建频道链接
-                    if channel and channel.username:
-                        channel_link = f"https://t.me/{channel.username}"
-                    else:
-                        # 移除 -100 前缀（如果存在）
-                        clean_channel_id = str(target_channel_id)
-                        if clean_channel_id.startswith('-100'):
-                            clean_channel_id = clean_channel_id[4:]
-                        channel_link = f"https://t.me/c/{clean_channel_id}"
-                    
-                    log_info(f"创建的频道链接: {channel_link}")
-                    
-                    # 创建提醒消息的按钮
-                    keyboard = [[InlineKeyboardButton("点击关注频道", url=channel_link)]]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
+                    # 频道信息和提醒按钮已缓存，不必每次请求 get_chat
+                    channel_info = await self.message_service.get_channel_info(context.bot)
+                    reply_markup = channel_info.reply_markup
                     
                     # 发送提醒消息
                     reminder = await context.bot.send_message(
@@ -132,26 +128,26 @@ class MessageHandler(BaseHandler):
                         reply_markup=reply_markup
                     )
                     
-                    # 删除用户的消息
-                    try:
-                        await update.message.delete()
-                    except Exception as e:
-                        log_error(e, "删除消息失败")
-                    
-                    # 设置定时删除提醒消息
-                    asyncio.create_task(self._delete_message_later(reminder, 30))
+                    # 删除用户的消息，并设置定时删除提醒消息
+                    deletion_queue = get_deletion_queue(context.application)
+                    deletion_queue.delete(chat.id, update.message.message_id)
+                    deletion_queue.delete_later(chat.id, reminder.message_id, 30)
                     
                 except Exception as e:
                     log_error(e, "发送频道订阅提醒失败")
     
-    async def _delete_message_later(self, message, delay_seconds: int):
-        """延迟删除消息"""
-        await asyncio.sleep(delay_seconds)
-        try:
-            await message.delete()
-        except Exception as e:
-            log_error(e, "删除提醒消息失败")
-    
+    async def handle_chat_member(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """根据目标频道的成员变化更新成员表（机器人需为频道管理员才能收到）"""
+        member_update = update.chat_member
+        if not member_update:
+            return
+        channel_id = member_update.chat.id
+        if channel_id != await self.repository.get_target_channel_id():
+            return
+        member = member_update.new_chat_member
+        self.message_service.record_channel_member(channel_id, member.user.id, member.status)
+        log_info(f"用户 {member.user.id} 在频道 {channel_id} 的状态变为 {member.status}")
+
     async def handle_join_request(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """处理加入请求"""
         # 实现加入请求的处理逻辑
@@ -171,44 +167,28 @@ class MessageHandler(BaseHandler):
             if not ad:
                 return
 
+            broadcast_service = BroadcastService(self.app)
+            reply_markup = AdService.build_reply_markup(ad)
+
             # 为每个新成员发送欢迎消息
             for new_member in update.message.new_chat_members:
                 # 如果是机器人自己，则跳过
                 if new_member.id == context.bot.id:
                     continue
 
-                # 创建欢迎消息的按钮，每行两个按钮
-                keyboard = []
-                row = []
-                for i, button in enumerate(ad.buttons):
-                    row.append(InlineKeyboardButton(button['text'], url=button['url']))
-                    # 每两个按钮或最后一个按钮时，添加到键盘
-                    if len(row) == 2 or i == len(ad.buttons) - 1:
-                        keyboard.append(row)
-                        row = []
-                reply_markup = InlineKeyboardMarkup(keyboard)
-
                 # 格式化欢迎消息
                 welcome_text = ad.welcome_text.format(
                     name=new_member.first_name,
                     username=new_member.username or new_member.first_name
                 )
 
-                # 根据广告类型发送不同的媒体消息
-                if ad.media_type == 'photo':
-                    await context.bot.send_photo(
-                        chat_id=update.effective_chat.id,
-                        photo=ad.media_id,
-                        caption=f"{welcome_text}\n\n{ad.ad_text}",
-                        reply_markup=reply_markup
-                    )
-                elif ad.media_type == 'video':
-                    await context.bot.send_video(
-                        chat_id=update.effective_chat.id,
-                        video=ad.media_id,
-                        caption=f"{welcome_text}\n\n{ad.ad_text}",
-                        reply_markup=reply_markup
-                    )
+                # 经发送队列发送，遇到限流或网络错误会自动重试
+                await broadcast_service.send_ad(
+                    update.effective_chat.id,
+                    ad,
+                    reply_markup,
+                    caption=f"{welcome_text}\n\n{ad.ad_text}"
+                )
 
                 log_info(f"已向新成员 {new_member.first_name} (ID: {new_member.id}) 发送欢迎消息")
 
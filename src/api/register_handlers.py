@@ -1,25 +1,64 @@
+import importlib
+from typing import Any, Callable, Coroutine, Optional
 from telegram.ext import (
     Application, 
+    ChatMemberHandler,
     CommandHandler, 
+    ContextTypes,
     MessageHandler as TelegramMessageHandler,
     filters
 )
-from src.api.handlers.admin_handlers import AdminHandler
-from src.api.handlers.ad_handlers import AdHandler
-from src.api.handlers.message_handlers import MessageHandler as CustomMessageHandler
-from src.api.handlers.banned_word_handlers import BannedWordHandler
+
+
+class LazyHandler:
+    """延迟创建的处理器：首次收到对应更新时才导入模块并创建实例，缩短启动时间"""
+
+    def __init__(self, application: Application, module_path: str, class_name: str):
+        self._application = application
+        self._module_path = module_path
+        self._class_name = class_name
+        self._instance: Optional[Any] = None
+
+    def _get_instance(self) -> Any:
+        if self._instance is None:
+            module = importlib.import_module(self._module_path)
+            self._instance = getattr(module, self._class_name)(self._application)
+        return self._instance
+
+    def __getattr__(self, name: str) -> Callable[..., Coroutine]:
+        """返回转发到真实处理器方法的回调"""
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def callback(update: object, context: ContextTypes.DEFAULT_TYPE) -> Any:
+            return await getattr(self._get_instance(), name)(update, context)
+
+        callback.__name__ = callback.__qualname__ = f"{self._class_name}.{name}"
+        return callback
+
 
 def register_handlers(application: Application) -> None:
     """注册所有处理器"""
-    # 创建处理器实例
-    admin_handler = AdminHandler(application)
-    ad_handler = AdHandler(application)
-    message_handler = CustomMessageHandler(application)
-    banned_word_handler = BannedWordHandler(application)
+    # 处理器实例在首次使用时创建
+    admin_handler = LazyHandler(application, "src.api.handlers.admin_handlers", "AdminHandler")
+    ad_handler = LazyHandler(application, "src.api.handlers.ad_handlers", "AdHandler")
+    message_handler = LazyHandler(application, "src.api.handlers.message_handlers", "MessageHandler")
+    banned_word_handler = LazyHandler(
+        application, "src.api.handlers.banned_word_handlers", "BannedWordHandler"
+    )
 
     # 注册错误处理器
     application.add_error_handler(message_handler.handle_bot_error)
     
+    # 禁言词检查在其他处理器之前运行，覆盖文本、说明文字和编辑后的消息
+    application.add_handler(TelegramMessageHandler(
+        filters.ChatType.GROUPS
+        & (filters.TEXT | filters.CAPTION)
+        & ~filters.COMMAND
+        & (filters.UpdateType.MESSAGE | filters.UpdateType.EDITED_MESSAGE),
+        message_handler.handle_moderation
+    ), group=-1)
+
     # 注册管理员命令
     application.add_handler(CommandHandler("admin", admin_handler.handle_admin_command))
     application.add_handler(CommandHandler("set_target", admin_handler.handle_set_target_command))
@@ -37,6 +76,9 @@ def register_handlers(application: Application) -> None:
     application.add_handler(CommandHandler("add_ad", ad_handler.handle_add_ad))
     application.add_handler(CommandHandler("list_ads", ad_handler.handle_list_ads))
     application.add_handler(CommandHandler("delete_ad", ad_handler.handle_delete_ad))
+    application.add_handler(CommandHandler("set_schedule", admin_handler.handle_set_schedule))
+    application.add_handler(CommandHandler("set_quiet_hours", admin_handler.handle_set_quiet_hours))
+    application.add_handler(CommandHandler("show_schedule", admin_handler.handle_show_schedule))
     
     # 注册消息处理器
     application.add_handler(TelegramMessageHandler(
@@ -49,6 +91,12 @@ def register_handlers(application: Application) -> None:
         message_handler.handle_new_message
     ))
 
+    # 目标频道成员变化，用于维护订阅状态
+    application.add_handler(ChatMemberHandler(
+        message_handler.handle_chat_member,
+        ChatMemberHandler.CHAT_MEMBER
+    ))
+
     # 注册新成员处理器
     application.add_handler(TelegramMessageHandler(
         filters.StatusUpdate.NEW_CHAT_MEMBERS,
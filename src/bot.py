@@ -1,41 +1,91 @@
 # src/bot.py
+import asyncio
 import os
+import signal
+from typing import List, Optional, Tuple
 from telegram import Update
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
-    PicklePersistence,
 )
-from datetime import time
 
 from src.api.register_handlers import register_handlers
-from src.repositories.data_repository import DataRepository
-from src.utils.logger import log_info
-from src.services.scheduler_service import send_next_ad
-from dotenv import load_dotenv
+from src.repositories.broadcast_journal import get_broadcast_journal
+from src.repositories.journal_persistence import JournalPersistence
+from src.repositories.repository_factory import create_repository, set_bot_name
+from src.utils import startup_timer
+from src.utils.deletion_queue import get_deletion_queue
+from src.utils.logger import log_info, log_error
+from src.utils.shared_request import SharedHTTPXRequest
+from src.services.campaign_scheduler import get_campaign_scheduler
 
-load_dotenv()
+# 多机器人模式下共享连接池的默认大小（环境变量在启动时读取，.env 由 run_bot.py 加载）
+DEFAULT_SHARED_POOL_SIZE = 32
 
-BOT_NAME = os.getenv("BOT_NAME")
 
-def main(telegram_token: str):
-    persistence = PicklePersistence(filepath=f"data/{BOT_NAME}.pkl")
+def build_application(
+    telegram_token: str,
+    bot_name: str,
+    request: Optional[SharedHTTPXRequest] = None,
+    get_updates_request: Optional[SharedHTTPXRequest] = None,
+    report_startup: bool = True,
+) -> Application:
+    """创建并配置一个机器人 application"""
+    persistence = JournalPersistence(
+        filepath=f"data/{bot_name}",
+        legacy_pickle_path=f"data/{bot_name}.pkl",
+    )
+
+    async def post_init(application: Application) -> None:
+        startup_timer.mark(f"{bot_name}: 初始化 Bot 与加载持久化数据")
+        # 加载持久化的 bot_data 后再初始化数据结构
+        await persistence.attach(application)
+        repository = create_repository(application)
+        # 只有 SQLite 仓库提供 import_bot_data，按属性判断以免在内存模式下导入 sqlite3
+        import_bot_data = getattr(repository, "import_bot_data", None)
+        if import_bot_data is not None:
+            # 首次切换到 SQLite 时导入旧数据，之后不再在 bot_data 中保留
+            if await import_bot_data(application.bot_data):
+                for key in ('groups', 'users', 'ads', 'ad_order', 'advertisements', 'banned_words',
+                            'settings', 'last_ad_index', 'record_format'):
+                    application.bot_data.pop(key, None)
+        startup_timer.mark(f"{bot_name}: 初始化数据仓库")
+        # 后台续发上次中断的广告投放，并开始按投放时间调度广告
+        get_campaign_scheduler(application).start()
+        if report_startup:
+            startup_timer.report()
+
+    async def post_stop(application: Application) -> None:
+        # 停止前删除已入队的消息
+        await get_deletion_queue(application).flush_all()
+        # 未完成的投放留在投放日志中，下次启动时继续
+        await get_campaign_scheduler(application).stop()
+        get_broadcast_journal(application).close()
     
-    application = (
+    builder = (
         ApplicationBuilder()
         .token(telegram_token)
         .concurrent_updates(True)
         .persistence(persistence)
-        .build()
+        .post_init(post_init)
+        .post_stop(post_stop)
+        # 广告由投放调度器发送，不需要 job queue
+        .job_queue(None)
     )
+    if request is not None:
+        builder = builder.request(request)
+    if get_updates_request is not None:
+        builder = builder.get_updates_request(get_updates_request)
+    application = builder.build()
 
-    data_manager = DataRepository(application)
-    data_manager._init_data_structure()
-
+    set_bot_name(application, bot_name)
     register_handlers(application)
-    
-    job_queue = application.job_queue
-    for hour in range(0, 24, 2):
-        job_queue.run_daily(send_next_ad, time=time(hour=hour, minute=0))
+    startup_timer.mark(f"{bot_name}: 创建 application 并注册处理器")
+    return application
+
+
+def main(telegram_token: str):
+    application = build_application(telegram_token, os.getenv("BOT_NAME"))
 
     try:
         application.run_polling(
@@ -49,4 +99,64 @@ def main(telegram_token: str):
             application.persistence.flush()
         application.stop()
     finally:
-        log_info("Bot 已停止")
\ No newline at end of file
+        log_info("Bot 已停止")
+
+
+def main_multi(bots: List[Tuple[str, str]]):
+    """在同一个事件循环中运行多个机器人，bots 为 (机器人名称, token) 列表"""
+    asyncio.run(_run_bots(bots))
+
+
+async def _run_bots(bots: List[Tuple[str, str]]) -> None:
+    # 所有机器人共享 API 请求连接池；长轮询每个机器人各占一个连接
+    pool_size = int(os.getenv("SHARED_POOL_SIZE", DEFAULT_SHARED_POOL_SIZE))
+    request = SharedHTTPXRequest(connection_pool_size=pool_size)
+    get_updates_request = SharedHTTPXRequest(connection_pool_size=len(bots) + 1)
+
+    applications = [
+        build_application(
+            token,
+            bot_name,
+            request=request,
+            get_updates_request=get_updates_request,
+            report_startup=False,
+        )
+        for bot_name, token in bots
+    ]
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    started: List[Application] = []
+    try:
+        for application in applications:
+            await application.initialize()
+            if application.post_init:
+                await application.post_init(application)
+            await application.updater.start_polling(
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True,
+            )
+            await application.start()
+            started.append(application)
+            log_info(f"Bot {application.bot.username} 已启动")
+        startup_timer.mark("启动轮询")
+        startup_timer.report()
+        await stop_event.wait()
+    except Exception as e:
+        log_error(e, "多机器人运行失败")
+    finally:
+        for application in reversed(started):
+            try:
+                if application.updater.running:
+                    await application.updater.stop()
+                if application.running:
+                    await application.stop()
+                    if application.post_stop:
+                        await application.post_stop(application)
+                await application.shutdown()
+            except Exception as e:
+                log_error(e, "停止机器人失败")
+        log_info("所有 Bot 已停止")
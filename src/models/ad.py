@@ -1,8 +1,9 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional, List
-from datetime import datetime
 
-@dataclass
+from src.models.timestamp import now_epoch, to_epoch
+
+@dataclass(slots=True)
 class Advertisement:
     media_id: str
     media_type: str  # 'photo' or 'video'
@@ -10,7 +11,10 @@ class Advertisement:
     ad_text: str
     buttons: List[dict]  # 改为按钮列表
     id: Optional[str] = None
-    created_at: datetime = datetime.now()
+    created_at: int = field(default_factory=now_epoch)  # Unix 时间戳
+    
+    # 紧凑编码版本号，字段变化时递增
+    CODEC_VERSION = 1
     
     def to_dict(self) -> dict:
         """将对象转换为字典"""
@@ -21,12 +25,34 @@ class Advertisement:
             'welcome_text': self.welcome_text,
             'ad_text': self.ad_text,
             'buttons': self.buttons,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
     
     @classmethod
     def from_dict(cls, data: dict) -> 'Advertisement':
         """从字典创建对象"""
-        if 'created_at' in data and isinstance(data['created_at'], str):
-            data['created_at'] = datetime.fromisoformat(data['created_at'])
-        return cls(**data)
\ No newline at end of file
+        return cls(
+            media_id=data['media_id'],
+            media_type=data['media_type'],
+            welcome_text=data['welcome_text'],
+            ad_text=data['ad_text'],
+            buttons=data.get('buttons') or [],
+            id=data.get('id'),
+            created_at=to_epoch(data.get('created_at'))
+        )
+    
+    def encode(self) -> tuple:
+        """编码为紧凑的元组，按钮存为 (文字, 链接) 元组"""
+        buttons = tuple((button['text'], button['url']) for button in self.buttons)
+        return (self.CODEC_VERSION, self.id, self.media_id, self.media_type,
+                self.welcome_text, self.ad_text, buttons, self.created_at)
+    
+    @classmethod
+    def decode(cls, data) -> 'Advertisement':
+        """从紧凑元组解码，兼容旧版字典格式"""
+        if isinstance(data, dict):
+            return cls.from_dict(data)
+        if data[0] != cls.CODEC_VERSION:
+            raise ValueError(f"不支持的 Advertisement 编码版本: {data[0]}")
+        buttons = [{'text': text, 'url': url} for text, url in data[6]]
+        return cls(data[2], data[3], data[4], data[5], buttons, data[1], data[7])
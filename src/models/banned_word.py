@@ -1,24 +1,57 @@
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, field
 from typing import Optional
 
-@dataclass
+from src.models.timestamp import now_epoch, to_epoch
+
+@dataclass(slots=True)
 class BannedWord:
     word: str
     created_by: int
-    created_at: datetime = datetime.now()
+    created_at: int = field(default_factory=now_epoch)  # Unix 时间戳
     id: Optional[str] = None
+    chat_id: Optional[int] = None  # 生效的群组，None 表示全局生效
+    match_type: str = 'substring'  # substring / wildcard / regex / word
+    
+    # 紧凑编码版本号，字段变化时递增
+    CODEC_VERSION = 3
     
     def to_dict(self) -> dict:
         return {
             'id': self.id,
             'word': self.word,
             'created_by': self.created_by,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at,
+            'chat_id': self.chat_id,
+            'match_type': self.match_type
         }
     
     @classmethod
     def from_dict(cls, data: dict) -> 'BannedWord':
-        if 'created_at' in data and isinstance(data['created_at'], str):
-            data['created_at'] = datetime.fromisoformat(data['created_at'])
-        return cls(**data) 
\ No newline at end of file
+        return cls(
+            word=data['word'],
+            created_by=data.get('created_by'),
+            created_at=to_epoch(data.get('created_at')),
+            id=data.get('id'),
+            chat_id=data.get('chat_id'),
+            match_type=data.get('match_type') or 'substring'
+        )
+    
+    def encode(self) -> tuple:
+        """编码为紧凑的元组，用于存储和持久化"""
+        return (self.CODEC_VERSION, self.id, self.word, self.created_by, self.created_at,
+                self.chat_id, self.match_type)
+    
+    @classmethod
+    def decode(cls, data) -> 'BannedWord':
+        """从紧凑元组解码，兼容旧版字典格式"""
+        if isinstance(data, dict):
+            return cls.from_dict(data)
+        if data[0] == 1:
+            # 版本 1 没有 chat_id，均为全局禁言词
+            return cls(data[2], data[3], data[4], data[1])
+        if data[0] == 2:
+            # 版本 2 没有 match_type，均为包含匹配
+            return cls(data[2], data[3], data[4], data[1], data[5])
+        if data[0] != cls.CODEC_VERSION:
+            raise ValueError(f"不支持的 BannedWord 编码版本: {data[0]}")
+        return cls(data[2], data[3], data[4], data[1], data[5], data[6])
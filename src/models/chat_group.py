@@ -1,14 +1,21 @@
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Union
+from dataclasses import dataclass, field
+from typing import Optional, Union
 
-@dataclass
+from src.models.timestamp import now_epoch, to_epoch
+
+@dataclass(slots=True)
 class ChatGroup:
     id: int
     title: str
     type: Union[str, object]  # 可以是字符串或 ChatType 对象
     is_ad_group: bool = False
-    joined_at: datetime = datetime.now()
+    joined_at: int = field(default_factory=now_epoch)  # Unix 时间戳
+    failure_count: int = 0  # 连续发送失败（无法再发言）的次数
+    is_active: bool = True  # 多次发送失败后停用，不再投放广告
+    schedule: Optional[str] = None  # 该群组单独的投放时间（cron 表达式），为空时使用全局设置
+    
+    # 紧凑编码版本号，字段变化时递增
+    CODEC_VERSION = 3
     
     def to_dict(self) -> dict:
         return {
@@ -16,19 +23,42 @@ class ChatGroup:
             'title': self.title,
             'type': str(self.type),  # 将 type 转换为字符串
             'is_ad_group': bool(self.is_ad_group),  # 确保是布尔值
-            'joined_at': self.joined_at.isoformat()
+            'joined_at': self.joined_at,
+            'failure_count': self.failure_count,
+            'is_active': bool(self.is_active),
+            'schedule': self.schedule
         }
     
     @classmethod
     def from_dict(cls, data: dict) -> 'ChatGroup':
-        # 创建一个数据的副本，避免修改原始数据
-        data_copy = data.copy()
-        
-        # 确保 is_ad_group 是布尔值
-        data_copy['is_ad_group'] = bool(data_copy.get('is_ad_group', False))
-        
-        # 处理 joined_at
-        if 'joined_at' in data_copy and isinstance(data_copy['joined_at'], str):
-            data_copy['joined_at'] = datetime.fromisoformat(data_copy['joined_at'])
-            
-        return cls(**data_copy) 
\ No newline at end of file
+        return cls(
+            id=data['id'],
+            title=data.get('title'),
+            type=data.get('type'),
+            is_ad_group=bool(data.get('is_ad_group', False)),
+            joined_at=to_epoch(data.get('joined_at')),
+            failure_count=data.get('failure_count') or 0,
+            is_active=bool(data.get('is_active', True)),
+            schedule=data.get('schedule')
+        )
+    
+    def encode(self) -> tuple:
+        """编码为紧凑的元组，用于存储和持久化"""
+        return (self.CODEC_VERSION, self.id, self.title, str(self.type),
+                bool(self.is_ad_group), self.joined_at, self.failure_count, bool(self.is_active),
+                self.schedule)
+    
+    @classmethod
+    def decode(cls, data) -> 'ChatGroup':
+        """从紧凑元组解码，兼容旧版字典格式"""
+        if isinstance(data, dict):
+            return cls.from_dict(data)
+        if data[0] == 1:
+            # 版本 1 没有失败计数，均为正常群组
+            return cls(data[1], data[2], data[3], data[4], data[5])
+        if data[0] == 2:
+            # 版本 2 没有单独的投放时间
+            return cls(data[1], data[2], data[3], data[4], data[5], data[6], data[7])
+        if data[0] != cls.CODEC_VERSION:
+            raise ValueError(f"不支持的 ChatGroup 编码版本: {data[0]}")
+        return cls(data[1], data[2], data[3], data[4], data[5], data[6], data[7], data[8])
@@ -0,0 +1,21 @@
+import time
+from datetime import datetime
+from typing import Any
+
+
+def now_epoch() -> int:
+    """当前时间的 Unix 时间戳（秒）"""
+    return int(time.time())
+
+
+def to_epoch(value: Any) -> int:
+    """将旧数据中的 ISO 字符串或 datetime 转换为 Unix 时间戳"""
+    if value is None:
+        return now_epoch()
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, str) and value.lstrip('-').isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
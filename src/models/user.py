@@ -1,22 +1,26 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
-from datetime import datetime
 
-@dataclass
+from src.models.timestamp import now_epoch, to_epoch
+
+@dataclass(slots=True)
 class User:
     id: int
     is_admin: bool = False
-    joined_at: datetime = datetime.now()
+    joined_at: int = field(default_factory=now_epoch)  # Unix 时间戳
     username: Optional[str] = None
     first_name: Optional[str] = None
     last_name: Optional[str] = None
     
+    # 紧凑编码版本号，字段变化时递增
+    CODEC_VERSION = 1
+    
     def to_dict(self) -> dict:
         """将对象转换为字典"""
         return {
             'id': self.id,
             'is_admin': self.is_admin,
-            'joined_at': self.joined_at.isoformat(),
+            'joined_at': self.joined_at,
             'username': self.username,
             'first_name': self.first_name,
             'last_name': self.last_name
@@ -25,6 +29,25 @@ class User:
     @classmethod
     def from_dict(cls, data: dict) -> 'User':
         """从字典创建对象"""
-        if 'joined_at' in data and isinstance(data['joined_at'], str):
-            data['joined_at'] = datetime.fromisoformat(data['joined_at'])
-        return cls(**data)
\ No newline at end of file
+        return cls(
+            id=data['id'],
+            is_admin=bool(data.get('is_admin', False)),
+            joined_at=to_epoch(data.get('joined_at')),
+            username=data.get('username'),
+            first_name=data.get('first_name'),
+            last_name=data.get('last_name')
+        )
+    
+    def encode(self) -> tuple:
+        """编码为紧凑的元组，用于存储和持久化"""
+        return (self.CODEC_VERSION, self.id, bool(self.is_admin), self.joined_at,
+                self.username, self.first_name, self.last_name)
+    
+    @classmethod
+    def decode(cls, data) -> 'User':
+        """从紧凑元组解码，兼容旧版字典格式"""
+        if isinstance(data, dict):
+            return cls.from_dict(data)
+        if data[0] != cls.CODEC_VERSION:
+            raise ValueError(f"不支持的 User 编码版本: {data[0]}")
+        return cls(data[1], data[2], data[3], data[4], data[5], data[6])
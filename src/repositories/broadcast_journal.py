@@ -0,0 +1,186 @@
+# src/repositories/broadcast_journal.py
+import asyncio
+import json
+import os
+import uuid
+import weakref
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, TextIO
+
+from telegram.ext import Application
+
+from src.models.timestamp import now_epoch
+from src.repositories.repository_factory import get_bot_name
+from src.utils.logger import log_error, log_info, log_warning
+
+# 日志记录类型（每行一个 JSON 对象）
+OP_START = 'start'  # {"op", "run", "ad", "groups", "at", "fire"}
+OP_ADD = 'add'      # {"op", "run", "groups"}
+OP_SENT = 'sent'    # {"op", "run", "group"}
+OP_DONE = 'done'    # {"op", "run"}
+
+
+@dataclass(slots=True)
+class BroadcastRun:
+    run_id: str
+    ad_id: Optional[str]
+    group_ids: List[int]
+    started_at: int  # Unix 时间戳
+    delivered: Set[int] = field(default_factory=set)
+    # 定时投放的触发时间，重启后同一时间点尚未派发的群组仍按错开时间发送
+    fire_at: Optional[float] = None
+
+    @property
+    def pending_group_ids(self) -> List[int]:
+        """尚未送达的群组"""
+        return [group_id for group_id in self.group_ids if group_id not in self.delivered]
+
+
+def _replay(path: Path) -> Dict[str, BroadcastRun]:
+    """重放日志文件，返回尚未完成的投放"""
+    runs: Dict[str, BroadcastRun] = {}
+    with path.open('r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 崩溃时写了一半的最后一行
+                log_warning(f"投放日志 {path.name} 末尾记录不完整，已忽略")
+                break
+            op = record.get('op')
+            if op == OP_START:
+                runs[record['run']] = BroadcastRun(record['run'], record.get('ad'),
+                                                   list(record['groups']), record.get('at') or 0,
+                                                   fire_at=record.get('fire'))
+            elif op == OP_ADD and record.get('run') in runs:
+                runs[record['run']].group_ids.extend(record['groups'])
+            elif op == OP_SENT and record.get('run') in runs:
+                runs[record['run']].delivered.add(record['group'])
+            elif op == OP_DONE:
+                runs.pop(record.get('run'), None)
+    return runs
+
+
+def _run_records(run: BroadcastRun) -> List[dict]:
+    records = [{'op': OP_START, 'run': run.run_id, 'ad': run.ad_id,
+                'groups': run.group_ids, 'at': run.started_at, 'fire': run.fire_at}]
+    records.extend({'op': OP_SENT, 'run': run.run_id, 'group': group_id} for group_id in run.delivered)
+    return records
+
+
+class BroadcastJournal:
+    """广告投放日志：逐个群组记录送达状态，进程重启后只向未送达的群组续发
+
+    送达记录在发送成功之后写入，崩溃发生在两者之间时该群组会被重发一次（至少一次送达）。
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._file: Optional[TextIO] = None
+        self._pending: List[str] = []
+        self._write_lock = asyncio.Lock()
+        self._active: Dict[str, BroadcastRun] = {}
+
+    def _load(self) -> List[BroadcastRun]:
+        """读取未完成的投放，并把日志重写为只包含这些投放的记录"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        runs = list(_replay(self.path).values()) if self.path.exists() else []
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with tmp_path.open('w', encoding='utf-8') as file:
+            for run in runs:
+                for record in _run_records(run):
+                    file.write(json.dumps(record) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        self._file = self.path.open('a', encoding='utf-8')
+        return runs
+
+    async def load_unfinished(self) -> List[BroadcastRun]:
+        """加载上次进程退出时尚未完成的投放"""
+        try:
+            runs = await asyncio.to_thread(self._load)
+            self._active.update((run.run_id, run) for run in runs)
+            if runs:
+                log_info(f"发现 {len(runs)} 个未完成的广告投放")
+            return runs
+        except Exception as e:
+            log_error(e, f"读取投放日志失败: {self.path}")
+            return []
+
+    def _write_pending(self, payload: str) -> None:
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open('a', encoding='utf-8')
+        self._file.write(payload)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _truncate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = self.path.open('w', encoding='utf-8')
+
+    async def _append(self, record: dict) -> None:
+        """追加一条记录；并发写入合并为一次 fsync"""
+        self._pending.append(json.dumps(record) + '\n')
+        try:
+            async with self._write_lock:
+                if not self._pending:
+                    return
+                payload = ''.join(self._pending)
+                self._pending.clear()
+                await asyncio.to_thread(self._write_pending, payload)
+        except Exception as e:
+            log_error(e, f"写入投放日志失败: {self.path}", include_traceback=False)
+
+    async def start(self, ad_id: Optional[str], group_ids: List[int],
+                    fire_at: Optional[float] = None) -> BroadcastRun:
+        """登记一次新的投放"""
+        run = BroadcastRun(uuid.uuid4().hex, ad_id, list(group_ids), now_epoch(), fire_at=fire_at)
+        self._active[run.run_id] = run
+        await self._append(_run_records(run)[0])
+        return run
+
+    async def add_groups(self, run: BroadcastRun, group_ids: List[int]) -> None:
+        """把新派发的群组加入投放（已在投放中的群组忽略）"""
+        new_ids = [group_id for group_id in group_ids if group_id not in run.group_ids]
+        if not new_ids:
+            return
+        run.group_ids.extend(new_ids)
+        await self._append({'op': OP_ADD, 'run': run.run_id, 'groups': new_ids})
+
+    async def delivered(self, run: BroadcastRun, group_id: int) -> None:
+        """记录广告已送达某个群组"""
+        run.delivered.add(group_id)
+        await self._append({'op': OP_SENT, 'run': run.run_id, 'group': group_id})
+
+    async def finish(self, run: BroadcastRun) -> None:
+        """标记投放结束；没有进行中的投放时清空日志"""
+        self._active.pop(run.run_id, None)
+        await self._append({'op': OP_DONE, 'run': run.run_id})
+        if self._active:
+            return
+        try:
+            async with self._write_lock:
+                if not self._active and not self._pending:
+                    await asyncio.to_thread(self._truncate)
+        except Exception as e:
+            log_error(e, f"清空投放日志失败: {self.path}", include_traceback=False)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_journals: "weakref.WeakKeyDictionary[Application, BroadcastJournal]" = weakref.WeakKeyDictionary()
+
+
+def get_broadcast_journal(application: Application) -> BroadcastJournal:
+    """获取 application 的投放日志（data/<机器人名称>.broadcast）"""
+    journal = _journals.get(application)
+    if journal is None:
+        journal = _journals[application] = BroadcastJournal(f"data/{get_bot_name(application)}.broadcast")
+    return journal
@@ -1,19 +1,102 @@
 # src/repositories/data_repository.py
-from typing import List, Optional, Set
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from telegram.ext import Application
 from src.models.ad import Advertisement
 from src.models.user import User
 from src.models.chat_group import ChatGroup  # 更新导入路径
 from src.models.banned_word import BannedWord
 import uuid
+import weakref
 from datetime import datetime
 
 from src.utils.logger import log_error, log_info, log_warning
 
+# 只通过仓库写入的集合，持久化层按脏键增量写入
+TRACKED_KEYS = ('groups', 'users', 'ads')
+
+# bot_data 中记录的存储格式版本：1 表示使用模型的紧凑元组编码
+RECORD_FORMAT_VERSION = 1
+
+
+class ModelCache:
+    """已反序列化模型的缓存（identity map），同一 application 的所有仓库实例共享
+    
+    每个条目记录其来源字典，来源字典被替换后条目自动失效。
+    返回的对象是共享的，修改后必须通过仓库保存。
+    """
+    
+    def __init__(self, bot_data: dict):
+        self.bot_data = bot_data
+        self.entries: Dict[str, Dict[Any, Tuple[Any, Any]]] = {key: {} for key in TRACKED_KEYS}
+        self.banned_words: Optional[Tuple[list, List[BannedWord]]] = None
+        # 二级索引（按插入顺序的 ID 集合），首次使用时构建，之后随写入维护
+        self.ad_group_ids: Optional[Dict[str, None]] = None
+        self.admin_ids: Optional[Dict[int, None]] = None
+        # (轮询顺序列表, 广告ID -> 在列表中的位置)，列表被替换后重建
+        self.ad_positions: Optional[Tuple[list, Dict[str, int]]] = None
+
+
+_model_caches: "weakref.WeakKeyDictionary[Application, ModelCache]" = weakref.WeakKeyDictionary()
+
+
 class DataRepository:
     def __init__(self, application: Application):
         self.app = application
         self._init_data_structure()
+        track = getattr(getattr(application, 'persistence', None), 'track_bot_data_key', None)
+        if track:
+            for key in TRACKED_KEYS:
+                track(key)
+    
+    def _mark_dirty(self, key: str, sub_key) -> None:
+        """通知持久化层该记录已变化"""
+        mark_dirty = getattr(getattr(self.app, 'persistence', None), 'mark_dirty', None)
+        if mark_dirty:
+            mark_dirty(key, sub_key)
+    
+    def _get_cache(self) -> ModelCache:
+        """获取模型缓存，bot_data 被整体替换（如加载持久化数据）后重建"""
+        cache = _model_caches.get(self.app)
+        if cache is None or cache.bot_data is not self.app.bot_data:
+            cache = _model_caches[self.app] = ModelCache(self.app.bot_data)
+        return cache
+    
+    def _hydrate(self, collection: str, key: Any, data: Any, factory: Callable[[Any], Any]) -> Any:
+        """从缓存获取模型对象，未命中时反序列化并缓存"""
+        entries = self._get_cache().entries[collection]
+        entry = entries.get(key)
+        if entry is not None and entry[0] is data:
+            return entry[1]
+        obj = factory(data)
+        entries[key] = (data, obj)
+        return obj
+    
+    def _cache_put(self, collection: str, key: Any, data: Any, obj: Any) -> None:
+        self._get_cache().entries[collection][key] = (data, obj)
+    
+    def _cache_pop(self, collection: str, key: Any) -> None:
+        self._get_cache().entries[collection].pop(key, None)
+    
+    def _get_ad_group_ids(self) -> Dict[str, None]:
+        """广告群 ID 索引（不含已停用的群组）"""
+        cache = self._get_cache()
+        if cache.ad_group_ids is None:
+            groups = self.app.bot_data.get('groups', {})
+            cache.ad_group_ids = {
+                key: None for key, record in groups.items()
+                if (group := ChatGroup.decode(record)).is_ad_group and group.is_active
+            }
+        return cache.ad_group_ids
+    
+    def _get_admin_ids(self) -> Dict[int, None]:
+        """管理员 ID 索引"""
+        cache = self._get_cache()
+        if cache.admin_ids is None:
+            users = self.app.bot_data.get('users', {})
+            cache.admin_ids = {
+                user_id: None for user_id, record in users.items() if User.decode(record).is_admin
+            }
+        return cache.admin_ids
     
     def _init_data_structure(self) -> None:
         """初始化数据结构"""
@@ -25,8 +108,82 @@ class DataRepository:
             self.app.bot_data['users'] = {}
         if 'ads' not in self.app.bot_data:
             self.app.bot_data['ads'] = {}
+        if 'ad_order' not in self.app.bot_data:
+            self.app.bot_data['ad_order'] = []
+        if 'advertisements' in self.app.bot_data:
+            self._migrate_legacy_ads()
         if 'banned_words' not in self.app.bot_data:
             self.app.bot_data['banned_words'] = []
+        if self.app.bot_data.get('record_format') != RECORD_FORMAT_VERSION:
+            self._migrate_record_format()
+    
+    def _migrate_record_format(self) -> None:
+        """将旧版字典格式的记录转换为紧凑元组编码"""
+        bot_data = self.app.bot_data
+        migrated = 0
+        for collection, model in (('groups', ChatGroup), ('users', User), ('ads', Advertisement)):
+            records = bot_data.get(collection, {})
+            for key, record in records.items():
+                if isinstance(record, dict):
+                    records[key] = model.decode(record).encode()
+                    self._mark_dirty(collection, key)
+                    migrated += 1
+        banned_words = bot_data.get('banned_words', [])
+        if any(isinstance(word, dict) for word in banned_words):
+            bot_data['banned_words'] = [BannedWord.decode(word).encode() for word in banned_words]
+            migrated += len(banned_words)
+        bot_data['record_format'] = RECORD_FORMAT_VERSION
+        if migrated:
+            log_info(f"已将 {migrated} 条记录转换为紧凑编码")
+    
+    def _get_ad_store(self) -> Tuple[Dict[str, dict], List[Optional[str]]]:
+        """获取广告存储（按ID索引的字典）和轮询顺序列表
+
+        删除广告时只把轮询顺序中的位置标记为 None，按位置读取前再统一压缩。
+        """
+        bot_data = self.app.bot_data
+        if 'advertisements' in bot_data:
+            self._migrate_legacy_ads()
+        ads = bot_data.setdefault('ads', {})
+        ad_order = bot_data.setdefault('ad_order', [])
+        return ads, ad_order
+    
+    def _get_ad_positions(self, ad_order: List[Optional[str]]) -> Dict[str, int]:
+        """广告ID -> 在轮询顺序中的位置，首次使用时构建，之后随写入维护"""
+        cache = self._get_cache()
+        if cache.ad_positions is None or cache.ad_positions[0] is not ad_order:
+            positions = {ad_id: index for index, ad_id in enumerate(ad_order) if ad_id is not None}
+            cache.ad_positions = (ad_order, positions)
+        return cache.ad_positions[1]
+
+    def _compact_ad_order(self, ads: Dict[str, dict], ad_order: List[Optional[str]]) -> None:
+        """移除已删除广告留下的空位，并把轮询位置换算到压缩后的列表"""
+        if len(ad_order) == len(ads):
+            return
+        last_index = self.app.bot_data.get('last_ad_index', -1)
+        if last_index >= 0:
+            self.app.bot_data['last_ad_index'] = sum(
+                1 for ad_id in ad_order[:last_index + 1] if ad_id is not None
+            ) - 1
+        # 原地修改，bot_data 中的列表对象保持不变
+        ad_order[:] = [ad_id for ad_id in ad_order if ad_id is not None]
+        self._get_cache().ad_positions = (ad_order, {ad_id: index for index, ad_id in enumerate(ad_order)})
+
+    def _migrate_legacy_ads(self) -> None:
+        """将旧版列表结构的广告迁移到按ID索引的存储"""
+        legacy_ads = self.app.bot_data.pop('advertisements', None) or []
+        ads = self.app.bot_data.setdefault('ads', {})
+        ad_order = self.app.bot_data.setdefault('ad_order', [])
+        for ad in legacy_ads:
+            ad_id = ad.get('id')
+            if not ad_id:
+                continue
+            if ad_id not in ads:
+                ad_order.append(ad_id)
+            ads[ad_id] = Advertisement.decode(ad).encode()
+            self._mark_dirty('ads', ad_id)
+        self._get_cache().ad_positions = None
+        log_info(f"已迁移旧版广告数据: {len(legacy_ads)} 条")
     
     # 广告相关方法
     async def save_ad(self, ad: Advertisement) -> bool:
@@ -34,38 +191,70 @@ class DataRepository:
         if not ad.id:
             ad.id = str(uuid.uuid4())
         
-        ads = self.app.bot_data.get('advertisements', [])
-        ads_dict = [a for a in ads if a.get('id') != ad.id]
-        ads_dict.append(ad.to_dict())
-        self.app.bot_data['advertisements'] = ads_dict
+        ads, ad_order = self._get_ad_store()
+        # 已存在的广告原地更新，保持其在轮询顺序中的位置
+        if ad.id not in ads:
+            self._get_ad_positions(ad_order)[ad.id] = len(ad_order)
+            ad_order.append(ad.id)
+        ad_record = ad.encode()
+        ads[ad.id] = ad_record
+        self._cache_put('ads', ad.id, ad_record, ad)
+        self._mark_dirty('ads', ad.id)
         
         return True
     
     async def get_ad(self, ad_id: str) -> Optional[Advertisement]:
         """获取单个广告"""
-        ads = self.app.bot_data.get('advertisements', [])
-        for ad in ads:
-            if ad.get('id') == ad_id:
-                return Advertisement.from_dict(ad)
-        return None
+        ads, _ = self._get_ad_store()
+        ad = ads.get(ad_id)
+        if ad is None:
+            return None
+        return self._hydrate('ads', ad_id, ad, Advertisement.decode)
     
     async def get_all_ads(self) -> List[Advertisement]:
         """获取所有广告"""
-        ads = self.app.bot_data.get('advertisements', [])
-        return [Advertisement.from_dict(ad) for ad in ads]
+        ads, ad_order = self._get_ad_store()
+        return [self._hydrate('ads', ad_id, ads[ad_id], Advertisement.decode)
+                for ad_id in ad_order if ad_id is not None]
+    
+    async def get_ad_count(self) -> int:
+        """获取广告数量"""
+        ads, _ = self._get_ad_store()
+        return len(ads)
+    
+    async def get_ad_at(self, index: int) -> Optional[Advertisement]:
+        """按轮询顺序获取指定位置的广告"""
+        ads, ad_order = self._get_ad_store()
+        self._compact_ad_order(ads, ad_order)
+        if not 0 <= index < len(ad_order):
+            return None
+        ad_id = ad_order[index]
+        return self._hydrate('ads', ad_id, ads[ad_id], Advertisement.decode)
+    
+    async def rotate_ad(self) -> Tuple[Optional[Advertisement], int, int]:
+        """推进轮询位置并返回 (广告, 位置, 广告数量)，中间没有 await，不会被并发调用打断"""
+        ads, ad_order = self._get_ad_store()
+        self._compact_ad_order(ads, ad_order)
+        if not ad_order:
+            return None, -1, 0
+        index = (self.app.bot_data.get('last_ad_index', -1) + 1) % len(ad_order)
+        self.app.bot_data['last_ad_index'] = index
+        ad_id = ad_order[index]
+        return self._hydrate('ads', ad_id, ads[ad_id], Advertisement.decode), index, len(ad_order)
     
     async def delete_ad(self, ad_id: str) -> bool:
         """删除广告"""
         try:
-            ads = self.app.bot_data.get('advertisements', [])
-            # 过滤掉要删除的广告
-            filtered_ads = [ad for ad in ads if ad.get('id') != ad_id]
-            # 如果长度相同，说明没有找到要删除的广告
-            if len(filtered_ads) == len(ads):
+            ads, ad_order = self._get_ad_store()
+            if ads.pop(ad_id, None) is None:
                 log_warning(f"未找到广告: {ad_id}")
                 return False
-            # 保存更新后的广告列表
-            self.app.bot_data['advertisements'] = filtered_ads
+            # 只留下空位，O(1)；空位多于剩余广告时压缩，摊还后仍为 O(1)
+            ad_order[self._get_ad_positions(ad_order).pop(ad_id)] = None
+            if len(ad_order) > 2 * len(ads):
+                self._compact_ad_order(ads, ad_order)
+            self._cache_pop('ads', ad_id)
+            self._mark_dirty('ads', ad_id)
             log_info(f"成功删除广告: {ad_id}")
             return True
         except Exception as e:
@@ -75,78 +264,108 @@ class DataRepository:
     # 用户相关方法
     async def save_user(self, user: User) -> bool:
         """保存用户信息"""
-        users = self.app.bot_data.get('users', {})
-        users[user.id] = user.to_dict()
-        self.app.bot_data['users'] = users
+        users = self.app.bot_data.setdefault('users', {})
+        user_record = user.encode()
+        if users.get(user.id) != user_record:
+            users[user.id] = user_record
+            self._cache_put('users', user.id, user_record, user)
+            self._mark_dirty('users', user.id)
+            admin_ids = self._get_admin_ids()
+            if user.is_admin:
+                admin_ids[user.id] = None
+            else:
+                admin_ids.pop(user.id, None)
         return True
     
     async def get_user(self, user_id: int) -> Optional[User]:
         """获取用户信息"""
         users = self.app.bot_data.get('users', {})
         if user_id in users:
-            return User.from_dict(users[user_id])
+            return self._hydrate('users', user_id, users[user_id], User.decode)
         return None
     
     async def get_all_admins(self) -> List[User]:
         """获取所有管理员"""
         users = self.app.bot_data.get('users', {})
-        return [User.from_dict(user) for user in users.values() if user.get('is_admin')]
+        return [self._hydrate('users', user_id, users[user_id], User.decode)
+                for user_id in self._get_admin_ids() if user_id in users]
     
     # 群组相关方法
     async def save_group(self, group: ChatGroup) -> bool:
-        """保存群组信息"""
+        """保存群组信息（内容未变化时不写入）"""
         try:
-            groups = self.app.bot_data.get('groups', {})
-            group_dict = group.to_dict()
-            
-            # 添加更详细的调试日志
-            log_info(f"准备保存群组，原始对象: id={group.id}, is_ad_group={group.is_ad_group}")
-            log_info(f"转换为字典后的数据: {group_dict}")
+            groups = self.app.bot_data.setdefault('groups', {})
+            group_record = group.encode()
+            key = str(group.id)
             
-            # 删除可能存在的数字键和字符串键
+            # 删除可能存在的数字键
             if group.id in groups:
                 del groups[group.id]
-            if str(group.id) in groups:
-                del groups[str(group.id)]
-                
-            # 保存数据
-            groups[str(group.id)] = group_dict
-            self.app.bot_data['groups'] = groups
+                self._cache_pop('groups', group.id)
+                self._get_ad_group_ids().pop(group.id, None)
+                self._mark_dirty('groups', group.id)
             
-            # 验证保存后的数据
-            saved_data = groups[str(group.id)]
-            log_info(f"保存到 bot_data 后的数据: {saved_data}")
-            
-            # 立即验证数据是否正确保存
-            verification_data = self.app.bot_data.get('groups', {}).get(str(group.id))
-            log_info(f"从 bot_data 重新读取的数据: {verification_data}")
+            if groups.get(key) == group_record:
+                return True
             
+            groups[key] = group_record
+            self._cache_put('groups', key, group_record, group)
+            self._mark_dirty('groups', key)
+            ad_group_ids = self._get_ad_group_ids()
+            if group.is_ad_group and group.is_active:
+                ad_group_ids[key] = None
+            else:
+                ad_group_ids.pop(key, None)
+            log_info(f"保存群组: id={group.id}, is_ad_group={group.is_ad_group}, is_active={group.is_active}")
             return True
         except Exception as e:
             log_error(e, f"保存群组失败: {group.id}")
             return False
     
+    async def update_group_info(self, group_id: int, title: str, group_type) -> Optional[ChatGroup]:
+        """更新群组标题和类型，仅在发生变化时写入；群组不存在时创建"""
+        try:
+            groups = self.app.bot_data.setdefault('groups', {})
+            key = str(group_id)
+            group_data = groups.get(key)
+            if group_data is not None:
+                group = self._hydrate('groups', key, group_data, ChatGroup.decode)
+                if group.title == title and str(group.type) == str(group_type):
+                    return group
+                group.title = title
+                group.type = group_type
+            else:
+                group = ChatGroup(
+                    id=group_id,
+                    title=title,
+                    type=group_type,
+                    is_ad_group=False
+                )
+            await self.save_group(group)
+            return group
+        except Exception as e:
+            log_error(e, f"更新群组信息失败: {group_id}")
+            return None
+    
     async def get_group(self, group_id: int) -> Optional[ChatGroup]:
         """获取群组信息"""
         try:
             groups = self.app.bot_data.get('groups', {})
-            group_data = groups.get(str(group_id))
+            key = str(group_id)
+            group_data = groups.get(key)
             
             if group_data:
-                group = ChatGroup.from_dict(group_data)
-                log_info(f"转换后的群组对象: id={group.id}, is_ad_group={group.is_ad_group}")
-                return group
+                return self._hydrate('groups', key, group_data, ChatGroup.decode)
             return None
         except Exception as e:
             log_error(e, f"获取群组失败: {group_id}")
             return None
     
     async def get_ad_groups(self) -> List[ChatGroup]:
-        """获取所有广告群"""
+        """获取所有广告群（不含已停用的群组）"""
         groups = self.app.bot_data.get('groups', {})
-        return [ChatGroup.from_dict(group) 
-                for group in groups.values() 
-                if group.get('is_ad_group')]
+        return [self._hydrate('groups', key, groups[key], ChatGroup.decode)
+                for key in self._get_ad_group_ids() if key in groups]
     
     async def set_target_group(self, group_id: int) -> bool:
         """设置目标群组"""
@@ -176,8 +395,9 @@ class DataRepository:
         """保存禁言词"""
         try:
             banned_words = self.app.bot_data.get('banned_words', [])
-            banned_words.append(banned_word.to_dict())
+            banned_words.append(banned_word.encode())
             self.app.bot_data['banned_words'] = banned_words
+            self._get_cache().banned_words = None
             return True
         except Exception as e:
             log_error(e, "保存禁言词失败")
@@ -187,20 +407,27 @@ class DataRepository:
         """获取所有禁言词"""
         try:
             banned_words = self.app.bot_data.get('banned_words', [])
-            return [BannedWord.from_dict(word) for word in banned_words]
+            cache = self._get_cache()
+            if cache.banned_words is None or cache.banned_words[0] is not banned_words:
+                cache.banned_words = (banned_words, [BannedWord.decode(word) for word in banned_words])
+            return list(cache.banned_words[1])
         except Exception as e:
             log_error(e, "获取禁言词列表失败")
             return []
     
-    async def delete_banned_word(self, word: str) -> bool:
-        """删除禁言词"""
+    async def delete_banned_word(self, word: str, chat_id: Optional[int] = None) -> bool:
+        """删除禁言词（chat_id 为 None 时删除全局禁言词）"""
         try:
             banned_words = self.app.bot_data.get('banned_words', [])
             original_length = len(banned_words)
-            banned_words = [w for w in banned_words if w['word'] != word]
+            banned_words = [
+                w for w in banned_words
+                if (decoded := BannedWord.decode(w)).word != word or decoded.chat_id != chat_id
+            ]
             if len(banned_words) == original_length:
                 return False
             self.app.bot_data['banned_words'] = banned_words
+            self._get_cache().banned_words = None
             return True
         except Exception as e:
             log_error(e, "删除禁言词失败")
@@ -243,4 +470,46 @@ class DataRepository:
             return settings.get('channel_verification_enabled', True)  # 默认启用
         except Exception as e:
             log_error(e, "获取频道验证状态失败")
-            return True  # 出错时默认启用
\ No newline at end of file
+            return True  # 出错时默认启用
+    
+    async def set_ad_schedule(self, schedule: Optional[str]) -> bool:
+        """设置全局广告投放时间（cron 表达式），None 表示恢复默认"""
+        try:
+            settings = self.app.bot_data.get('settings', {})
+            settings['ad_schedule'] = schedule
+            self.app.bot_data['settings'] = settings
+            log_info(f"设置广告投放时间成功: {schedule or '默认'}")
+            return True
+        except Exception as e:
+            log_error(e, "设置广告投放时间失败")
+            return False
+    
+    async def get_ad_schedule(self) -> Optional[str]:
+        """获取全局广告投放时间"""
+        try:
+            settings = self.app.bot_data.get('settings', {})
+            return settings.get('ad_schedule')
+        except Exception as e:
+            log_error(e, "获取广告投放时间失败")
+            return None
+    
+    async def set_quiet_hours(self, quiet_hours: Optional[str]) -> bool:
+        """设置免打扰时段（HH:MM-HH:MM），None 表示关闭"""
+        try:
+            settings = self.app.bot_data.get('settings', {})
+            settings['quiet_hours'] = quiet_hours
+            self.app.bot_data['settings'] = settings
+            log_info(f"设置免打扰时段成功: {quiet_hours or '关闭'}")
+            return True
+        except Exception as e:
+            log_error(e, "设置免打扰时段失败")
+            return False
+    
+    async def get_quiet_hours(self) -> Optional[str]:
+        """获取免打扰时段"""
+        try:
+            settings = self.app.bot_data.get('settings', {})
+            return settings.get('quiet_hours')
+        except Exception as e:
+            log_error(e, "获取免打扰时段失败")
+            return None
\ No newline at end of file
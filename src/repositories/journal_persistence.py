@@ -0,0 +1,529 @@
+# src/repositories/journal_persistence.py
+import asyncio
+import gzip
+import io
+import os
+import pickle
+import shutil
+from copy import copy, deepcopy
+from itertools import islice
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 未安装时退回标准库 gzip
+    zstandard = None
+
+from telegram.ext import Application, BasePersistence, PersistenceInput
+
+from src.utils.logger import log_error, log_info, log_warning
+
+# 日志记录类型
+OP_BOT_SET = 'bot_set'              # (op, key, value)
+OP_BOT_DEL = 'bot_del'              # (op, key)
+OP_BOT_ITEM_SET = 'bot_item_set'    # (op, key, sub_key, value)
+OP_BOT_ITEM_DEL = 'bot_item_del'    # (op, key, sub_key)
+OP_BOT_ITEMS_SET = 'bot_items_set'  # (op, key, [(sub_key, value), ...])，仅用于快照
+OP_USER_SET = 'user_set'            # (op, user_id, data)
+OP_USER_DEL = 'user_del'            # (op, user_id)
+OP_CHAT_SET = 'chat_set'            # (op, chat_id, data)
+OP_CHAT_DEL = 'chat_del'            # (op, chat_id)
+OP_CALLBACK_SET = 'callback_set'    # (op, data)
+OP_CONVERSATION_SET = 'conv_set'    # (op, name, key, state)
+
+# 快照格式：MAGIC + 版本号 + 压缩方式，之后是压缩后的记录流
+SNAPSHOT_MAGIC = b'TGJSNAP'
+SNAPSHOT_VERSION = 2
+LEGACY_SNAPSHOT_VERSION = 1
+SNAPSHOT_CODECS = {b'Z': 'zstd', b'G': 'gzip'}
+DEFAULT_SNAPSHOT_CODEC = 'zstd' if zstandard is not None else 'gzip'
+# 快照中大集合按批写入，每批的记录数
+SNAPSHOT_BATCH_SIZE = 1000
+
+
+def _diff_bot_data(data: Dict[Any, Any], shadow: Dict[Any, Any]) -> Tuple[List[bytes], Dict[Any, Any]]:
+    """对比 bot_data 与上次写入的内容，返回序列化后的变化记录和新的对比基准（在线程中运行）"""
+    records = []
+    shadow = dict(shadow)
+    for key, value in data.items():
+        if key not in shadow:
+            records.append((OP_BOT_SET, key, value))
+            shadow[key] = deepcopy(value)
+        elif isinstance(value, dict) and isinstance(shadow[key], dict):
+            shadow_items = shadow[key]
+            for sub_key, item in value.items():
+                if sub_key not in shadow_items or shadow_items[sub_key] != item:
+                    records.append((OP_BOT_ITEM_SET, key, sub_key, item))
+                    shadow_items[sub_key] = deepcopy(item)
+            if len(shadow_items) != len(value):
+                for sub_key in [sub_key for sub_key in shadow_items if sub_key not in value]:
+                    records.append((OP_BOT_ITEM_DEL, key, sub_key))
+                    del shadow_items[sub_key]
+        elif shadow[key] != value:
+            records.append((OP_BOT_SET, key, value))
+            shadow[key] = deepcopy(value)
+    for key in [key for key in shadow if key not in data]:
+        records.append((OP_BOT_DEL, key))
+        del shadow[key]
+    return [pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL) for record in records], shadow
+
+
+def _empty_state() -> Dict[str, Any]:
+    return {
+        'bot_data': {},
+        'user_data': {},
+        'chat_data': {},
+        'callback_data': None,
+        'conversations': {},
+    }
+
+
+def _apply_record(state: Dict[str, Any], record: Tuple) -> None:
+    """将一条日志记录应用到状态上"""
+    op = record[0]
+    if op == OP_BOT_SET:
+        state['bot_data'][record[1]] = record[2]
+    elif op == OP_BOT_DEL:
+        state['bot_data'].pop(record[1], None)
+    elif op == OP_BOT_ITEM_SET:
+        container = state['bot_data'].get(record[1])
+        if not isinstance(container, dict):
+            container = state['bot_data'][record[1]] = {}
+        container[record[2]] = record[3]
+    elif op == OP_BOT_ITEMS_SET:
+        container = state['bot_data'].get(record[1])
+        if not isinstance(container, dict):
+            container = state['bot_data'][record[1]] = {}
+        container.update(record[2])
+    elif op == OP_BOT_ITEM_DEL:
+        container = state['bot_data'].get(record[1])
+        if isinstance(container, dict):
+            container.pop(record[2], None)
+    elif op == OP_USER_SET:
+        state['user_data'][record[1]] = record[2]
+    elif op == OP_USER_DEL:
+        state['user_data'].pop(record[1], None)
+    elif op == OP_CHAT_SET:
+        state['chat_data'][record[1]] = record[2]
+    elif op == OP_CHAT_DEL:
+        state['chat_data'].pop(record[1], None)
+    elif op == OP_CALLBACK_SET:
+        state['callback_data'] = record[1]
+    elif op == OP_CONVERSATION_SET:
+        conversation = state['conversations'].setdefault(record[1], {})
+        if record[3] is None:
+            conversation.pop(record[2], None)
+        else:
+            conversation[record[2]] = record[3]
+    else:
+        log_warning(f"未知的日志记录类型: {op}")
+
+
+def _replay_journal(state: Dict[str, Any], path: Path) -> int:
+    """重放日志文件，返回有效数据的末尾偏移量（用于截断写了一半的记录）"""
+    valid_offset = 0
+    with path.open('rb') as file:
+        while True:
+            try:
+                record = pickle.load(file)
+            except EOFError:
+                break
+            except Exception as e:
+                log_warning(f"日志文件 {path.name} 在偏移 {valid_offset} 处损坏，忽略其后的内容: {e}")
+                break
+            _apply_record(state, record)
+            valid_offset = file.tell()
+    return valid_offset
+
+
+def _open_snapshot_writer(file: BinaryIO, codec: str) -> BinaryIO:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=3).stream_writer(file, closefd=False)
+    return gzip.GzipFile(fileobj=file, mode='wb', compresslevel=1)
+
+
+def _open_snapshot_reader(file: BinaryIO, codec: str) -> BinaryIO:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("快照使用 zstd 压缩，但未安装 zstandard")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(file, closefd=False))
+    return gzip.GzipFile(fileobj=file, mode='rb')
+
+
+def _snapshot_records(state: Dict[str, Any]) -> Iterator[Tuple]:
+    """将状态拆分为记录流，大集合分批输出，读取时无需一次性反序列化整个快照"""
+    for key, value in state['bot_data'].items():
+        if isinstance(value, dict) and len(value) > SNAPSHOT_BATCH_SIZE:
+            yield (OP_BOT_SET, key, {})
+            items = iter(value.items())
+            while True:
+                batch = list(islice(items, SNAPSHOT_BATCH_SIZE))
+                if not batch:
+                    break
+                yield (OP_BOT_ITEMS_SET, key, batch)
+        else:
+            yield (OP_BOT_SET, key, value)
+    for user_id, data in state['user_data'].items():
+        yield (OP_USER_SET, user_id, data)
+    for chat_id, data in state['chat_data'].items():
+        yield (OP_CHAT_SET, chat_id, data)
+    if state['callback_data'] is not None:
+        yield (OP_CALLBACK_SET, state['callback_data'])
+    for name, conversation in state['conversations'].items():
+        for key, conversation_state in conversation.items():
+            yield (OP_CONVERSATION_SET, name, key, conversation_state)
+
+
+def _load_snapshot(path: Path) -> Dict[str, Any]:
+    """流式读取快照文件，兼容旧版整体 pickle 格式"""
+    if not path.exists():
+        return _empty_state()
+    with path.open('rb') as file:
+        header = file.read(len(SNAPSHOT_MAGIC) + 2)
+        if not header.startswith(SNAPSHOT_MAGIC):
+            file.seek(0)
+            version, state = pickle.load(file)
+            if version != LEGACY_SNAPSHOT_VERSION:
+                raise ValueError(f"不支持的快照版本: {version}")
+            return state
+        version = header[len(SNAPSHOT_MAGIC)]
+        codec = SNAPSHOT_CODECS.get(header[len(SNAPSHOT_MAGIC) + 1:])
+        if version != SNAPSHOT_VERSION or codec is None:
+            raise ValueError(f"不支持的快照格式: 版本 {version}，压缩 {header[-1:]!r}")
+        state = _empty_state()
+        with _open_snapshot_reader(file, codec) as stream:
+            while True:
+                try:
+                    record = pickle.load(stream)
+                except EOFError:
+                    break
+                _apply_record(state, record)
+    return state
+
+
+def _write_snapshot(path: Path, state: Dict[str, Any], codec: str = DEFAULT_SNAPSHOT_CODEC) -> None:
+    """以流式压缩原子地写入快照文件"""
+    codec_flag = next(flag for flag, name in SNAPSHOT_CODECS.items() if name == codec)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with tmp_path.open('wb') as file:
+        file.write(SNAPSHOT_MAGIC + bytes([SNAPSHOT_VERSION]) + codec_flag)
+        with _open_snapshot_writer(file, codec) as stream:
+            for record in _snapshot_records(state):
+                pickle.dump(record, stream, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class JournalPersistence(BasePersistence):
+    """追加写日志的持久化实现
+
+    每次刷新只把发生变化的键以记录的形式追加到日志文件，日志过大时在后台线程中
+    合并为快照。启动时读取快照并重放日志。
+
+    bot_data 默认不交给 PTB 管理（PTB 每次刷新都会 deepcopy 整个 bot_data），
+    而是通过 :meth:`attach` 加载并由本类定时对比变化后写入日志，对比在线程中进行。
+    通过 :meth:`track_bot_data_key` 登记的集合不再做全量对比，只写入
+    :meth:`mark_dirty` 标记过的记录。
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        store_data: Optional[PersistenceInput] = None,
+        update_interval: float = 60,
+        compact_threshold: int = 8 * 1024 * 1024,
+        legacy_pickle_path: Optional[str] = None,
+        snapshot_codec: str = DEFAULT_SNAPSHOT_CODEC,
+    ):
+        super().__init__(
+            store_data=store_data or PersistenceInput(bot_data=False),
+            update_interval=update_interval,
+        )
+        base = Path(filepath)
+        self.snapshot_path = base.with_name(base.name + '.snapshot')
+        self.journal_path = base.with_name(base.name + '.journal')
+        self.old_journal_path = base.with_name(base.name + '.journal.old')
+        self.legacy_pickle_path = Path(legacy_pickle_path) if legacy_pickle_path else None
+        self.compact_threshold = compact_threshold
+        self.snapshot_codec = snapshot_codec
+
+        self._state: Optional[Dict[str, Any]] = None
+        self._bot_data_shadow: Dict[Any, Any] = {}
+        self._tracked_keys: Set[Any] = set()
+        self._persisted_tracked_keys: Set[Any] = set()
+        self._dirty: Dict[Any, Set[Any]] = {}
+        self._bot_data_lock = asyncio.Lock()
+        self._callback_data_shadow: Any = None
+        self._pending: List[bytes] = []
+        self._write_lock = asyncio.Lock()
+        self._journal_file = None
+        self._journal_size = 0
+        self._compaction_task: Optional[asyncio.Task] = None
+        self._updater_task: Optional[asyncio.Task] = None
+        self._application: Optional[Application] = None
+
+    # 加载
+    def _load(self) -> Dict[str, Any]:
+        """读取快照并重放日志（仅执行一次）"""
+        if self._state is not None:
+            return self._state
+
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        state = _load_snapshot(self.snapshot_path)
+        imported_legacy = False
+        if (not self.snapshot_path.exists()
+                and self.legacy_pickle_path
+                and self.legacy_pickle_path.exists()):
+            state = self._import_legacy_pickle(self.legacy_pickle_path)
+            imported_legacy = True
+
+        # 上次合并中途退出时会残留旧日志，需要先重放
+        had_old_journal = self.old_journal_path.exists()
+        if had_old_journal:
+            _replay_journal(state, self.old_journal_path)
+
+        if self.journal_path.exists():
+            valid_offset = _replay_journal(state, self.journal_path)
+            if valid_offset != self.journal_path.stat().st_size:
+                with self.journal_path.open('r+b') as file:
+                    file.truncate(valid_offset)
+
+        # 存在残留旧日志或从旧文件导入时，直接合并为新快照
+        if had_old_journal or imported_legacy:
+            _write_snapshot(self.snapshot_path, state, self.snapshot_codec)
+            self.journal_path.unlink(missing_ok=True)
+            self.old_journal_path.unlink(missing_ok=True)
+
+        self._journal_file = self.journal_path.open('ab')
+        self._journal_size = self._journal_file.tell()
+        self._bot_data_shadow = {
+            key: deepcopy(value)
+            for key, value in state['bot_data'].items()
+            if key not in self._tracked_keys
+        }
+        self._persisted_tracked_keys = {key for key in state['bot_data'] if key in self._tracked_keys}
+        self._callback_data_shadow = deepcopy(state['callback_data'])
+        self._state = state
+        log_info(
+            f"持久化数据加载完成: 用户 {len(state['user_data'])}，聊天 {len(state['chat_data'])}，"
+            f"日志 {self._journal_size} 字节"
+        )
+        return state
+
+    async def _ensure_loaded(self) -> Dict[str, Any]:
+        if self._state is not None:
+            return self._state
+        return await asyncio.to_thread(self._load)
+
+    @staticmethod
+    def _import_legacy_pickle(path: Path) -> Dict[str, Any]:
+        """导入 PicklePersistence 生成的单文件数据"""
+        with path.open('rb') as file:
+            data = pickle.load(file)
+        state = _empty_state()
+        state['bot_data'] = data.get('bot_data') or {}
+        state['user_data'] = data.get('user_data') or {}
+        state['chat_data'] = data.get('chat_data') or {}
+        state['callback_data'] = data.get('callback_data')
+        state['conversations'] = data.get('conversations') or {}
+        log_info(f"已从旧版持久化文件导入数据: {path}")
+        return state
+
+    async def attach(self, application: Application) -> None:
+        """接管 application 的 bot_data：加载数据并定时写入变化"""
+        state = await self._ensure_loaded()
+        self._application = application
+        if not self.store_data.bot_data:
+            application.bot_data = state['bot_data']
+            self._updater_task = asyncio.create_task(self._bot_data_updater())
+
+    async def _bot_data_updater(self) -> None:
+        while True:
+            await asyncio.sleep(self.update_interval)
+            try:
+                await self.update_bot_data(self._application.bot_data)
+            except Exception as e:
+                log_error(e, "写入 bot_data 变化失败")
+
+    # 脏键跟踪
+    def track_bot_data_key(self, key: Any) -> None:
+        """登记由调用方负责标记变化的 bot_data 集合"""
+        if key in self._tracked_keys:
+            return
+        self._tracked_keys.add(key)
+        if key in self._bot_data_shadow:
+            # 整体替换而不是原地删除：线程中的对比可能正在遍历旧的对比基准
+            self._bot_data_shadow = {k: v for k, v in self._bot_data_shadow.items() if k != key}
+            self._persisted_tracked_keys.add(key)
+
+    def mark_dirty(self, key: Any, sub_key: Any) -> None:
+        """标记 bot_data[key][sub_key] 已被修改或删除"""
+        self._dirty.setdefault(key, set()).add(sub_key)
+
+    # 写入
+    def _record(self, record: Tuple) -> None:
+        self._pending.append(pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _write_pending(self, payload: bytes) -> None:
+        self._journal_file.write(payload)
+        self._journal_file.flush()
+        os.fsync(self._journal_file.fileno())
+
+    async def _drain(self) -> None:
+        """将待写入的记录追加到日志文件"""
+        if not self._pending:
+            return
+        async with self._write_lock:
+            if not self._pending:
+                return
+            payload = b''.join(self._pending)
+            self._pending.clear()
+            await asyncio.to_thread(self._write_pending, payload)
+            self._journal_size += len(payload)
+            if self._journal_size >= self.compact_threshold and not self._compaction_running():
+                await self._start_compaction()
+
+    # 合并
+    def _compaction_running(self) -> bool:
+        return self._compaction_task is not None and not self._compaction_task.done()
+
+    async def _start_compaction(self) -> None:
+        """切换日志文件并在后台线程中合并快照（调用方需持有写锁）"""
+        self._journal_file.close()
+        await asyncio.to_thread(self._rotate_journal)
+        self._journal_file = self.journal_path.open('ab')
+        self._journal_size = 0
+        self._compaction_task = asyncio.create_task(asyncio.to_thread(self._compact))
+
+    def _rotate_journal(self) -> None:
+        """把当前日志移为旧日志；上次合并失败残留的旧日志不能覆盖，把当前日志追加到其后"""
+        if not self.old_journal_path.exists():
+            os.replace(self.journal_path, self.old_journal_path)
+            return
+        log_warning(f"上次合并未完成，日志追加到 {self.old_journal_path.name} 后重新合并")
+        # 追加后、删除前退出时两份日志包含相同记录，启动时重放两次结果不变
+        with self.journal_path.open('rb') as source, self.old_journal_path.open('ab') as target:
+            shutil.copyfileobj(source, target)
+            target.flush()
+            os.fsync(target.fileno())
+        self.journal_path.unlink()
+
+    def _compact(self) -> None:
+        """基于磁盘文件合并：快照 + 旧日志 -> 新快照，不读取事件循环中的数据"""
+        try:
+            state = _load_snapshot(self.snapshot_path)
+            _replay_journal(state, self.old_journal_path)
+            _write_snapshot(self.snapshot_path, state, self.snapshot_codec)
+            self.old_journal_path.unlink(missing_ok=True)
+            log_info(f"持久化快照合并完成: {self.snapshot_path}")
+        except Exception as e:
+            log_error(e, "持久化快照合并失败")
+
+    # BasePersistence 接口
+    async def get_user_data(self) -> Dict[int, Any]:
+        return (await self._ensure_loaded())['user_data']
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        return (await self._ensure_loaded())['chat_data']
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return (await self._ensure_loaded())['bot_data']
+
+    async def get_callback_data(self) -> Optional[Any]:
+        return deepcopy((await self._ensure_loaded())['callback_data'])
+
+    async def get_conversations(self, name: str) -> Dict[Any, Any]:
+        return (await self._ensure_loaded())['conversations'].get(name, {}).copy()
+
+    async def update_conversation(self, name: str, key: Any, new_state: Optional[object]) -> None:
+        conversation = (await self._ensure_loaded())['conversations'].setdefault(name, {})
+        if conversation.get(key) == new_state:
+            return
+        if new_state is None:
+            conversation.pop(key, None)
+        else:
+            conversation[key] = new_state
+        self._record((OP_CONVERSATION_SET, name, key, new_state))
+        await self._drain()
+
+    async def update_user_data(self, user_id: int, data: Any) -> None:
+        self._record((OP_USER_SET, user_id, data))
+        await self._drain()
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        self._record((OP_CHAT_SET, chat_id, data))
+        await self._drain()
+
+    async def update_callback_data(self, data: Any) -> None:
+        if data == self._callback_data_shadow:
+            return
+        self._callback_data_shadow = deepcopy(data)
+        self._record((OP_CALLBACK_SET, data))
+        await self._drain()
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        """只记录发生变化的键：登记的集合写入脏记录，其余键在线程中与上次写入的内容对比"""
+        await self._ensure_loaded()
+        async with self._bot_data_lock:
+            for key in self._tracked_keys:
+                if key in data:
+                    self._write_tracked_key(key, data[key])
+            for key in [key for key in self._persisted_tracked_keys if key not in data]:
+                self._record((OP_BOT_DEL, key))
+                self._persisted_tracked_keys.discard(key)
+            # 事件循环中只做浅拷贝（未登记的键只保存设置等简单的值），深度对比和复制交给线程
+            untracked = {key: copy(value) for key, value in data.items() if key not in self._tracked_keys}
+            payloads, shadow = await asyncio.to_thread(_diff_bot_data, untracked, self._bot_data_shadow)
+            self._bot_data_shadow = {key: value for key, value in shadow.items() if key not in self._tracked_keys}
+            self._pending.extend(payloads)
+        await self._drain()
+
+    def _write_tracked_key(self, key: Any, value: Any) -> None:
+        """只写入被标记为脏的记录"""
+        dirty = self._dirty.pop(key, None)
+        if key not in self._persisted_tracked_keys or not isinstance(value, dict):
+            self._record((OP_BOT_SET, key, value))
+            self._persisted_tracked_keys.add(key)
+            return
+        if not dirty:
+            return
+        for sub_key in dirty:
+            if sub_key in value:
+                self._record((OP_BOT_ITEM_SET, key, sub_key, value[sub_key]))
+            else:
+                self._record((OP_BOT_ITEM_DEL, key, sub_key))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._record((OP_CHAT_DEL, chat_id))
+        await self._drain()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._record((OP_USER_DEL, user_id))
+        await self._drain()
+
+    async def refresh_user_data(self, user_id: int, user_data: Any) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """写入剩余变化并等待后台合并结束"""
+        if self._state is None:
+            return
+        if self._updater_task:
+            self._updater_task.cancel()
+            self._updater_task = None
+        if self._application is not None and not self.store_data.bot_data:
+            await self.update_bot_data(self._application.bot_data)
+        await self._drain()
+        if self._compaction_task:
+            await self._compaction_task
+        if self._journal_file:
+            self._journal_file.close()
+            self._journal_file = None
@@ -0,0 +1,37 @@
+# src/repositories/repository_factory.py
+import os
+import weakref
+from typing import TYPE_CHECKING, Union
+
+from telegram.ext import Application
+
+from src.repositories.data_repository import DataRepository
+
+if TYPE_CHECKING:
+    from src.repositories.sqlite_repository import SQLiteDataRepository
+
+# 多机器人模式下每个 application 对应的机器人名称（即数据命名空间）
+_bot_names: "weakref.WeakKeyDictionary[Application, str]" = weakref.WeakKeyDictionary()
+
+
+def set_bot_name(application: Application, bot_name: str) -> None:
+    """登记 application 使用的机器人名称"""
+    _bot_names[application] = bot_name
+
+
+def get_bot_name(application: Application) -> str:
+    """获取 application 的机器人名称，未登记时使用环境变量 BOT_NAME"""
+    return _bot_names.get(application) or os.getenv("BOT_NAME") or "bot"
+
+
+def create_repository(application: Application) -> Union[DataRepository, "SQLiteDataRepository"]:
+    """根据环境变量 DATA_BACKEND 创建数据仓库（memory 或 sqlite）"""
+    backend = os.getenv("DATA_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        # 仅在使用 SQLite 时导入，内存模式启动时无需加载 sqlite3
+        from src.repositories.sqlite_repository import SQLiteDataRepository
+
+        # 未指定 BOT_NAME 时（多机器人模式）所有机器人共享同一个数据库文件
+        path = os.getenv("SQLITE_PATH") or f"data/{os.getenv('BOT_NAME') or 'bots'}.sqlite3"
+        return SQLiteDataRepository(application, path=path, namespace=get_bot_name(application))
+    return DataRepository(application)
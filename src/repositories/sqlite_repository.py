@@ -0,0 +1,597 @@
+# src/repositories/sqlite_repository.py
+import asyncio
+import json
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from telegram.ext import Application
+
+from src.models.ad import Advertisement
+from src.models.banned_word import BannedWord
+from src.models.chat_group import ChatGroup
+from src.models.user import User
+from src.utils.logger import log_error, log_info, log_warning
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    namespace TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    title TEXT,
+    type TEXT,
+    is_ad_group INTEGER NOT NULL DEFAULT 0,
+    joined_at INTEGER,
+    failure_count INTEGER NOT NULL DEFAULT 0,
+    is_active INTEGER NOT NULL DEFAULT 1,
+    schedule TEXT,
+    PRIMARY KEY (namespace, id)
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    namespace TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    is_admin INTEGER NOT NULL DEFAULT 0,
+    joined_at INTEGER,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    PRIMARY KEY (namespace, id)
+);
+CREATE INDEX IF NOT EXISTS idx_users_admin ON users (namespace) WHERE is_admin = 1;
+
+CREATE TABLE IF NOT EXISTS ads (
+    namespace TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    media_id TEXT,
+    media_type TEXT,
+    welcome_text TEXT,
+    ad_text TEXT,
+    buttons TEXT,
+    created_at INTEGER,
+    PRIMARY KEY (namespace, id)
+);
+CREATE INDEX IF NOT EXISTS idx_ads_position ON ads (namespace, position);
+
+CREATE TABLE IF NOT EXISTS banned_words (
+    namespace TEXT NOT NULL,
+    id TEXT NOT NULL,
+    word TEXT NOT NULL,
+    created_by INTEGER,
+    created_at INTEGER,
+    chat_id INTEGER,
+    match_type TEXT NOT NULL DEFAULT 'substring',
+    PRIMARY KEY (namespace, id)
+);
+CREATE INDEX IF NOT EXISTS idx_banned_words_word ON banned_words (namespace, word);
+
+CREATE TABLE IF NOT EXISTS settings (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+GROUP_COLUMNS = "id, title, type, is_ad_group, joined_at, failure_count, is_active, schedule"
+USER_COLUMNS = "id, is_admin, joined_at, username, first_name, last_name"
+AD_COLUMNS = "id, media_id, media_type, welcome_text, ad_text, buttons, created_at"
+BANNED_WORD_COLUMNS = "id, word, created_by, created_at, chat_id, match_type"
+
+# 旧数据库缺少的列：(表, 列, 类型)
+ADDED_COLUMNS = (
+    ('banned_words', 'chat_id', 'INTEGER'),
+    ('banned_words', 'match_type', "TEXT NOT NULL DEFAULT 'substring'"),
+    ('groups', 'failure_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('groups', 'is_active', 'INTEGER NOT NULL DEFAULT 1'),
+    ('groups', 'schedule', 'TEXT'),
+)
+
+# 依赖新增列的索引，补充列之后再创建
+INDEX_SCHEMA = """
+DROP INDEX IF EXISTS idx_groups_ad;
+CREATE INDEX IF NOT EXISTS idx_groups_active_ad ON groups (namespace) WHERE is_ad_group = 1 AND is_active = 1;
+"""
+
+
+class SQLiteStore:
+    """SQLite 连接与线程池，同一数据库文件在进程内共享一个实例"""
+
+    def __init__(self, path: str, max_workers: int = 4):
+        self.path = path
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sqlite')
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            self._add_missing_columns(conn)
+            conn.executescript(INDEX_SCHEMA)
+
+    @staticmethod
+    def _add_missing_columns(conn: sqlite3.Connection) -> None:
+        """为旧版本创建的表补充新增的列"""
+        for table, column, column_type in ADDED_COLUMNS:
+            columns = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                log_info(f"数据表 {table} 已添加列 {column}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个工作线程使用独立的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _call(self, func: Callable[..., Any], *args: Any) -> Any:
+        conn = self._connection()
+        with conn:
+            return func(conn, *args)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在线程池中执行 func(conn, *args)，整体作为一个事务"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, func, *args)
+
+
+_stores: Dict[str, SQLiteStore] = {}
+
+
+def get_store(path: str) -> SQLiteStore:
+    """获取（或创建）数据库文件对应的共享连接池"""
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = SQLiteStore(path)
+    return store
+
+
+def _ad_from_row(row: sqlite3.Row) -> Advertisement:
+    data = dict(row)
+    data['buttons'] = json.loads(data['buttons'] or '[]')
+    return Advertisement.from_dict(data)
+
+
+class SQLiteDataRepository:
+    """基于 SQLite 的数据仓库，接口与 DataRepository 保持一致"""
+
+    def __init__(self, application: Application, path: str, namespace: str):
+        self.app = application
+        self.namespace = namespace
+        self.store = get_store(path)
+
+    def _init_data_structure(self) -> None:
+        """表结构在创建连接池时已初始化"""
+        pass
+
+    async def _get_setting(self, key: str, default: Any = None) -> Any:
+        def query(conn: sqlite3.Connection) -> Any:
+            row = conn.execute(
+                "SELECT value FROM settings WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            return json.loads(row['value']) if row else default
+        return await self.store.run(query)
+
+    async def _set_setting(self, key: str, value: Any) -> None:
+        def query(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO settings (namespace, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+                (self.namespace, key, json.dumps(value))
+            )
+        await self.store.run(query)
+
+    async def import_bot_data(self, bot_data: dict) -> bool:
+        """数据库为空时，从旧版 bot_data 中导入数据"""
+        def query(conn: sqlite3.Connection) -> bool:
+            exists = conn.execute(
+                "SELECT 1 FROM settings WHERE namespace = ? "
+                "UNION ALL SELECT 1 FROM groups WHERE namespace = ? LIMIT 1",
+                (self.namespace, self.namespace)
+            ).fetchone()
+            if exists:
+                return False
+            for group in bot_data.get('groups', {}).values():
+                self._upsert_group(conn, ChatGroup.decode(group))
+            for user in bot_data.get('users', {}).values():
+                self._upsert_user(conn, User.decode(user))
+            ads = bot_data.get('ads', {})
+            ad_order = bot_data.get('ad_order', [])
+            # 已删除的广告在轮询顺序中留有空位（None）
+            for ad_id in ad_order:
+                if ad_id is not None:
+                    self._upsert_ad(conn, Advertisement.decode(ads[ad_id]))
+            # 旧版列表结构的广告（内存模式下由 DataRepository 迁移）
+            for ad in bot_data.get('advertisements') or []:
+                if ad.get('id') and ad['id'] not in ads:
+                    self._upsert_ad(conn, Advertisement.decode(ad))
+            for word in bot_data.get('banned_words', []):
+                self._insert_banned_word(conn, BannedWord.decode(word))
+            settings = dict(bot_data.get('settings', {}))
+            if 'last_ad_index' in bot_data:
+                last_index = bot_data['last_ad_index']
+                settings['last_ad_index'] = sum(
+                    1 for ad_id in ad_order[:last_index + 1] if ad_id is not None
+                ) - 1 if last_index >= 0 else last_index
+            for key, value in settings.items():
+                conn.execute(
+                    "INSERT OR REPLACE INTO settings (namespace, key, value) VALUES (?, ?, ?)",
+                    (self.namespace, key, json.dumps(value))
+                )
+            return True
+
+        try:
+            imported = await self.store.run(query)
+            if imported:
+                log_info(f"已将 bot_data 导入 SQLite: {self.store.path} ({self.namespace})")
+            return imported
+        except Exception as e:
+            log_error(e, "导入 bot_data 到 SQLite 失败")
+            return False
+
+    # 广告相关方法
+    def _upsert_ad(self, conn: sqlite3.Connection, ad: Advertisement) -> None:
+        data = ad.to_dict()
+        # 已存在的广告保持原位置，新广告追加到轮询末尾
+        conn.execute(
+            "INSERT INTO ads (namespace, id, position, media_id, media_type, welcome_text, "
+            "ad_text, buttons, created_at) VALUES (?, ?, "
+            "(SELECT COALESCE(MAX(position), -1) + 1 FROM ads WHERE namespace = ?), "
+            "?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (namespace, id) DO UPDATE SET media_id = excluded.media_id, "
+            "media_type = excluded.media_type, welcome_text = excluded.welcome_text, "
+            "ad_text = excluded.ad_text, buttons = excluded.buttons",
+            (self.namespace, data['id'], self.namespace, data['media_id'], data['media_type'],
+             data['welcome_text'], data['ad_text'], json.dumps(data['buttons']),
+             data['created_at'])
+        )
+
+    async def save_ad(self, ad: Advertisement) -> bool:
+        """保存广告"""
+        if not ad.id:
+            ad.id = str(uuid.uuid4())
+        await self.store.run(self._upsert_ad, ad)
+        return True
+
+    async def get_ad(self, ad_id: str) -> Optional[Advertisement]:
+        """获取单个广告"""
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute(
+                f"SELECT {AD_COLUMNS} FROM ads WHERE namespace = ? AND id = ?",
+                (self.namespace, ad_id)
+            ).fetchone()
+        row = await self.store.run(query)
+        return _ad_from_row(row) if row else None
+
+    async def get_all_ads(self) -> List[Advertisement]:
+        """获取所有广告"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(
+                f"SELECT {AD_COLUMNS} FROM ads WHERE namespace = ? ORDER BY position",
+                (self.namespace,)
+            ).fetchall()
+        return [_ad_from_row(row) for row in await self.store.run(query)]
+
+    async def get_ad_count(self) -> int:
+        """获取广告数量"""
+        def query(conn: sqlite3.Connection) -> int:
+            return conn.execute(
+                "SELECT COUNT(*) FROM ads WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+        return await self.store.run(query)
+
+    async def get_ad_at(self, index: int) -> Optional[Advertisement]:
+        """按轮询顺序获取指定位置的广告"""
+        if index < 0:
+            return None
+
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute(
+                f"SELECT {AD_COLUMNS} FROM ads WHERE namespace = ? "
+                "ORDER BY position LIMIT 1 OFFSET ?",
+                (self.namespace, index)
+            ).fetchone()
+        row = await self.store.run(query)
+        return _ad_from_row(row) if row else None
+
+    async def rotate_ad(self) -> Tuple[Optional[Advertisement], int, int]:
+        """推进轮询位置并返回 (广告, 位置, 广告数量)，读取和写入在同一个事务中完成"""
+        def query(conn: sqlite3.Connection) -> Tuple[Optional[sqlite3.Row], int, int]:
+            # 立即获取写锁，多个进程共享数据库文件时也不会取到同一个位置
+            conn.execute("BEGIN IMMEDIATE")
+            ad_count = conn.execute(
+                "SELECT COUNT(*) FROM ads WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+            if not ad_count:
+                return None, -1, 0
+            row = conn.execute(
+                "SELECT value FROM settings WHERE namespace = ? AND key = 'last_ad_index'",
+                (self.namespace,)
+            ).fetchone()
+            index = ((json.loads(row['value']) if row else -1) + 1) % ad_count
+            conn.execute(
+                "INSERT INTO settings (namespace, key, value) VALUES (?, 'last_ad_index', ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+                (self.namespace, json.dumps(index))
+            )
+            ad_row = conn.execute(
+                f"SELECT {AD_COLUMNS} FROM ads WHERE namespace = ? "
+                "ORDER BY position LIMIT 1 OFFSET ?",
+                (self.namespace, index)
+            ).fetchone()
+            return ad_row, index, ad_count
+        ad_row, index, ad_count = await self.store.run(query)
+        return (_ad_from_row(ad_row) if ad_row else None), index, ad_count
+
+    async def delete_ad(self, ad_id: str) -> bool:
+        """删除广告"""
+        def query(conn: sqlite3.Connection) -> int:
+            return conn.execute(
+                "DELETE FROM ads WHERE namespace = ? AND id = ?", (self.namespace, ad_id)
+            ).rowcount
+        try:
+            if not await self.store.run(query):
+                log_warning(f"未找到广告: {ad_id}")
+                return False
+            log_info(f"成功删除广告: {ad_id}")
+            return True
+        except Exception as e:
+            log_error(e, f"删除广告失败: {ad_id}")
+            return False
+
+    # 用户相关方法
+    def _upsert_user(self, conn: sqlite3.Connection, user: User) -> None:
+        data = user.to_dict()
+        conn.execute(
+            "INSERT OR REPLACE INTO users (namespace, id, is_admin, joined_at, username, "
+            "first_name, last_name) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.namespace, data['id'], int(bool(data['is_admin'])), data['joined_at'],
+             data['username'], data['first_name'], data['last_name'])
+        )
+
+    async def save_user(self, user: User) -> bool:
+        """保存用户信息"""
+        await self.store.run(self._upsert_user, user)
+        return True
+
+    async def get_user(self, user_id: int) -> Optional[User]:
+        """获取用户信息"""
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute(
+                f"SELECT {USER_COLUMNS} FROM users WHERE namespace = ? AND id = ?",
+                (self.namespace, user_id)
+            ).fetchone()
+        row = await self.store.run(query)
+        if row is None:
+            return None
+        data = dict(row)
+        data['is_admin'] = bool(data['is_admin'])
+        return User.from_dict(data)
+
+    async def get_all_admins(self) -> List[User]:
+        """获取所有管理员"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(
+                f"SELECT {USER_COLUMNS} FROM users WHERE namespace = ? AND is_admin = 1",
+                (self.namespace,)
+            ).fetchall()
+        admins = []
+        for row in await self.store.run(query):
+            data = dict(row)
+            data['is_admin'] = True
+            admins.append(User.from_dict(data))
+        return admins
+
+    # 群组相关方法
+    def _upsert_group(self, conn: sqlite3.Connection, group: ChatGroup) -> None:
+        data = group.to_dict()
+        conn.execute(
+            "INSERT OR REPLACE INTO groups (namespace, id, title, type, is_ad_group, joined_at, "
+            "failure_count, is_active, schedule) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.namespace, int(data['id']), data['title'], data['type'],
+             int(data['is_ad_group']), data['joined_at'], data['failure_count'], int(data['is_active']),
+             data['schedule'])
+        )
+
+    async def save_group(self, group: ChatGroup) -> bool:
+        """保存群组信息"""
+        try:
+            await self.store.run(self._upsert_group, group)
+            return True
+        except Exception as e:
+            log_error(e, f"保存群组失败: {group.id}")
+            return False
+
+    async def update_group_info(self, group_id: int, title: str, group_type) -> Optional[ChatGroup]:
+        """更新群组标题和类型，仅在发生变化时写入；群组不存在时创建"""
+        def query(conn: sqlite3.Connection) -> ChatGroup:
+            row = conn.execute(
+                f"SELECT {GROUP_COLUMNS} FROM groups WHERE namespace = ? AND id = ?",
+                (self.namespace, int(group_id))
+            ).fetchone()
+            if row is not None and row['title'] == title and row['type'] == str(group_type):
+                return ChatGroup.from_dict(dict(row))
+            if row is not None:
+                group = ChatGroup.from_dict(dict(row))
+                group.title = title
+                group.type = group_type
+            else:
+                group = ChatGroup(id=group_id, title=title, type=group_type, is_ad_group=False)
+            self._upsert_group(conn, group)
+            return group
+        try:
+            return await self.store.run(query)
+        except Exception as e:
+            log_error(e, f"更新群组信息失败: {group_id}")
+            return None
+
+    async def get_group(self, group_id: int) -> Optional[ChatGroup]:
+        """获取群组信息"""
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute(
+                f"SELECT {GROUP_COLUMNS} FROM groups WHERE namespace = ? AND id = ?",
+                (self.namespace, int(group_id))
+            ).fetchone()
+        try:
+            row = await self.store.run(query)
+            return ChatGroup.from_dict(dict(row)) if row else None
+        except Exception as e:
+            log_error(e, f"获取群组失败: {group_id}")
+            return None
+
+    async def get_ad_groups(self) -> List[ChatGroup]:
+        """获取所有广告群（不含已停用的群组）"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(
+                f"SELECT {GROUP_COLUMNS} FROM groups WHERE namespace = ? AND is_ad_group = 1 AND is_active = 1",
+                (self.namespace,)
+            ).fetchall()
+        return [ChatGroup.from_dict(dict(row)) for row in await self.store.run(query)]
+
+    # 设置相关方法
+    async def set_target_group(self, group_id: int) -> bool:
+        """设置目标群组"""
+        try:
+            await self._set_setting('target_group_id', group_id)
+            log_info(f"设置目标群组成功: {group_id}")
+            return True
+        except Exception as e:
+            log_error(e, f"设置目标群组失败: {group_id}")
+            return False
+
+    async def set_target_channel(self, channel_id: int) -> bool:
+        """设置目标频道"""
+        try:
+            await self._set_setting('target_channel_id', channel_id)
+            log_info(f"设置目标频道成功: {channel_id}")
+            return True
+        except Exception as e:
+            log_error(e, f"设置目标频道失败: {channel_id}")
+            return False
+
+    async def get_target_group_id(self) -> Optional[int]:
+        """获取目标群组ID"""
+        try:
+            return await self._get_setting('target_group_id')
+        except Exception as e:
+            log_error(e, "获取目标群组ID失败")
+            return None
+
+    async def get_target_channel_id(self) -> Optional[int]:
+        """获取目标频道ID"""
+        try:
+            return await self._get_setting('target_channel_id')
+        except Exception as e:
+            log_error(e, "获取目标频道ID失败")
+            return None
+
+    async def set_channel_verification(self, enabled: bool) -> bool:
+        """设置频道验证开关"""
+        try:
+            await self._set_setting('channel_verification_enabled', enabled)
+            log_info(f"频道验证功能已{'启用' if enabled else '禁用'}")
+            return True
+        except Exception as e:
+            log_error(e, "设置频道验证状态失败")
+            return False
+
+    async def get_channel_verification_status(self) -> bool:
+        """获取频道验证开关状态"""
+        try:
+            return await self._get_setting('channel_verification_enabled', True)  # 默认启用
+        except Exception as e:
+            log_error(e, "获取频道验证状态失败")
+            return True  # 出错时默认启用
+
+    async def set_ad_schedule(self, schedule: Optional[str]) -> bool:
+        """设置全局广告投放时间（cron 表达式），None 表示恢复默认"""
+        try:
+            await self._set_setting('ad_schedule', schedule)
+            log_info(f"设置广告投放时间成功: {schedule or '默认'}")
+            return True
+        except Exception as e:
+            log_error(e, "设置广告投放时间失败")
+            return False
+
+    async def get_ad_schedule(self) -> Optional[str]:
+        """获取全局广告投放时间"""
+        try:
+            return await self._get_setting('ad_schedule')
+        except Exception as e:
+            log_error(e, "获取广告投放时间失败")
+            return None
+
+    async def set_quiet_hours(self, quiet_hours: Optional[str]) -> bool:
+        """设置免打扰时段（HH:MM-HH:MM），None 表示关闭"""
+        try:
+            await self._set_setting('quiet_hours', quiet_hours)
+            log_info(f"设置免打扰时段成功: {quiet_hours or '关闭'}")
+            return True
+        except Exception as e:
+            log_error(e, "设置免打扰时段失败")
+            return False
+
+    async def get_quiet_hours(self) -> Optional[str]:
+        """获取免打扰时段"""
+        try:
+            return await self._get_setting('quiet_hours')
+        except Exception as e:
+            log_error(e, "获取免打扰时段失败")
+            return None
+
+    # 禁言词相关方法
+    def _insert_banned_word(self, conn: sqlite3.Connection, banned_word: BannedWord) -> None:
+        data = banned_word.to_dict()
+        conn.execute(
+            "INSERT OR REPLACE INTO banned_words "
+            "(namespace, id, word, created_by, created_at, chat_id, match_type) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.namespace, data['id'] or str(uuid.uuid4()), data['word'],
+             data['created_by'], data['created_at'], data['chat_id'], data['match_type'])
+        )
+
+    async def save_banned_word(self, banned_word: BannedWord) -> bool:
+        """保存禁言词"""
+        try:
+            await self.store.run(self._insert_banned_word, banned_word)
+            return True
+        except Exception as e:
+            log_error(e, "保存禁言词失败")
+            return False
+
+    async def get_all_banned_words(self) -> List[BannedWord]:
+        """获取所有禁言词"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(
+                f"SELECT {BANNED_WORD_COLUMNS} FROM banned_words WHERE namespace = ? "
+                "ORDER BY rowid",
+                (self.namespace,)
+            ).fetchall()
+        try:
+            return [BannedWord.from_dict(dict(row)) for row in await self.store.run(query)]
+        except Exception as e:
+            log_error(e, "获取禁言词列表失败")
+            return []
+
+    async def delete_banned_word(self, word: str, chat_id: Optional[int] = None) -> bool:
+        """删除禁言词（chat_id 为 None 时删除全局禁言词）"""
+        def query(conn: sqlite3.Connection) -> int:
+            return conn.execute(
+                "DELETE FROM banned_words WHERE namespace = ? AND word = ? AND chat_id IS ?",
+                (self.namespace, word, chat_id)
+            ).rowcount
+        try:
+            return bool(await self.store.run(query))
+        except Exception as e:
+            log_error(e, "删除禁言词失败")
+            return False
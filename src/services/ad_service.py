@@ -2,12 +2,26 @@ from typing import List, Optional
 from src.models.ad import Advertisement
 from src.repositories.data_repository import DataRepository
 from src.utils.logger import log_info, log_error
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 import random
 
 class AdService:
     def __init__(self, repository: DataRepository):
         self.repository = repository
     
+    @staticmethod
+    def build_reply_markup(ad: Advertisement) -> InlineKeyboardMarkup:
+        """创建广告按钮，每行两个按钮"""
+        keyboard = []
+        row = []
+        for i, button in enumerate(ad.buttons):
+            row.append(InlineKeyboardButton(button['text'], url=button['url']))
+            # 每两个按钮或最后一个按钮时，添加到键盘
+            if len(row) == 2 or i == len(ad.buttons) - 1:
+                keyboard.append(row)
+                row = []
+        return InlineKeyboardMarkup(keyboard)
+    
     async def create_ad(self, 
                        media_id: str,
                        media_type: str,
@@ -55,10 +69,10 @@ class AdService:
     async def get_random_ad(self) -> Optional[Advertisement]:
         """获取随机广告"""
         try:
-            ads = await self.repository.get_all_ads()
-            if not ads:
+            ad_count = await self.repository.get_ad_count()
+            if not ad_count:
                 return None
-            return random.choice(ads)
+            return await self.repository.get_ad_at(random.randrange(ad_count))
         except Exception as e:
             log_error(e, "获取随机广告失败")
             return None
@@ -66,16 +80,12 @@ class AdService:
     async def get_next_ad(self) -> Optional[Advertisement]:
         """按顺序获取下一个广告（轮询方式）"""
         try:
-            ads = await self.repository.get_all_ads()
-            if not ads:
+            # 读取和推进轮询位置由仓库一次完成，并发投放不会取到同一个广告
+            ad, index, ad_count = await self.repository.rotate_ad()
+            if ad is None:
                 return None
-                
-            last_index = self.repository.app.bot_data.get('last_ad_index', -1)
-            next_index = (last_index + 1) % len(ads)
-            self.repository.app.bot_data['last_ad_index'] = next_index
-            
-            log_info(f"轮询广告: 索引 {next_index + 1}/{len(ads)}")
-            return ads[next_index]
+            log_info(f"轮询广告: 索引 {index + 1}/{ad_count}")
+            return ad
         except Exception as e:
             log_error(e, "获取轮询广告失败")
             return None
\ No newline at end of file
@@ -1,40 +1,241 @@
-from typing import List, Optional
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
 from src.models.banned_word import BannedWord
 from src.repositories.data_repository import DataRepository
-from src.utils.logger import log_error, log_info
+from src.utils.aho_corasick import AhoCorasick
+from src.utils.logger import log_error, log_info, log_warning
+from src.utils.pattern_rules import (
+    MATCH_REGEX,
+    MATCH_SUBSTRING,
+    MATCH_TYPES,
+    MATCH_WILDCARD,
+    PatternSet,
+    UnsafePatternError,
+    compile_rule,
+    probe_rule,
+)
+from src.utils.text_normalizer import fired_rules, normalize
 import uuid
+import weakref
+
+
+@dataclass(slots=True)
+class BannedWordMatch:
+    word: str
+    # 命中所依赖的归一化规则，直接命中时为空
+    rules: Tuple[str, ...] = ()
+    match_type: str = MATCH_SUBSTRING
+
+
+# (禁言词, 规则类型)
+WordRule = Tuple[str, str]
+
+
+class WordMatcher:
+    """禁言词匹配器：包含匹配使用归一化后的自动机，其余规则合并为一个正则
+
+    多个禁言词归一化结果相同时共用一个关键词。
+    """
+
+    __slots__ = ("automaton", "words", "patterns")
+
+    def __init__(self, rules: Iterable[WordRule] = ()):
+        self.automaton = AhoCorasick()
+        # 归一化关键词 -> 对应的原始禁言词
+        self.words: Dict[str, List[str]] = {}
+        self.patterns = PatternSet()
+        for word, match_type in rules:
+            self.add(word, match_type)
+
+    def __len__(self) -> int:
+        return sum(len(words) for words in self.words.values()) + len(self.patterns)
+
+    def add(self, word: str, match_type: str = MATCH_SUBSTRING) -> None:
+        if match_type != MATCH_SUBSTRING:
+            try:
+                self.patterns.add(word, match_type)
+            except UnsafePatternError as e:
+                # 添加时已校验，这里只会遇到校验规则收紧前保存的旧规则
+                log_warning(f"跳过无法使用的禁言规则 {word}: {e}")
+            return
+        key = normalize(word)
+        if not key:
+            return
+        self.words.setdefault(key, []).append(word)
+        self.automaton.add(key)
+
+    def remove(self, word: str, match_type: str = MATCH_SUBSTRING) -> None:
+        if match_type != MATCH_SUBSTRING:
+            self.patterns.remove(word, match_type)
+            return
+        key = normalize(word)
+        words = self.words.get(key)
+        if not words or word not in words:
+            return
+        words.remove(word)
+        if not words:
+            del self.words[key]
+            self.automaton.remove(key)
+
+    def match(self, text: str) -> Optional[BannedWordMatch]:
+        """对消息做一次归一化和一次扫描；有模式规则时再做一次合并正则扫描"""
+        key = self.automaton.search(normalize(text))
+        if key is not None:
+            return BannedWordMatch(self.words[key][0], fired_rules(text, key))
+        if not len(self.patterns):
+            return None
+        hit = self.patterns.search(normalize(text, keep_separators=True))
+        if hit is None:
+            return None
+        return BannedWordMatch(hit[0], match_type=hit[1])
+
+
+class _MatcherState:
+    """同一 application 共享的禁言词及各群组的自动机缓存"""
+
+    __slots__ = ("words", "matchers", "generation")
+
+    def __init__(self):
+        # 生效范围（None 为全局，否则为群组 ID）-> 禁言规则
+        self.words: Optional[Dict[Optional[int], List[WordRule]]] = None
+        # 生效范围 -> 自动机；没有专属禁言词的群组共用全局自动机
+        self.matchers: Dict[Optional[int], WordMatcher] = {}
+        # 每次增删禁言词递增，用于丢弃构建期间已过期的数据
+        self.generation = 0
+
+
+_matcher_states: "weakref.WeakKeyDictionary[object, _MatcherState]" = weakref.WeakKeyDictionary()
+
 
 class BannedWordService:
     def __init__(self, repository: DataRepository):
         self.repository = repository
-    
-    async def add_banned_word(self, word: str, created_by: int) -> bool:
-        """添加禁言词"""
+
+    def _get_state(self) -> _MatcherState:
+        app = self.repository.app
+        state = _matcher_states.get(app)
+        if state is None:
+            state = _matcher_states[app] = _MatcherState()
+        return state
+
+    async def _get_words(self, state: _MatcherState) -> Dict[Optional[int], List[WordRule]]:
+        """按生效范围分组的禁言规则，首次使用时从仓库加载"""
+        if state.words is not None:
+            return state.words
+        generation = state.generation
+        words: Dict[Optional[int], List[WordRule]] = {None: []}
+        for banned_word in await self.get_all_banned_words():
+            words.setdefault(banned_word.chat_id, []).append((banned_word.word, banned_word.match_type))
+        # 加载期间禁言词有变化时不缓存，下次重新加载
+        if state.generation == generation:
+            state.words = words
+        return words
+
+    async def _get_matcher(self, chat_id: Optional[int] = None) -> WordMatcher:
+        """获取群组生效的自动机（全局禁言词 + 群组禁言词），首次使用时构建"""
+        state = self._get_state()
+        generation = state.generation
+        words = await self._get_words(state)
+        scope = chat_id if chat_id in words else None
+        matcher = state.matchers.get(scope)
+        if matcher is not None:
+            return matcher
+        scope_words = words[None] if scope is None else words[None] + words[scope]
+        matcher = WordMatcher(scope_words)
+        if state.generation == generation:
+            state.matchers[scope] = matcher
+            log_info(f"禁言词自动机已构建（{'全局' if scope is None else f'群组 {scope}'}），"
+                     f"共 {len(matcher)} 个禁言词")
+        return matcher
+
+    @staticmethod
+    async def validate_rule(word: str, match_type: str = MATCH_SUBSTRING) -> Optional[str]:
+        """检查禁言规则能否使用，返回错误原因，可用时返回 None"""
+        if match_type not in MATCH_TYPES:
+            return f"未知的规则类型: {match_type}"
+        if match_type == MATCH_SUBSTRING:
+            return None if normalize(word) else "禁言词归一化后为空，无法匹配"
         try:
+            compile_rule(word, match_type)
+            if match_type in (MATCH_REGEX, MATCH_WILDCARD):
+                # 试跑在子进程中进行，等待期间不阻塞事件循环
+                await asyncio.to_thread(probe_rule, word, match_type)
+        except UnsafePatternError as e:
+            return str(e)
+        return None
+
+    async def add_banned_word(
+        self,
+        word: str,
+        created_by: int,
+        chat_id: Optional[int] = None,
+        match_type: str = MATCH_SUBSTRING,
+    ) -> Optional[str]:
+        """添加禁言规则，chat_id 为 None 时全局生效；返回失败原因，成功时返回 None"""
+        try:
+            # 正则区分 \d 与 \D 等转义，不能转小写（匹配时忽略大小写）
+            if match_type != MATCH_REGEX:
+                word = word.lower()
+            error = await self.validate_rule(word, match_type)
+            if error:
+                log_warning(f"禁言规则无法使用 {word}: {error}")
+                return error
             banned_word = BannedWord(
                 id=str(uuid.uuid4()),
-                word=word.lower(),
-                created_by=created_by
+                word=word,
+                created_by=created_by,
+                chat_id=chat_id,
+                match_type=match_type
             )
-            return await self.repository.save_banned_word(banned_word)
+            if not await self.repository.save_banned_word(banned_word):
+                return "保存禁言词失败"
+            state = self._get_state()
+            state.generation += 1
+            if state.words is not None:
+                state.words.setdefault(chat_id, []).append((word, match_type))
+            # 只更新生效范围包含该词的匹配器；群组首个专属禁言词会在下次使用时构建匹配器
+            for scope, matcher in state.matchers.items():
+                if chat_id is None or scope == chat_id:
+                    matcher.add(word, match_type)
+            return None
         except Exception as e:
             log_error(e, "添加禁言词失败")
-            return False
-    
+            return "添加禁言词失败"
+
     async def get_all_banned_words(self) -> List[BannedWord]:
         """获取所有禁言词"""
         return await self.repository.get_all_banned_words()
-    
-    async def delete_banned_word(self, word: str) -> bool:
-        """删除禁言词"""
-        return await self.repository.delete_banned_word(word)
-    
-    async def check_message(self, text: str) -> bool:
-        """检查消息是否包含禁言词"""
+
+    async def delete_banned_word(self, word: str, chat_id: Optional[int] = None) -> bool:
+        """删除禁言词，chat_id 为 None 时删除全局禁言词"""
+        # 正则规则按原样保存，其余规则保存为小写
+        if not await self.repository.delete_banned_word(word, chat_id):
+            if word == word.lower() or not await self.repository.delete_banned_word(word.lower(), chat_id):
+                return False
+            word = word.lower()
+        state = self._get_state()
+        state.generation += 1
+        if state.words is not None and chat_id in state.words:
+            state.words[chat_id] = [rule for rule in state.words[chat_id] if rule[0] != word]
+            if chat_id is not None and not state.words[chat_id]:
+                del state.words[chat_id]
+        # 全局禁言词影响所有群组，群组禁言词只影响该群组
+        if chat_id is None:
+            state.matchers.clear()
+        else:
+            state.matchers.pop(chat_id, None)
+        return True
+
+    async def find_match(self, text: str, chat_id: Optional[int] = None) -> Optional[BannedWordMatch]:
+        """查找消息命中的禁言词及所依赖的归一化规则"""
         try:
-            banned_words = await self.get_all_banned_words()
-            text = text.lower()
-            return any(word.word in text for word in banned_words)
+            matcher = await self._get_matcher(chat_id)
+            return matcher.match(text)
         except Exception as e:
             log_error(e, "检查禁言词失败")
-            return False 
\ No newline at end of file
+            return None
+
+    async def check_message(self, text: str, chat_id: Optional[int] = None) -> bool:
+        """检查消息是否包含禁言词"""
+        return await self.find_match(text, chat_id) is not None
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import ChatMigrated
+from telegram.ext import Application
+
+from src.models.ad import Advertisement
+from src.models.chat_group import ChatGroup
+from src.repositories.broadcast_journal import BroadcastRun, get_broadcast_journal
+from src.repositories.repository_factory import create_repository
+from src.services.ad_service import AdService
+from src.services.message_service import MessageService
+from src.utils.logger import log_error, log_info, log_warning
+from src.utils.outbound_queue import get_outbound_queue, is_chat_unreachable
+
+
+@dataclass(slots=True)
+class GroupOutcome:
+    group_id: int
+    title: Optional[str]
+    success: bool
+    error: Optional[str] = None
+    elapsed: float = 0.0  # 从开始排队到发送完成的秒数
+    unreachable: bool = False  # 失败原因是否为机器人已无法在该群组发言
+    migrated_from: Optional[int] = None  # 群组升级为超级群组时的旧 ID（group_id 为新 ID）
+
+
+@dataclass(slots=True)
+class BroadcastReport:
+    ad_id: Optional[str]
+    outcomes: List[GroupOutcome] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def sent(self) -> int:
+        return sum(1 for outcome in self.outcomes if outcome.success)
+
+    @property
+    def failed(self) -> List[GroupOutcome]:
+        return [outcome for outcome in self.outcomes if not outcome.success]
+
+    def summary(self) -> str:
+        return (f"广告 {self.ad_id} 投放完成: 成功 {self.sent}/{len(self.outcomes)} 个群组，"
+                f"失败 {len(self.failed)} 个，耗时 {self.duration:.1f} 秒")
+
+
+class BroadcastService:
+    """并发向广告群发送广告，同时遵守全局和单个群组的发送频率限制"""
+
+    def __init__(self, application: Application):
+        self.app = application
+        self.queue = get_outbound_queue(application)
+
+    async def send_ad(self, chat_id: int, ad: Advertisement, reply_markup: InlineKeyboardMarkup,
+                      caption: Optional[str] = None) -> None:
+        """根据媒体类型发送广告（经发送队列限流和重试），失败时抛出异常"""
+        if ad.media_type == 'photo':
+            send, media_arg = self.app.bot.send_photo, 'photo'
+        elif ad.media_type == 'video':
+            send, media_arg = self.app.bot.send_video, 'video'
+        else:
+            raise ValueError(f"不支持的广告媒体类型: {ad.media_type}")
+
+        await self.queue.send(chat_id, lambda: send(
+            chat_id=chat_id,
+            caption=ad.ad_text if caption is None else caption,
+            reply_markup=reply_markup,
+            **{media_arg: ad.media_id}
+        ), description="广告")
+
+    async def broadcast(self, ad: Advertisement, groups: List[ChatGroup],
+                        run: Optional[BroadcastRun] = None) -> BroadcastReport:
+        """向所有群组发送广告，返回每个群组的结果和总耗时；指定 run 时逐个记录送达状态"""
+        reply_markup = AdService.build_reply_markup(ad)
+        started = time.monotonic()
+
+        async def send_to_group(group: ChatGroup) -> GroupOutcome:
+            chat_id, migrated_from = group.id, None
+            try:
+                try:
+                    await self.send_ad(chat_id, ad, reply_markup)
+                except ChatMigrated as e:
+                    # 群组已升级为超级群组：改用新 ID 保存后重发，不计入发送失败
+                    await MessageService(create_repository(self.app)).migrate_group(group, e.new_chat_id)
+                    chat_id, migrated_from = e.new_chat_id, group.id
+                    await self.send_ad(chat_id, ad, reply_markup)
+                if run is not None:
+                    await get_broadcast_journal(self.app).delivered(run, group.id)
+                log_info(f"成功发送广告到群组 {group.title} ({chat_id})")
+                return GroupOutcome(chat_id, group.title, True, elapsed=time.monotonic() - started,
+                                    migrated_from=migrated_from)
+            except Exception as e:
+                log_error(e, f"发送广告到群组 {group.title} ({chat_id}) 失败", include_traceback=False)
+                return GroupOutcome(chat_id, group.title, False, str(e), time.monotonic() - started,
+                                    unreachable=is_chat_unreachable(e), migrated_from=migrated_from)
+
+        outcomes = await asyncio.gather(*(send_to_group(group) for group in groups))
+        report = BroadcastReport(ad.id, list(outcomes), time.monotonic() - started)
+        log_info(report.summary())
+        if report.failed:
+            log_warning("投放失败的群组:\n" + "\n".join(
+                f"{outcome.title} ({outcome.group_id}): {outcome.error}" for outcome in report.failed
+            ))
+        return report
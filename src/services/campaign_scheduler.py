@@ -0,0 +1,368 @@
+import asyncio
+import heapq
+import math
+import time
+import weakref
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from telegram.ext import Application
+
+from src.models.ad import Advertisement
+from src.models.chat_group import ChatGroup
+from src.models.timestamp import now_epoch
+from src.repositories.broadcast_journal import BroadcastRun, get_broadcast_journal
+from src.repositories.repository_factory import create_repository
+from src.services.ad_service import AdService
+from src.services.broadcast_service import BroadcastReport, BroadcastService
+from src.services.message_service import MessageService
+from src.services.scheduler_service import notify_deactivated_groups
+from src.utils.cron import CronError, CronExpression, QuietHours, parse_quiet_hours
+from src.utils.logger import TIMEZONE_NAME, log_error, log_info, log_warning
+
+# 默认投放时间：每两小时整点
+DEFAULT_AD_SCHEDULE = '0 */2 * * *'
+# 同一时间点触发的群组在该窗口（秒）内错开发送，避免整点集中请求触发限流
+STAGGER_WINDOW = 600
+# 定期重新加载广告群和投放设置的间隔（秒）
+RELOAD_INTERVAL = 600
+# 跳过免打扰时段时最多尝试的次数：每次直接跳到时段结束，每天最多跳过一次，约为一年
+MAX_QUIET_SKIPS = 400
+# 中断超过该时长的投放不再续发，避免发送过时的广告或与下一次定时投放重叠
+RESUME_MAX_AGE = 3600
+
+
+@dataclass(slots=True)
+class _Slot:
+    """同一触发时间点的一次投放，所有群组使用同一个广告"""
+    fire_at: float
+    waiting: Set[int]  # 仍在堆中等待发送的群组
+    in_flight: int = 0
+    ad: Optional[Advertisement] = None
+    run: Optional[BroadcastRun] = None
+    report: Optional[BroadcastReport] = None
+    deactivated: List[ChatGroup] = field(default_factory=list)
+    started: bool = False
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class CampaignScheduler:
+    """广告投放调度器
+
+    每个广告群按全局或群组单独的 cron 表达式计算下一次发送时间，所有群组放在一个
+    按发送时间排序的最小堆中；同一时间点触发的群组按群组ID散列在窗口内错开。
+    """
+
+    def __init__(self, application: Application, stagger_window: int = STAGGER_WINDOW):
+        self.app = application
+        self.stagger_window = stagger_window
+        self.tz = ZoneInfo(TIMEZONE_NAME)
+        # (发送时间, 触发时间, 群组ID)
+        self._heap: List[Tuple[float, float, int]] = []
+        # 群组ID -> (cron 表达式, 免打扰时段)
+        self._schedules: Dict[int, Tuple[CronExpression, Optional[QuietHours]]] = {}
+        # 群组ID -> 最近一次已处理的触发时间，重新加载时不会重复发送
+        self._last_fired: Dict[int, float] = {}
+        # 触发时间 -> 仍在堆中等待的群组
+        self._waiting: Dict[float, Set[int]] = {}
+        self._slots: Dict[float, _Slot] = {}
+        self._wakeup = asyncio.Event()
+        self._loaded_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._sends: Set[asyncio.Task] = set()
+
+    def stagger_offset(self, group_id: int) -> float:
+        """群组在错开窗口内的固定偏移（秒），重启后保持不变"""
+        if self.stagger_window <= 0:
+            return 0.0
+        return zlib.crc32(str(group_id).encode()) % (self.stagger_window * 1000) / 1000
+
+    def _next_send(self, group_id: int, after: float) -> Optional[Tuple[float, float]]:
+        """触发时间 after 之后的下一次 (发送时间, 触发时间)，跳过发送时间落在免打扰时段的触发"""
+        cron, quiet_hours = self._schedules[group_id]
+        moment = datetime.fromtimestamp(after, self.tz)
+        offset = self.stagger_offset(group_id)
+        try:
+            for _ in range(MAX_QUIET_SKIPS):
+                moment = cron.next_after(moment)
+                send_at = moment.timestamp() + offset
+                send_moment = datetime.fromtimestamp(send_at, self.tz)
+                if quiet_hours is None or not quiet_hours.contains(send_moment):
+                    return send_at, moment.timestamp()
+                # 发送时间早于时段结束的触发都落在同一免打扰时段内，直接跳过
+                quiet_end = quiet_hours.end_after(send_moment).timestamp() - offset
+                moment = max(moment, datetime.fromtimestamp(quiet_end, self.tz) - timedelta(minutes=1))
+        except CronError as e:
+            log_warning(f"群组 {group_id} 的投放时间无法调度: {e}")
+            return None
+        log_warning(f"群组 {group_id} 的投放时间全部落在免打扰时段内，不再调度")
+        return None
+
+    def _always_quiet(self, cron: CronExpression, quiet_hours: Optional[QuietHours]) -> bool:
+        """每个触发时刻加上错开窗口内的任意偏移后都落在免打扰时段内，即任何群组都不会发送"""
+        if quiet_hours is None:
+            return False
+        window = max(1, math.ceil(self.stagger_window / 60))
+        return all(quiet_hours.covers(hour * 60 + minute, window) for hour in cron.hours for minute in cron.minutes)
+
+    def _push(self, group_id: int, entry: Optional[Tuple[float, float]]) -> None:
+        if entry is None:
+            return
+        send_at, fire_at = entry
+        heapq.heappush(self._heap, (send_at, fire_at, group_id))
+        self._waiting.setdefault(fire_at, set()).add(group_id)
+
+    async def reload(self) -> None:
+        """重新读取广告群和投放设置并重建调度堆"""
+        # 先记录加载时间，加载期间再次请求重新加载时不会被覆盖
+        self._loaded_at = time.time()
+        try:
+            repository = create_repository(self.app)
+            default_schedule = await repository.get_ad_schedule() or DEFAULT_AD_SCHEDULE
+            try:
+                quiet_hours = parse_quiet_hours(await repository.get_quiet_hours())
+            except CronError as e:
+                log_warning(f"免打扰时段设置无效，已忽略: {e}")
+                quiet_hours = None
+            # 直接查询仓库，MessageService.get_ad_groups 会逐个群组写日志
+            groups = await repository.get_ad_groups()
+
+            crons: Dict[str, CronExpression] = {}
+            schedules = {}
+            for group in groups:
+                expression = group.schedule or default_schedule
+                try:
+                    if expression not in crons:
+                        crons[expression] = CronExpression(expression)
+                    schedules[group.id] = (crons[expression], quiet_hours)
+                except CronError as e:
+                    log_warning(f"群组 {group.id} 的投放时间无效，使用全局设置: {e}")
+                    schedules[group.id] = (CronExpression(DEFAULT_AD_SCHEDULE), quiet_hours)
+
+            now = time.time()
+            self._schedules = schedules
+            self._last_fired = {
+                group_id: fired for group_id, fired in self._last_fired.items() if group_id in schedules
+            }
+            self._heap = []
+            self._waiting = {}
+            # (cron 表达式, 免打扰时段) -> 是否永远不会发送，同一设置的群组只判断一次
+            always_quiet: Dict[Tuple[str, str], bool] = {}
+            for group_id, (cron, group_quiet_hours) in schedules.items():
+                key = (cron.expression, str(group_quiet_hours))
+                if key not in always_quiet:
+                    always_quiet[key] = self._always_quiet(cron, group_quiet_hours)
+                    if always_quiet[key]:
+                        log_warning(f"投放时间 {cron} 的触发全部落在免打扰时段 {group_quiet_hours} 内，"
+                                    f"使用该设置的群组不会投放")
+                if always_quiet[key]:
+                    continue
+                # 已错过发送时间的触发直接跳过，中断的投放由投放日志续发
+                after = max(self._last_fired.get(group_id, 0.0), now - self.stagger_window)
+                entry = self._next_send(group_id, after)
+                while entry is not None and entry[0] < now:
+                    entry = self._next_send(group_id, entry[1])
+                self._push(group_id, entry)
+
+            # 进行中的投放只等待仍在堆中的群组
+            for fire_at, slot in list(self._slots.items()):
+                slot.waiting = self._waiting.get(fire_at, set())
+                self._finish_if_done(slot)
+
+            log_info(f"广告调度已加载: {len(schedules)} 个广告群，默认投放时间 {default_schedule}，"
+                     f"免打扰时段 {quiet_hours or '无'}")
+        except Exception as e:
+            log_error(e, "加载广告调度失败")
+        finally:
+            self._wakeup.set()
+
+    def request_reload(self) -> None:
+        """设置或广告群变化后调用，在后台重新加载"""
+        self._loaded_at = 0.0
+        self._wakeup.set()
+
+    def next_send_at(self) -> Optional[datetime]:
+        """最近一次待发送的时间"""
+        return datetime.fromtimestamp(self._heap[0][0], self.tz) if self._heap else None
+
+    @property
+    def scheduled_groups(self) -> int:
+        return len(self._heap)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止调度并取消进行中的发送
+
+        投放日志只包含已派发的群组，下次启动时续发其中未送达的群组，
+        同一时间点尚未派发的群组仍按各自的错开时间发送。
+        """
+        tasks = [task for task in (self._task, *self._sends) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        resumed = await self._load_unfinished()
+        await self.reload()
+        for slot, pending in resumed:
+            if pending:
+                self._spawn_send(slot, pending)
+            slot.in_flight -= 1
+            self._finish_if_done(slot)
+        while True:
+            if time.time() - self._loaded_at >= RELOAD_INTERVAL:
+                await self.reload()
+            timeout = max(0.0, self._loaded_at + RELOAD_INTERVAL - time.time())
+            if self._heap:
+                timeout = min(timeout, max(0.0, self._heap[0][0] - time.time()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._dispatch_due()
+
+    def _dispatch_due(self) -> None:
+        """取出所有到期的群组，按触发时间分批发送"""
+        now = time.time()
+        batches: Dict[float, List[int]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            _, fire_at, group_id = heapq.heappop(self._heap)
+            waiting = self._waiting.get(fire_at)
+            if waiting is not None:
+                waiting.discard(group_id)
+            self._last_fired[group_id] = fire_at
+            batches.setdefault(fire_at, []).append(group_id)
+            self._push(group_id, self._next_send(group_id, fire_at))
+        for fire_at, group_ids in batches.items():
+            slot = self._slots.get(fire_at)
+            if slot is None:
+                slot = self._slots[fire_at] = _Slot(fire_at, self._waiting.get(fire_at, set()))
+            self._spawn_send(slot, group_ids)
+        for fire_at in [fire_at for fire_at, waiting in self._waiting.items() if not waiting]:
+            del self._waiting[fire_at]
+
+    def _spawn_send(self, slot: _Slot, group_ids: List[int]) -> None:
+        slot.in_flight += len(group_ids)
+        task = asyncio.create_task(self._send(slot, group_ids))
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+
+    async def _load_unfinished(self) -> List[Tuple[_Slot, List[int]]]:
+        """读取上次进程退出时未完成的投放，恢复为进行中的时间点，返回 (时间点, 待续发的群组)
+
+        投放日志中的群组都已派发过，不会再按该触发时间调度；同一时间点尚未派发的群组
+        重新加载后加入恢复的时间点，沿用同一个广告和投放日志。
+        """
+        journal = get_broadcast_journal(self.app)
+        repository = create_repository(self.app)
+        resumed = []
+        for run in await journal.load_unfinished():
+            try:
+                fire_at = run.fire_at if run.fire_at is not None else float(run.started_at)
+                for group_id in run.group_ids:
+                    self._last_fired[group_id] = max(self._last_fired.get(group_id, 0.0), fire_at)
+                if now_epoch() - run.started_at > RESUME_MAX_AGE:
+                    log_warning(f"投放 {run.run_id} 已中断超过 {RESUME_MAX_AGE} 秒，不再续发")
+                    await journal.finish(run)
+                    continue
+                ad = await repository.get_ad(run.ad_id) if run.ad_id else None
+                if not ad:
+                    log_warning(f"投放 {run.run_id} 的广告 {run.ad_id} 已不存在，不再续发")
+                    await journal.finish(run)
+                    continue
+                pending = run.pending_group_ids
+                log_info(f"续发中断的投放 {run.run_id}: 已送达 {len(run.delivered)} 个群组，剩余 {len(pending)} 个")
+                # in_flight 先占 1，首次重新加载确定等待的群组之前不会结束该时间点
+                slot = self._slots[fire_at] = _Slot(
+                    fire_at, set(), in_flight=1, ad=ad, run=run, report=BroadcastReport(ad.id), started=True
+                )
+                resumed.append((slot, pending))
+            except Exception as e:
+                log_error(e, f"续发投放 {run.run_id} 失败")
+        return resumed
+
+    async def _start_slot(self, slot: _Slot, group_ids: List[int]) -> None:
+        """时间点内第一批群组到期时选择广告，并把已派发的群组登记到投放日志"""
+        repository = create_repository(self.app)
+        slot.started = True
+        slot.ad = await AdService(repository).get_next_ad()
+        if not slot.ad:
+            log_info("没有可用的广告")
+            return
+        slot.report = BroadcastReport(slot.ad.id)
+        slot.run = await get_broadcast_journal(self.app).start(slot.ad.id, group_ids, slot.fire_at)
+
+    async def _send(self, slot: _Slot, group_ids: List[int]) -> None:
+        try:
+            async with slot.lock:
+                if not slot.started:
+                    await self._start_slot(slot, group_ids)
+                elif slot.run is not None:
+                    await get_broadcast_journal(self.app).add_groups(slot.run, group_ids)
+            if not slot.ad:
+                return
+
+            repository = create_repository(self.app)
+            groups = []
+            for group_id in group_ids:
+                group = await repository.get_group(group_id)
+                # 等待期间可能被取消广告群或停用
+                if group and group.is_ad_group and group.is_active:
+                    groups.append(group)
+            if not groups:
+                return
+
+            report = await BroadcastService(self.app).broadcast(slot.ad, groups, slot.run)
+            slot.report.outcomes.extend(report.outcomes)
+            if any(outcome.migrated_from is not None for outcome in report.outcomes):
+                # 升级后的群组以新 ID 调度
+                self.request_reload()
+            slot.deactivated.extend(await MessageService(repository).record_broadcast_results(groups, report))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log_error(e, "定时发送广告任务失败")
+        finally:
+            slot.in_flight -= len(group_ids)
+            self._finish_if_done(slot)
+
+    def _finish_if_done(self, slot: _Slot) -> None:
+        if slot.in_flight or slot.waiting or self._slots.get(slot.fire_at) is not slot:
+            return
+        del self._slots[slot.fire_at]
+        if slot.run is None:
+            return
+        task = asyncio.create_task(self._finish_slot(slot))
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+
+    async def _finish_slot(self, slot: _Slot) -> None:
+        """时间点内所有群组发送完毕：结束投放日志，汇总结果并通知被停用的群组"""
+        try:
+            await get_broadcast_journal(self.app).finish(slot.run)
+            slot.report.duration = time.time() - slot.fire_at
+            fired = datetime.fromtimestamp(slot.fire_at, self.tz).strftime('%m-%d %H:%M')
+            log_info(f"{fired} 时段{slot.report.summary()}")
+            if slot.deactivated:
+                await notify_deactivated_groups(self.app, create_repository(self.app), slot.deactivated)
+        except Exception as e:
+            log_error(e, "结束广告投放失败")
+
+
+_schedulers: "weakref.WeakKeyDictionary[Application, CampaignScheduler]" = weakref.WeakKeyDictionary()
+
+
+def get_campaign_scheduler(application: Application) -> CampaignScheduler:
+    """获取 application 的广告投放调度器"""
+    scheduler = _schedulers.get(application)
+    if scheduler is None:
+        scheduler = _schedulers[application] = CampaignScheduler(application)
+    return scheduler
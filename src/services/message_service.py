@@ -1,9 +1,80 @@
-from typing import Optional, List
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Dict, Optional, List, Set, Tuple
 from src.models.chat_group import ChatGroup
 from src.repositories.data_repository import DataRepository
 from src.utils.logger import log_info, log_error, log_warning
-from telegram import Message
+from src.utils.single_flight import SingleFlight
+from src.utils.ttl_cache import TTLCache
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Message
 from datetime import datetime
+import asyncio
+import time
+import weakref
+
+if TYPE_CHECKING:
+    from src.services.broadcast_service import BroadcastReport
+
+# 频道订阅状态缓存：已关注的用户缓存较久，未关注的用户很快重新检查，以便关注后尽快放行
+SUBSCRIPTION_POSITIVE_TTL = 600
+SUBSCRIPTION_NEGATIVE_TTL = 30
+SUBSCRIPTION_CACHE_SIZE = 10000
+MEMBER_STATUSES = ('member', 'administrator', 'creator')
+# 由 chat_member 更新得到的成员状态：超过该时长未更新时改为查询 API（防止停机期间漏掉更新）
+MEMBERSHIP_MAX_AGE = 86400
+MEMBERSHIP_MAX_ENTRIES = 200000
+# 频道信息（标题、用户名、链接）的缓存时长；获取失败时使用临时链接并较快重试
+CHANNEL_INFO_TTL = 3600
+CHANNEL_INFO_RETRY_TTL = 60
+# 广告群连续多少次因无法发言而投放失败后停用
+MAX_GROUP_SEND_FAILURES = 3
+
+
+@dataclass(slots=True)
+class ChannelInfo:
+    id: int
+    title: Optional[str]
+    username: Optional[str]
+    link: str
+    # 预先构建的提醒消息按钮
+    reply_markup: InlineKeyboardMarkup
+    expires_at: float
+
+
+def build_channel_link(channel_id: int, username: Optional[str] = None,
+                       invite_link: Optional[str] = None) -> str:
+    """生成频道链接：公开频道用用户名，私有频道优先使用邀请链接"""
+    if username:
+        return f"https://t.me/{username}"
+    if invite_link:
+        return invite_link
+    # 移除 -100 前缀（如果存在）
+    clean_channel_id = str(channel_id)
+    if clean_channel_id.startswith('-100'):
+        clean_channel_id = clean_channel_id[4:]
+    return f"https://t.me/c/{clean_channel_id}"
+
+
+
+class _SubscriptionState:
+    """同一 application 共享的订阅状态缓存、频道成员表和进行中的查询"""
+
+    __slots__ = ("cache", "inflight", "channel_inflight", "members", "member_hits", "channel", "tasks")
+
+    def __init__(self):
+        self.cache = TTLCache(SUBSCRIPTION_CACHE_SIZE)
+        # 成员查询和频道信息查询分开合并，统计互不干扰
+        self.inflight = SingleFlight()
+        self.channel_inflight = SingleFlight()
+        # (频道ID, 用户ID) -> (是否成员, 更新时间)，按更新时间排序
+        self.members: Dict[Tuple[int, int], Tuple[bool, float]] = {}
+        self.member_hits = 0
+        self.channel: Optional[ChannelInfo] = None
+        # 后台刷新任务，保留引用以免被垃圾回收
+        self.tasks: Set[asyncio.Task] = set()
+
+
+_subscription_states: "weakref.WeakKeyDictionary[object, _SubscriptionState]" = weakref.WeakKeyDictionary()
+
 
 class MessageService:
     def __init__(self, repository: DataRepository):
@@ -12,24 +83,8 @@ class MessageService:
     async def register_group(self, group_id: int, title: str, group_type: str) -> bool:
         """注册群组"""
         try:
-            # 先获取现有的群组信息
-            existing_group = await self.repository.get_group(group_id)
-            
-            if existing_group:
-                # 如果群组存在，只更新基本信息
-                existing_group.title = title
-                existing_group.type = group_type
-                group = existing_group
-            else:
-                # 如果是新群组，创建新的记录
-                group = ChatGroup(
-                    id=group_id,
-                    title=title,
-                    type=group_type,
-                    is_ad_group=False
-                )
-            
-            success = await self.repository.save_group(group)
+            group = await self.repository.update_group_info(group_id, title, group_type)
+            success = group is not None
             if success:
                 log_info(f"注册群组成功: {group_id} ({title})")
             return success
@@ -68,6 +123,10 @@ class MessageService:
                 return False
             
             group.is_ad_group = is_ad_group
+            if is_ad_group:
+                # 重新设置为广告群时恢复已停用的群组
+                group.is_active = True
+                group.failure_count = 0
             success = await self.repository.save_group(group)
             if success:
                 log_info(f"{'设置' if is_ad_group else '取消'}广告群成功: {group_id}")
@@ -76,32 +135,199 @@ class MessageService:
             log_error(e, f"设置广告群状态失败: {group_id}")
             return False
     
+    async def migrate_group(self, group: ChatGroup, new_chat_id: int) -> Optional[ChatGroup]:
+        """群组升级为超级群组后以新 ID 保存（保留广告群和投放设置），旧记录不再投放，目标群组设置同步更新"""
+        try:
+            existing = await self.repository.get_group(new_chat_id)
+            migrated = replace(
+                group,
+                id=new_chat_id,
+                title=existing.title if existing else group.title,
+                type=existing.type if existing else 'supergroup',
+                failure_count=0,
+            )
+            if not await self.repository.save_group(migrated):
+                return None
+            await self.repository.save_group(replace(group, is_ad_group=False))
+            if await self.repository.get_target_group_id() == group.id:
+                await self.repository.set_target_group(new_chat_id)
+            log_info(f"群组 {group.title} ({group.id}) 已升级为超级群组，改用新 ID {new_chat_id}")
+            return migrated
+        except Exception as e:
+            log_error(e, f"迁移群组失败: {group.id} -> {new_chat_id}")
+            return None
+
+    async def record_broadcast_results(self, groups: List[ChatGroup], report: "BroadcastReport") -> List[ChatGroup]:
+        """根据投放结果更新群组的连续失败次数，返回本次被停用的群组"""
+        deactivated = []
+        try:
+            outcomes = {outcome.group_id: outcome for outcome in report.outcomes}
+            for group in groups:
+                outcome = outcomes.get(group.id)
+                if outcome is None:
+                    continue
+                if outcome.success:
+                    if not group.failure_count:
+                        continue
+                    group.failure_count = 0
+                elif outcome.unreachable:
+                    group.failure_count += 1
+                    if group.failure_count >= MAX_GROUP_SEND_FAILURES:
+                        group.is_active = False
+                        deactivated.append(group)
+                        log_warning(f"广告群 {group.title} ({group.id}) 连续 {group.failure_count} 次无法发送，已停用")
+                else:
+                    # 网络等临时错误不能说明群组已失效
+                    continue
+                await self.repository.save_group(group)
+        except Exception as e:
+            log_error(e, "更新广告群投放状态失败")
+        return deactivated
+
+    def _get_subscription_state(self) -> _SubscriptionState:
+        app = self.repository.app
+        state = _subscription_states.get(app)
+        if state is None:
+            state = _subscription_states[app] = _SubscriptionState()
+        return state
+
+    def get_subscription_cache(self) -> TTLCache:
+        """同一 application 共享的订阅状态缓存，键为 (频道ID, 用户ID)"""
+        return self._get_subscription_state().cache
+
+    def get_subscription_stats(self) -> dict:
+        """订阅状态缓存的命中统计，以及被合并的并发查询次数"""
+        state = self._get_subscription_state()
+        stats = state.cache.stats()
+        stats['requests'] = state.inflight.calls
+        stats['coalesced'] = state.inflight.shared
+        stats['members_known'] = len(state.members)
+        stats['member_hits'] = state.member_hits
+        return stats
+
+    async def _fetch_channel_info(self, channel_id: int, bot) -> ChannelInfo:
+        """请求频道信息并构建链接和提醒按钮，结果写入缓存"""
+        try:
+            channel = await bot.get_chat(channel_id)
+            log_info(f"成功获取频道信息: {channel.title} ({channel.id})")
+            title, username = channel.title, channel.username
+            link = build_channel_link(channel_id, username, channel.invite_link)
+            ttl = CHANNEL_INFO_TTL
+        except Exception as e:
+            log_error(e, f"获取频道信息失败: {channel_id}")
+            # 获取失败时仍然提供链接，稍后重试
+            title, username = None, None
+            link = build_channel_link(channel_id)
+            ttl = CHANNEL_INFO_RETRY_TTL
+        info = ChannelInfo(
+            id=channel_id,
+            title=title,
+            username=username,
+            link=link,
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("点击关注频道", url=link)]]),
+            expires_at=time.monotonic() + ttl,
+        )
+        self._get_subscription_state().channel = info
+        return info
+
+    async def get_channel_info(self, bot, force: bool = False) -> Optional[ChannelInfo]:
+        """获取目标频道信息，优先使用缓存；未设置目标频道时返回 None"""
+        channel_id = await self.repository.get_target_channel_id()
+        if not channel_id:
+            return None
+        state = self._get_subscription_state()
+        info = state.channel
+        if not force and info is not None and info.id == channel_id and info.expires_at > time.monotonic():
+            return info
+        # 多条提醒同时需要频道信息时只请求一次
+        return await state.channel_inflight.run(
+            channel_id,
+            lambda: self._fetch_channel_info(channel_id, bot)
+        )
+
+    def refresh_channel_info(self, bot) -> None:
+        """在后台刷新目标频道信息（修改目标频道后调用）"""
+        state = self._get_subscription_state()
+        state.channel = None
+        task = asyncio.create_task(self.get_channel_info(bot, force=True))
+        state.tasks.add(task)
+        task.add_done_callback(state.tasks.discard)
+
+    def record_channel_member(self, channel_id: int, user_id: int, status: str) -> None:
+        """根据 chat_member 更新记录用户在频道中的状态"""
+        state = self._get_subscription_state()
+        key = (channel_id, user_id)
+        # 重新插入以保持按更新时间排序，超出上限时淘汰最早的记录
+        state.members.pop(key, None)
+        state.members[key] = (status in MEMBER_STATUSES, time.monotonic())
+        while len(state.members) > MEMBERSHIP_MAX_ENTRIES:
+            del state.members[next(iter(state.members))]
+        # 事件比缓存的查询结果更新
+        state.cache.pop(key)
+
+    def _lookup_member(self, state: _SubscriptionState, key: Tuple[int, int]) -> Optional[bool]:
+        """从成员表查询，未见过或记录过旧时返回 None"""
+        entry = state.members.get(key)
+        if entry is None:
+            return None
+        is_member, updated_at = entry
+        if time.monotonic() - updated_at > MEMBERSHIP_MAX_AGE:
+            del state.members[key]
+            return None
+        state.member_hits += 1
+        return is_member
+
+    async def _fetch_subscription(self, channel_id: int, user_id: int, bot) -> Optional[bool]:
+        """请求用户在频道中的状态并写入缓存，失败时返回 None 且不缓存
+
+        查询结果只按正/负 TTL 缓存；成员表只记录 chat_member 事件（机器人不是频道管理员时收不到事件，
+        若写入成员表会让结果长期不更新）。
+        """
+        log_info(f"检查用户 {user_id} 是否关注频道 {channel_id}")
+        try:
+            # 获取用户在频道中的状态
+            member = await bot.get_chat_member(
+                chat_id=channel_id,
+                user_id=user_id
+            )
+        except Exception as e:
+            log_error(e, f"获取用户 {user_id} 的频道成员状态失败")
+            return None
+        is_member = member.status in MEMBER_STATUSES
+        log_info(f"用户 {user_id} 的频道成员状态: {member.status}")
+        self.get_subscription_cache().set(
+            (channel_id, user_id),
+            is_member,
+            SUBSCRIPTION_POSITIVE_TTL if is_member else SUBSCRIPTION_NEGATIVE_TTL
+        )
+        return is_member
+
     async def check_channel_subscription(self, user_id: int, bot) -> bool:
         """检查用户是否关注了目标频道"""
         try:
             # 从设置中获取目标频道ID
-            settings = self.repository.app.bot_data.get('settings', {})
-            target_channel_id = settings.get('target_channel_id')
+            target_channel_id = await self.repository.get_target_channel_id()
             
             if not target_channel_id:
                 log_warning("未设置目标频道ID")
                 return True
             
-            log_info(f"检查用户 {user_id} 是否关注频道 {target_channel_id}")
+            state = self._get_subscription_state()
+            cache_key = (target_channel_id, user_id)
+            # 优先使用 chat_member 更新维护的成员表，其次是查询结果缓存，最后才请求 API
+            known = self._lookup_member(state, cache_key)
+            if known is not None:
+                return known
+            cached = state.cache.get(cache_key)
+            if cached is not None:
+                return cached
             
-            try:
-                # 获取用户在频道中的状态
-                member = await bot.get_chat_member(
-                    chat_id=target_channel_id,
-                    user_id=user_id
-                )
-                is_member = member.status in ['member', 'administrator', 'creator']
-                log_info(f"用户 {user_id} 的频道成员状态: {member.status}")
-                return is_member
-                
-            except Exception as e:
-                log_error(e, f"获取用户 {user_id} 的频道成员状态失败")
-                return False
+            # 同一用户的并发消息共用一次 get_chat_member 请求
+            is_member = await state.inflight.run(
+                cache_key,
+                lambda: self._fetch_subscription(target_channel_id, user_id, bot)
+            )
+            return bool(is_member)
                 
         except Exception as e:
             log_error(e, "检查频道订阅状态失败")
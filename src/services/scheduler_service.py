@@ -1,123 +1,25 @@
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes
-from src.services.ad_service import AdService
-from src.services.message_service import MessageService
-from src.utils.logger import log_info, log_error, log_warning
+from typing import List
+from telegram.ext import Application
+from src.models.chat_group import ChatGroup
+from src.services.message_service import MAX_GROUP_SEND_FAILURES
+from src.utils.logger import log_error
+from src.utils.outbound_queue import get_outbound_queue
 from src.repositories.data_repository import DataRepository
 
-async def send_random_ad(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """定时发送随机广告到所有广告群"""
-    try:
-        # 创建新的 data_manager 实例
-        data_manager = DataRepository(context.application)
-        ad_service = AdService(data_manager)
-        message_service = MessageService(data_manager)
 
-        # 获取随机广告
-        ad = await ad_service.get_random_ad()
-        if not ad:
-            log_info("没有可用的广告")
-            return
-
-        # 获取所有广告群
-        ad_groups = await message_service.get_ad_groups()
-        if not ad_groups:
-            log_warning("没有广告投放群组")
-            return
-
-        # 创建广告按钮，每行两个按钮
-        keyboard = []
-        row = []
-        for i, button in enumerate(ad.buttons):
-            row.append(InlineKeyboardButton(button['text'], url=button['url']))
-            # 每两个按钮或最后一个按钮时，添加到键盘
-            if len(row) == 2 or i == len(ad.buttons) - 1:
-                keyboard.append(row)
-                row = []
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        # 向每个广告群发送广告
-        for group in ad_groups:
-            try:
-                # 根据媒体类型发送不同的消息
-                if ad.media_type == 'photo':
-                    await context.bot.send_photo(
-                        chat_id=group.id,
-                        photo=ad.media_id,
-                        caption=ad.ad_text,
-                        reply_markup=reply_markup
-                    )
-                elif ad.media_type == 'video':
-                    await context.bot.send_video(
-                        chat_id=group.id,
-                        video=ad.media_id,
-                        caption=ad.ad_text,
-                        reply_markup=reply_markup
-                    )
-                
-                log_info(f"成功发送广告到群组 {group.title} ({group.id})")
-            except Exception as e:
-                log_error(e, f"发送广告到群组 {group.title} ({group.id}) 失败")
-                continue
-
-    except Exception as e:
-        log_error(e, "定时发送广告任务失败")
-
-
-async def send_next_ad(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """定时发送随机广告到所有广告群"""
-    try:
-        # 创建新的 data_manager 实例
-        data_manager = DataRepository(context.application)
-        ad_service = AdService(data_manager)
-        message_service = MessageService(data_manager)
-
-        # 获取下一个广告
-        ad = await ad_service.get_next_ad()
-        if not ad:
-            log_info("没有可用的广告")
-            return
-
-        # 获取所有广告群
-        ad_groups = await message_service.get_ad_groups()
-        if not ad_groups:
-            log_warning("没有广告投放群组")
-            return
-
-        # 创建广告按钮，每行两个按钮
-        keyboard = []
-        row = []
-        for i, button in enumerate(ad.buttons):
-            row.append(InlineKeyboardButton(button['text'], url=button['url']))
-            # 每两个按钮或最后一个按钮时，添加到键盘
-            if len(row) == 2 or i == len(ad.buttons) - 1:
-                keyboard.append(row)
-                row = []
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        # 向每个广告群发送广告
-        for group in ad_groups:
-            try:
-                # 根据媒体类型发送不同的消息
-                if ad.media_type == 'photo':
-                    await context.bot.send_photo(
-                        chat_id=group.id,
-                        photo=ad.media_id,
-                        caption=ad.ad_text,
-                        reply_markup=reply_markup
-                    )
-                elif ad.media_type == 'video':
-                    await context.bot.send_video(
-                        chat_id=group.id,
-                        video=ad.media_id,
-                        caption=ad.ad_text,
-                        reply_markup=reply_markup
-                    )
-                
-                log_info(f"成功发送广告到群组 {group.title} ({group.id})")
-            except Exception as e:
-                log_error(e, f"发送广告到群组 {group.title} ({group.id}) 失败")
-                continue
-
-    except Exception as e:
-        log_error(e, "定时发送广告任务失败")
\ No newline at end of file
+async def notify_deactivated_groups(application: Application, repository: DataRepository,
+                                     groups: List[ChatGroup]) -> None:
+    """向所有管理员发送被停用群组的汇总"""
+    text = (
+        f"⚠️ 以下 {len(groups)} 个广告群连续 {MAX_GROUP_SEND_FAILURES} 次无法发送广告，已停止投放：\n"
+        + "\n".join(f"• {group.title} ({group.id})" for group in groups)
+        + "\n\n如机器人已重新加入，可使用 /set_target <群组ID> 重新启用"
+    )
+    queue = get_outbound_queue(application)
+    for admin in await repository.get_all_admins():
+        try:
+            await queue.send(admin.id, lambda admin_id=admin.id: application.bot.send_message(
+                chat_id=admin_id, text=text
+            ), description="停用群组通知")
+        except Exception as e:
+            log_error(e, f"向管理员 {admin.id} 发送停用群组通知失败", include_traceback=False)
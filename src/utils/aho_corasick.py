@@ -0,0 +1,99 @@
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式匹配自动机，一次线性扫描即可找出文本中的所有关键词
+
+    支持增量增删关键词：新增只插入新的字典树节点，删除只清除终止标记，
+    失败指针在下一次匹配前统一重算（与关键词数量无关，只遍历一次节点）。
+    """
+
+    __slots__ = ("_goto", "_fail", "_word", "_match", "_words", "_dirty")
+
+    def __init__(self, words: Iterable[str] = ()):
+        # 节点 0 为根节点
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 以该节点结尾的关键词
+        self._word: List[Optional[str]] = [None]
+        # 该节点（含失败链）能匹配到的最长关键词，重建失败指针时计算
+        self._match: List[Optional[str]] = [None]
+        self._words: Dict[str, int] = {}
+        self._dirty = False
+        for word in words:
+            self.add(word)
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._words
+
+    def add(self, word: str) -> bool:
+        """添加关键词，已存在时返回 False"""
+        if not word or word in self._words:
+            return False
+        node = 0
+        for char in word:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._word.append(None)
+                self._match.append(None)
+            node = next_node
+        self._word[node] = word
+        self._words[word] = node
+        self._dirty = True
+        return True
+
+    def remove(self, word: str) -> bool:
+        """删除关键词，不存在时返回 False；空出的节点保留，不影响匹配结果"""
+        node = self._words.pop(word, None)
+        if node is None:
+            return False
+        self._word[node] = None
+        self._dirty = True
+        return True
+
+    def _build(self) -> None:
+        """按广度优先重算失败指针和输出"""
+        goto, fail, match = self._goto, self._fail, self._match
+        queue = deque()
+        for node in goto[0].values():
+            fail[node] = 0
+            match[node] = self._word[node]
+            queue.append(node)
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                match[child] = self._word[child] or match[fail[child]]
+                queue.append(child)
+        self._dirty = False
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """依次返回 (结束位置, 关键词)；同一位置只返回最长的关键词"""
+        if self._dirty:
+            self._build()
+        goto, fail, match = self._goto, self._fail, self._match
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            word = match[state]
+            if word is not None:
+                yield index, word
+
+    def search(self, text: str) -> Optional[str]:
+        """返回文本中最先出现的关键词，没有则返回 None"""
+        for _, word in self.iter_matches(text):
+            return word
+        return None
@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+from typing import FrozenSet, Optional, Tuple
+
+# 常用别名
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+# (名称, 最小值, 最大值)
+CRON_FIELDS = (
+    ('分钟', 0, 59),
+    ('小时', 0, 23),
+    ('日', 1, 31),
+    ('月', 1, 12),
+    ('星期', 0, 7),
+)
+# 查找下一次触发时间的最大年数，超过时认为表达式永远不会触发（例如 2 月 30 日）
+MAX_SEARCH_YEARS = 5
+
+
+class CronError(ValueError):
+    """无效的 cron 表达式或时间段"""
+
+
+def _parse_field(text: str, name: str, low: int, high: int) -> FrozenSet[int]:
+    values = set()
+    for part in text.split(','):
+        value_range, _, step_text = part.partition('/')
+        try:
+            step = int(step_text) if step_text else 1
+            if value_range == '*':
+                start, end = low, high
+            elif '-' in value_range:
+                start_text, end_text = value_range.split('-', 1)
+                start, end = int(start_text), int(end_text)
+            else:
+                start = int(value_range)
+                # "5/15" 表示从 5 开始每 15 个单位
+                end = high if step_text else start
+        except ValueError:
+            raise CronError(f"{name}字段无效: {part}")
+        if step < 1 or start < low or end > high or start > end:
+            raise CronError(f"{name}字段超出范围 {low}-{high}: {part}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronExpression:
+    """五段式 cron 表达式：分 时 日 月 星期（0 和 7 均表示星期日）
+
+    支持 *、列表、范围和步长，日和星期同时指定时满足其一即可（与标准 cron 相同）。
+    """
+
+    __slots__ = ('expression', 'minutes', 'hours', 'days', 'months', 'weekdays', 'any_day', 'any_weekday')
+
+    def __init__(self, expression: str):
+        self.expression = ' '.join(expression.split())
+        fields = CRON_ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != len(CRON_FIELDS):
+            raise CronError(f"cron 表达式需要 5 个字段（分 时 日 月 星期）: {expression}")
+        minutes, hours, days, months, weekdays = (
+            _parse_field(text, *spec) for text, spec in zip(fields, CRON_FIELDS)
+        )
+        self.minutes: Tuple[int, ...] = tuple(sorted(minutes))
+        self.hours: Tuple[int, ...] = tuple(sorted(hours))
+        self.days = days
+        self.months = months
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def __str__(self) -> str:
+        return self.expression
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """moment 之后（不含）的下一次触发时间，按 moment 所在时区的本地时间计算"""
+        tzinfo = moment.tzinfo
+        current = moment.replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        last_year = current.year + MAX_SEARCH_YEARS
+        while current.year <= last_year:
+            if current.month not in self.months:
+                current = (current.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(current):
+                current = current.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            hour = next((hour for hour in self.hours if hour >= current.hour), None)
+            if hour is None:
+                current = current.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if hour != current.hour:
+                current = current.replace(hour=hour, minute=0)
+            minute = next((minute for minute in self.minutes if minute >= current.minute), None)
+            if minute is None:
+                current = current.replace(minute=0) + timedelta(hours=1)
+                continue
+            return current.replace(minute=minute, tzinfo=tzinfo)
+        raise CronError(f"cron 表达式在 {MAX_SEARCH_YEARS} 年内不会触发: {self.expression}")
+
+
+class QuietHours:
+    """每天的免打扰时段，例如 23:00-08:00（可跨越午夜）"""
+
+    __slots__ = ('start', 'end')
+
+    def __init__(self, start: int, end: int):
+        # 从 0 点起的分钟数
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def parse(cls, text: str) -> 'QuietHours':
+        try:
+            start_text, end_text = text.strip().split('-')
+            start, end = (cls._parse_time(part) for part in (start_text, end_text))
+        except ValueError:
+            raise CronError(f"免打扰时段格式应为 HH:MM-HH:MM: {text}")
+        if start == end:
+            raise CronError("免打扰时段的开始和结束时间不能相同")
+        return cls(start, end)
+
+    @staticmethod
+    def _parse_time(text: str) -> int:
+        hour, minute = (int(part) for part in text.strip().split(':'))
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            raise ValueError(text)
+        return hour * 60 + minute
+
+    def __str__(self) -> str:
+        return f"{self.start // 60:02d}:{self.start % 60:02d}-{self.end // 60:02d}:{self.end % 60:02d}"
+
+    def _contains_minute(self, minute: int) -> bool:
+        if self.start < self.end:
+            return self.start <= minute < self.end
+        return minute >= self.start or minute < self.end
+
+    def contains(self, moment: datetime) -> bool:
+        return self._contains_minute(moment.hour * 60 + moment.minute)
+
+    def covers(self, start: int, minutes: int) -> bool:
+        """从 start（0 点起的分钟数）开始的连续 minutes 分钟是否全部在免打扰时段内"""
+        return all(self._contains_minute((start + offset) % 1440) for offset in range(minutes))
+
+    def end_after(self, moment: datetime) -> datetime:
+        """moment 所在免打扰时段的结束时间（moment 应在时段内）"""
+        end = moment.replace(hour=self.end // 60, minute=self.end % 60, second=0, microsecond=0)
+        if end <= moment:
+            end += timedelta(days=1)
+        return end
+
+
+def parse_quiet_hours(text: Optional[str]) -> Optional[QuietHours]:
+    """解析免打扰时段，空值表示不设置"""
+    return QuietHours.parse(text) if text else None
@@ -0,0 +1,93 @@
+import asyncio
+import weakref
+from typing import Dict, List, Set, Tuple
+
+from telegram.ext import Application
+
+from src.utils.logger import log_error, log_info
+
+# 收集待删除消息的时间窗口，窗口内同一群组的删除合并为一次 deleteMessages
+DELETE_BATCH_WINDOW = 0.5
+# deleteMessages 单次最多 100 条
+DELETE_BATCH_SIZE = 100
+
+
+class DeletionQueue:
+    """按群组批量删除消息"""
+
+    def __init__(self, application: Application, window: float = DELETE_BATCH_WINDOW):
+        self.app = application
+        self.window = window
+        # 群组ID -> 待删除的消息ID
+        self._pending: Dict[int, List[int]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        # (群组ID, 消息ID) -> 尚未到期的延迟删除
+        self._delayed: Dict[Tuple[int, int], asyncio.TimerHandle] = {}
+        self.requests = 0
+        self.deleted = 0
+
+    def delete(self, chat_id: int, message_id: int) -> None:
+        """加入删除队列，窗口结束或攒满一批时统一删除"""
+        pending = self._pending.get(chat_id)
+        if pending is None:
+            pending = self._pending[chat_id] = []
+            self._spawn(self._flush_later(chat_id))
+        pending.append(message_id)
+        if len(pending) >= DELETE_BATCH_SIZE:
+            self._spawn(self._flush(chat_id))
+
+    def delete_later(self, chat_id: int, message_id: int, delay: float) -> None:
+        """延迟一段时间后加入删除队列（用于自动清理提醒消息）"""
+        key = (chat_id, message_id)
+        if key in self._delayed:
+            return
+        self._delayed[key] = asyncio.get_running_loop().call_later(delay, self._delete_due, key)
+
+    def _delete_due(self, key: Tuple[int, int]) -> None:
+        del self._delayed[key]
+        self.delete(*key)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_later(self, chat_id: int) -> None:
+        await asyncio.sleep(self.window)
+        await self._flush(chat_id)
+
+    async def _flush(self, chat_id: int) -> None:
+        message_ids = self._pending.pop(chat_id, None)
+        if not message_ids:
+            return
+        for start in range(0, len(message_ids), DELETE_BATCH_SIZE):
+            batch = message_ids[start:start + DELETE_BATCH_SIZE]
+            self.requests += 1
+            try:
+                if len(batch) == 1:
+                    await self.app.bot.delete_message(chat_id, batch[0])
+                else:
+                    await self.app.bot.delete_messages(chat_id, batch)
+                    log_info(f"批量删除群组 {chat_id} 的 {len(batch)} 条消息")
+                self.deleted += len(batch)
+            except Exception as e:
+                log_error(e, f"删除群组 {chat_id} 的消息失败", include_traceback=False)
+
+    async def flush_all(self) -> None:
+        """立即删除所有已入队的消息，尚未到期的延迟删除也提前执行（停止机器人前调用）"""
+        for (chat_id, message_id), handle in self._delayed.items():
+            handle.cancel()
+            self._pending.setdefault(chat_id, []).append(message_id)
+        self._delayed.clear()
+        await asyncio.gather(*(self._flush(chat_id) for chat_id in list(self._pending)))
+
+
+_queues: "weakref.WeakKeyDictionary[Application, DeletionQueue]" = weakref.WeakKeyDictionary()
+
+
+def get_deletion_queue(application: Application) -> DeletionQueue:
+    """获取 application 共享的删除队列"""
+    queue = _queues.get(application)
+    if queue is None:
+        queue = _queues[application] = DeletionQueue(application)
+    return queue
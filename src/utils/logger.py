@@ -1,10 +1,9 @@
 import inspect
 import os
 from datetime import datetime
-import pytz
+from functools import lru_cache
 import traceback
 from typing import Any, Optional
-from wcwidth import wcswidth
 
 COLORS = {
     "INFO": "\033[38;5;82m",     # 亮绿色
@@ -17,7 +16,14 @@ COLORS = {
     "FILENAME": "\033[38;5;240m"  # 灰色，用于文件名
 }
 
-TIMEZONE = pytz.timezone('Asia/Shanghai')
+TIMEZONE_NAME = 'Asia/Shanghai'
+
+
+@lru_cache(maxsize=1)
+def _get_timezone():
+    """首次输出日志时才加载 pytz 时区数据，缩短启动时间"""
+    import pytz
+    return pytz.timezone(TIMEZONE_NAME)
 
 
 def _get_call_info(frame_offset: int = 2):
@@ -36,9 +42,16 @@ def _get_call_info(frame_offset: int = 2):
     return {"line_number": -1, "function_name": "<unknown>", "filename": "<unknown>"}
 
 
+# 首次格式化日志时导入 wcwidth 并缓存，避免每行都执行 import 语句
+_wcswidth = None
+
+
 def _format_line(line: str, width: int) -> str:
     """根据字符宽度动态填充空格，确保表格对齐"""
-    line_width = wcswidth(line)
+    global _wcswidth
+    if _wcswidth is None:
+        from wcwidth import wcswidth as _wcswidth
+    line_width = _wcswidth(line)
     padding = max(0, width - line_width)
     return line + " " * padding
 
@@ -63,7 +76,7 @@ def _format_debug_message(message: Any, level: str, frame_offset: int = 2) -> No
 
     # call_info = _get_call_info(frame_offset)
 
-    timestamp = datetime.now(TIMEZONE).strftime('%m-%d %H:%M:%S')
+    timestamp = datetime.now(_get_timezone()).strftime('%m-%d %H:%M:%S')
     color = COLORS.get(level.upper(), COLORS["INFO"])
 
     # print(f"\n\033[1m{'┌' + '─' * 70 + '┐'}\033[0m")
@@ -0,0 +1,129 @@
+import asyncio
+import random
+import weakref
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, NetworkError, RetryAfter
+from telegram.ext import Application
+
+from src.utils.logger import log_warning
+from src.utils.rate_limiter import get_rate_limiter
+
+T = TypeVar("T")
+
+# 同时进行的发送请求数量上限（等待限流或重试时不占用名额）
+OUTBOUND_CONCURRENCY = 16
+# 连接错误的最大尝试次数
+MAX_ATTEMPTS = 5
+# 指数退避的基础间隔和上限（秒），实际等待在 [0, 上限] 内随机（full jitter）
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# 同一条消息最多因 RetryAfter 等待的次数
+MAX_FLOOD_WAITS = 3
+# RetryAfter 超过该秒数时直接放弃，避免一条消息长时间挂起
+MAX_RETRY_AFTER = 300
+
+# 不会因为重试而成功的错误：被踢出/禁言、群组不存在、参数错误等
+PERMANENT_ERRORS = (Forbidden, BadRequest, ChatMigrated, InvalidToken)
+# 表示机器人已无法在该群组发言的 BadRequest（其余 BadRequest 多半是消息内容本身的问题）
+CHAT_UNREACHABLE_MESSAGES = (
+    "chat not found",
+    "not enough rights",
+    "have no rights to send",
+    "chat_write_forbidden",
+    "chat_send_media_forbidden",
+    "group chat was deactivated",
+    "chat_restricted",
+)
+# 请求发出之前的连接错误（PTB 包装为 NetworkError/TimedOut，原始异常在 __cause__ 中）
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def is_permanent_error(error: BaseException) -> bool:
+    """判断发送错误是否为永久性错误（重试无意义）"""
+    return isinstance(error, PERMANENT_ERRORS)
+
+
+def is_chat_unreachable(error: BaseException) -> bool:
+    """判断错误是否说明机器人已无法向该群组发送消息（被踢出、群组已解散、被禁止发言）
+
+    群组升级为超级群组（ChatMigrated）不算：应改用新 ID 重发。
+    """
+    if isinstance(error, Forbidden):
+        return True
+    if isinstance(error, BadRequest):
+        message = str(error).lower()
+        return any(marker in message for marker in CHAT_UNREACHABLE_MESSAGES)
+    return False
+
+
+def is_unsent_error(error: BaseException) -> bool:
+    """判断网络错误是否发生在请求发出之前，此时重试不会重复发送"""
+    return isinstance(error.__cause__, UNSENT_ERRORS)
+
+
+def backoff_delay(attempt: int) -> float:
+    """第 attempt 次失败后的等待时间（full jitter 指数退避）"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+class OutboundQueue:
+    """统一的消息发送出口：按群组限流，遵守 RetryAfter，对连接错误退避重试
+
+    发送消息不是幂等的：读取超时等请求已发出后的错误可能已经送达，不重试。
+    """
+
+    def __init__(self, application: Application, concurrency: int = OUTBOUND_CONCURRENCY):
+        self.limiter = get_rate_limiter(application)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.sent = 0
+        self.retries = 0
+        self.flood_waits = 0
+        self.gave_up = 0
+
+    async def send(self, chat_id: int, request: Callable[[], Awaitable[T]], description: str = "消息") -> T:
+        """发送一条消息，返回 request 的结果；永久性错误或重试用尽时抛出最后一次的异常"""
+        attempt = 0
+        flood_waits = 0
+        while True:
+            await self.limiter.acquire(chat_id)
+            try:
+                async with self._semaphore:
+                    result = await request()
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                flood_waits += 1
+                retry_after = float(e.retry_after)
+                if flood_waits > MAX_FLOOD_WAITS or retry_after > MAX_RETRY_AFTER:
+                    self.gave_up += 1
+                    raise
+                self.flood_waits += 1
+                # 只暂停这个群组，其他群组照常发送
+                self.limiter.pause_chat(chat_id, retry_after)
+                log_warning(f"向 {chat_id} 发送{description}被限流，{retry_after:.0f} 秒后重试")
+            except PERMANENT_ERRORS:
+                self.gave_up += 1
+                raise
+            except NetworkError as e:
+                # 请求已发出后超时或断开时消息可能已经送达，重试会重复发送
+                attempt += 1
+                if attempt >= MAX_ATTEMPTS or not is_unsent_error(e):
+                    self.gave_up += 1
+                    raise
+                self.retries += 1
+                delay = backoff_delay(attempt)
+                log_warning(f"向 {chat_id} 发送{description}失败（第 {attempt} 次）: {e}，{delay:.1f} 秒后重试")
+                await asyncio.sleep(delay)
+
+
+_queues: "weakref.WeakKeyDictionary[Application, OutboundQueue]" = weakref.WeakKeyDictionary()
+
+
+def get_outbound_queue(application: Application) -> OutboundQueue:
+    """获取 application 共享的发送队列"""
+    queue = _queues.get(application)
+    if queue is None:
+        queue = _queues[application] = OutboundQueue(application)
+    return queue
@@ -0,0 +1,265 @@
+import multiprocessing
+import re
+import time
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python 3.10 及以下
+    import sre_parse
+
+from src.utils.logger import log_warning
+from src.utils.text_normalizer import normalize, normalize_pattern
+
+MATCH_SUBSTRING = 'substring'
+MATCH_WILDCARD = 'wildcard'
+MATCH_REGEX = 'regex'
+MATCH_WORD = 'word'
+MATCH_TYPES = (MATCH_SUBSTRING, MATCH_WILDCARD, MATCH_REGEX, MATCH_WORD)
+
+MATCH_TYPE_NAMES = {
+    MATCH_SUBSTRING: '包含',
+    MATCH_WILDCARD: '通配符',
+    MATCH_REGEX: '正则',
+    MATCH_WORD: '整词',
+}
+
+# Telegram 单条消息最多 4096 字符，超出部分不参与模式匹配
+MAX_SCAN_LENGTH = 4096
+MAX_PATTERN_LENGTH = 200
+# 通配符 * 最多跨越的字符数，保证每个起点的尝试次数有上限
+MAX_WILDCARD_GAP = 32
+# 通配符规则最多包含的 * 个数：每个 * 的尝试次数相乘，3 个时 33^3 已超过 MAX_BACKTRACK_COST
+MAX_WILDCARD_STARS = 2
+# 添加规则时用构造的最坏输入试跑，超过该耗时的规则被拒绝
+INSERT_PROBE_LIMIT = 0.02
+# 试跑在子进程中进行，超过该时间（含进程启动）直接终止并拒绝规则
+PROBE_TIMEOUT = 3.0
+# 每个起点的回溯次数估计上限：同一序列中可变量词的跨度相乘，无上限量词按 MAX_SCAN_LENGTH 计
+MAX_BACKTRACK_COST = MAX_SCAN_LENGTH
+# 每条消息模式匹配的耗时预算，连续超出多次后停用该群组的模式规则
+MESSAGE_TIME_BUDGET = 0.005
+MAX_BUDGET_OVERRUNS = 3
+
+_REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT}
+_REPEATS.update(op for op in (getattr(sre_parse, 'POSSESSIVE_REPEAT', None),) if op is not None)
+
+
+class UnsafePatternError(ValueError):
+    """规则无法编译或可能导致回溯爆炸"""
+
+
+def _is_variable_repeat(op, av) -> bool:
+    return op in _REPEATS and av[1] > 1 and av[0] != av[1]
+
+
+def _iter_nodes(parsed):
+    """深度优先遍历正则语法树，返回 (操作, 参数)"""
+    for op, av in parsed:
+        yield op, av
+        if op in _REPEATS:
+            yield from _iter_nodes(av[2])
+        elif op is sre_parse.SUBPATTERN:
+            yield from _iter_nodes(av[3])
+        elif op is sre_parse.BRANCH:
+            for branch in av[1]:
+                yield from _iter_nodes(branch)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            yield from _iter_nodes(av[1])
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            yield from _iter_nodes(av)
+
+
+def _backtrack_cost(parsed) -> int:
+    """估算从一个起点开始最多的尝试次数：顺序节点相乘，分支取最大值"""
+    cost = 1
+    for op, av in parsed:
+        if op in _REPEATS:
+            span = MAX_SCAN_LENGTH if av[1] == sre_parse.MAXREPEAT else av[1] - av[0] + 1
+            cost *= span * _backtrack_cost(av[2])
+        elif op is sre_parse.SUBPATTERN:
+            cost *= _backtrack_cost(av[3])
+        elif op is sre_parse.BRANCH:
+            cost *= max(_backtrack_cost(branch) for branch in av[1])
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            cost *= _backtrack_cost(av[1])
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            cost *= _backtrack_cost(av)
+    return cost
+
+
+def _check_structure(source: str) -> None:
+    """拒绝回溯次数可能随输入指数增长的结构"""
+    try:
+        parsed = sre_parse.parse(source)
+    except re.error as e:
+        raise UnsafePatternError(f"正则表达式无效: {e}")
+    if parsed.state.groupdict:
+        raise UnsafePatternError("不支持命名分组")
+    for op, av in _iter_nodes(parsed):
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            raise UnsafePatternError("不支持反向引用")
+        if not _is_variable_repeat(op, av):
+            continue
+        for inner_op, inner_av in _iter_nodes(av[2]):
+            if _is_variable_repeat(inner_op, inner_av):
+                raise UnsafePatternError("不支持嵌套的可变量词，如 (a+)+")
+            if inner_op is sre_parse.BRANCH:
+                raise UnsafePatternError("不支持量词内的分支，如 (a|ab)*")
+    # 相邻的可变量词（如 \\d+\\d+、.*.*）会在同一段输入上反复切分
+    if _backtrack_cost(parsed) > MAX_BACKTRACK_COST:
+        raise UnsafePatternError(
+            "最多只能使用一个无上限量词（+、*、{n,}），其余请改用有上限的量词，如 \\d{1,12}"
+        )
+
+
+def _probe_inputs(source: str) -> List[str]:
+    """构造容易触发大量回溯的输入"""
+    literals = ''.join(
+        chr(av) for op, av in _iter_nodes(sre_parse.parse(source)) if op is sre_parse.LITERAL
+    ) or 'a'
+    bases = (literals, 'a', '1', ' ', 'a ')
+    return [(base * (MAX_SCAN_LENGTH // len(base) + 1))[:MAX_SCAN_LENGTH - 1] + '!' for base in bases]
+
+
+def compile_rule(word: str, match_type: str) -> str:
+    """把禁言规则转换为正则表达式源码，并在添加时检查其安全性"""
+    if match_type == MATCH_WORD:
+        return rf"(?<!\w){re.escape(normalize(word, keep_separators=True))}(?!\w)"
+    if match_type == MATCH_WILDCARD:
+        if not word.strip('*?'):
+            raise UnsafePatternError("通配符规则至少需要包含一个普通字符")
+        # 连续的 * 等价于一个
+        word = re.sub(r'\*{2,}', '*', word)
+        if word.count('*') > MAX_WILDCARD_STARS:
+            raise UnsafePatternError(f"通配符规则最多只能包含 {MAX_WILDCARD_STARS} 个 *")
+        parts = []
+        for part in re.split(r'([*?])', word):
+            if part == '*':
+                parts.append(f'.{{0,{MAX_WILDCARD_GAP}}}?')
+            elif part == '?':
+                parts.append('.')
+            elif part:
+                parts.append(re.escape(normalize(part, keep_separators=True)))
+        return ''.join(parts)
+    if match_type != MATCH_REGEX:
+        raise UnsafePatternError(f"未知的规则类型: {match_type}")
+
+    if len(word) > MAX_PATTERN_LENGTH:
+        raise UnsafePatternError(f"正则表达式不能超过 {MAX_PATTERN_LENGTH} 个字符")
+    # 正则匹配的是归一化后（保留标点和空白）的文本，字面字符也按同样规则归一化
+    word = normalize_pattern(word)
+    _check_structure(word)
+    try:
+        # 按合并后的形式编译，提前发现行内全局标志等无法合并的写法
+        pattern = _compile_for_scan(word)
+    except re.error as e:
+        raise UnsafePatternError(f"正则表达式无效: {e}")
+    if pattern.search(''):
+        raise UnsafePatternError("正则表达式会匹配空消息")
+    return word
+
+
+def _compile_for_scan(source: str) -> re.Pattern:
+    return re.compile(f'(?P<p0>{source})', re.IGNORECASE | re.DOTALL)
+
+
+def _probe_worker(source: str, conn) -> None:
+    """子进程：用最坏输入试跑规则，返回最长耗时"""
+    pattern = _compile_for_scan(source)
+    worst = 0.0
+    for probe in _probe_inputs(source):
+        started = time.perf_counter()
+        pattern.search(probe)
+        worst = max(worst, time.perf_counter() - started)
+    conn.send(worst)
+    conn.close()
+
+
+@lru_cache(maxsize=64)
+def _probe_elapsed(source: str) -> float:
+    # Python 的 re 无法中断，只能在子进程中运行并在超时后终止进程
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_probe_worker, args=(source, sender), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(PROBE_TIMEOUT):
+            raise UnsafePatternError("规则匹配耗时过长，请减少通配符或改用有上限的量词，如 \\d{5,12}")
+        return receiver.recv()
+    except EOFError:
+        raise UnsafePatternError("正则表达式试跑失败")
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+
+
+def probe_rule(word: str, match_type: str) -> None:
+    """在子进程中用最坏输入试跑规则（有硬超时），耗时过长时抛出 UnsafePatternError
+
+    会阻塞调用线程直到试跑结束，需在线程池中调用。
+    """
+    source = compile_rule(word, match_type)
+    if _probe_elapsed(source) > INSERT_PROBE_LIMIT:
+        raise UnsafePatternError("规则匹配耗时过长，请减少通配符或改用有上限的量词，如 \\d{5,12}")
+
+
+class PatternSet:
+    """群组的所有模式规则合并成一个正则，每条消息只扫描一次"""
+
+    __slots__ = ("_entries", "_compiled", "_overruns", "disabled")
+
+    def __init__(self):
+        # (原始规则, 规则类型, 正则源码)
+        self._entries: List[Tuple[str, str, str]] = []
+        self._compiled: Optional[re.Pattern] = None
+        self._overruns = 0
+        self.disabled = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, word: str, match_type: str) -> None:
+        self._entries.append((word, match_type, compile_rule(word, match_type)))
+        self._compiled = None
+
+    def remove(self, word: str, match_type: str) -> None:
+        for index, entry in enumerate(self._entries):
+            if entry[0] == word and entry[1] == match_type:
+                del self._entries[index]
+                self._compiled = None
+                return
+
+    def _compile(self) -> re.Pattern:
+        if self._compiled is None:
+            self._compiled = re.compile(
+                '|'.join(f'(?P<p{index}>{entry[2]})' for index, entry in enumerate(self._entries)),
+                re.IGNORECASE | re.DOTALL
+            )
+        return self._compiled
+
+    def search(self, text: str) -> Optional[Tuple[str, str]]:
+        """返回命中的 (原始规则, 规则类型)，text 应已按 keep_separators 归一化"""
+        if not self._entries or self.disabled:
+            return None
+        pattern = self._compile()
+        started = time.perf_counter()
+        match = pattern.search(text, 0, MAX_SCAN_LENGTH)
+        elapsed = time.perf_counter() - started
+        if elapsed > MESSAGE_TIME_BUDGET:
+            self._overruns += 1
+            log_warning(f"模式规则匹配耗时 {elapsed * 1000:.1f}ms，超出预算"
+                        f"（{self._overruns}/{MAX_BUDGET_OVERRUNS}）")
+            if self._overruns >= MAX_BUDGET_OVERRUNS:
+                self.disabled = True
+                log_warning(f"模式规则多次超出耗时预算，已停用 {len(self._entries)} 条模式规则")
+        else:
+            self._overruns = 0
+        if match is None:
+            return None
+        word, match_type, _ = self._entries[int(match.lastgroup[1:])]
+        return word, match_type
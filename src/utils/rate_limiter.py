@@ -0,0 +1,102 @@
+import asyncio
+import time
+import weakref
+from typing import Dict
+
+from telegram.ext import Application
+
+# Telegram 发送限制：每个机器人约 30 条/秒，同一群组约 20 条/分钟
+GLOBAL_RATE = 25.0
+GLOBAL_BURST = 25
+CHAT_RATE = 20 / 60
+CHAT_BURST = 3
+# 群组令牌桶超过该数量时清理已经攒满（长时间未使用）的桶
+MAX_CHAT_BUCKETS = 5000
+
+
+class TokenBucket:
+    """令牌桶：按固定速率补充令牌，最多积攒 capacity 个"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at", "paused_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        """预定一个令牌，返回需要等待的秒数（令牌可以预支，等待期间其他调用者排在后面）"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """暂停 seconds 秒（收到 RetryAfter 时调用），已经在排队的调用者也会等待"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def remaining_pause(self) -> float:
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def is_idle(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+
+class RateLimiter:
+    """同时满足全局和单个群组发送限制的限流器"""
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, global_burst: float = GLOBAL_BURST,
+                 chat_rate: float = CHAT_RATE, chat_burst: float = CHAT_BURST):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+
+    def chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._prune()
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def pause_chat(self, chat_id: int, seconds: float) -> None:
+        """暂停向该群组发送 seconds 秒"""
+        self.chat_bucket(chat_id).pause(seconds)
+
+    def _prune(self) -> None:
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.is_idle()]:
+            del self._chat_buckets[chat_id]
+
+    async def acquire(self, chat_id: int) -> None:
+        """等待直到可以向该群组发送一条消息"""
+        # 先等群组令牌，避免在等待单个群组时占用全局令牌
+        bucket = self.chat_bucket(chat_id)
+        wait = bucket.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        # 该群组被限流时一直等到暂停结束，不影响其他群组
+        while (pause := bucket.remaining_pause()) > 0:
+            await asyncio.sleep(pause)
+        wait = self.global_bucket.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_limiters: "weakref.WeakKeyDictionary[Application, RateLimiter]" = weakref.WeakKeyDictionary()
+
+
+def get_rate_limiter(application: Application) -> RateLimiter:
+    """获取 application 共享的限流器（限制按机器人计算）"""
+    limiter = _limiters.get(application)
+    if limiter is None:
+        limiter = _limiters[application] = RateLimiter()
+    return limiter
@@ -0,0 +1,20 @@
+from telegram.request import HTTPXRequest
+
+
+class SharedHTTPXRequest(HTTPXRequest):
+    """可被多个 Bot 共享的请求对象，所有使用者关闭后才真正关闭连接池"""
+
+    __slots__ = ("_users",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._users = 0
+
+    async def initialize(self) -> None:
+        self._users += 1
+        await super().initialize()
+
+    async def shutdown(self) -> None:
+        self._users = max(0, self._users - 1)
+        if self._users == 0:
+            await super().shutdown()
@@ -0,0 +1,30 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """合并同一键的并发请求：进行中的请求完成前，后来的调用者共享同一个结果"""
+
+    __slots__ = ("_inflight", "calls", "shared")
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        # 复用进行中请求的调用次数
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 func()；同一键已有请求进行中时等待它的结果（包括异常）"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+        # 某个调用者被取消时不影响其他等待同一请求的调用者
+        return await asyncio.shield(task)
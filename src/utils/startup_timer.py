@@ -0,0 +1,30 @@
+import time
+from typing import List, Tuple
+
+from src.utils.logger import log_info
+
+# 进程启动后各阶段的耗时记录，用于定位冷启动瓶颈
+_started_at = time.perf_counter()
+_last_mark = _started_at
+_phases: List[Tuple[str, float]] = []
+_reported = False
+
+
+def mark(phase: str) -> None:
+    """记录从上一个阶段结束到现在的耗时"""
+    global _last_mark
+    now = time.perf_counter()
+    _phases.append((phase, now - _last_mark))
+    _last_mark = now
+
+
+def report() -> None:
+    """输出启动各阶段耗时（只输出一次）"""
+    global _reported
+    if _reported:
+        return
+    _reported = True
+    total = time.perf_counter() - _started_at
+    lines = [f"{phase}: {elapsed * 1000:.1f}ms" for phase, elapsed in _phases]
+    lines.append(f"总计: {total * 1000:.1f}ms")
+    log_info("启动耗时\n" + "\n".join(lines))
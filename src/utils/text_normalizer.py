@@ -0,0 +1,185 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+# 码表只覆盖垃圾消息常用的区段，避免启动时遍历整个 Unicode
+_COMPAT_RANGES = (
+    (0x2460, 0x24FF),    # 带圈字母数字 ①Ⓐⓐ
+    (0xFF01, 0xFF5E),    # 全角 ASCII
+    (0x1D400, 0x1D7FF),  # 数学字母数字 𝐀𝐚𝟎
+)
+_SEPARATOR_RANGES = (
+    (0x0000, 0x02FF),
+    (0x2000, 0x2BFF),
+    (0x3000, 0x303F),
+    (0xFE10, 0xFE6F),
+    (0xFF00, 0xFFEF),
+    (0x1F000, 0x1FAFF),  # emoji
+)
+_SEPARATOR_CATEGORIES = ('P', 'S', 'Z', 'Cc')
+
+_INVISIBLE_CHARS = (
+    '\u00ad\u034f\u061c\u115f\u1160\u17b4\u17b5\u180e'
+    '\u200b\u200c\u200d\u200e\u200f\u202a\u202b\u202c\u202d\u202e'
+    '\u2060\u2061\u2062\u2063\u2064\u3164\ufe0e\ufe0f\ufeff\uffa0'
+)
+_COMBINING_RANGE = (0x0300, 0x036F)
+
+# 西里尔/希腊字母中与拉丁字母同形的字符（小写，消息先转小写再查表）
+_HOMOGLYPHS = {
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'к': 'k', 'м': 'm', 'н': 'h', 'о': 'o',
+    'р': 'p', 'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'ѕ': 's', 'і': 'i', 'ї': 'i',
+    'ј': 'j', 'һ': 'h', 'ԁ': 'd', 'ԛ': 'q', 'ԝ': 'w', 'ɡ': 'g', 'ı': 'i',
+    'α': 'a', 'β': 'b', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o',
+    'ρ': 'p', 'τ': 't', 'υ': 'u', 'χ': 'x', 'ω': 'w',
+}
+
+# 常用繁体字到简体字的对照（每两个字符为一组：繁体、简体）
+_TRADITIONAL_PAIRS = (
+    '萬万與与專专業业東东絲丝兩两嚴严喪丧個个豐丰臨临為为麗丽舉举麼么義义烏乌樂乐喬乔'
+    '習习鄉乡書书買买亂乱爭争虧亏雲云亞亚產产畝亩親亲億亿僅仅從从倉仓儀仪們们價价眾众'
+    '優优會会傘伞偉伟傳传傷伤倫伦偽伪體体餘余備备憶忆兌兑黨党蘭兰關关興兴養养獸兽內内'
+    '岡冈冊册寫写軍军農农馮冯沖冲決决況况凍冻淨净涼凉減减湊凑凜凛幾几鳳凤憑凭凱凯擊击'
+    '鑿凿劃划劉刘則则剛刚創创刪删別别剎刹劑剂劍剑剝剥劇剧勸劝辦办務务動动勵励勁劲勞劳'
+    '勢势勳勋區区醫医華华協协單单賣卖盧卢衛卫卻却廠厂廳厅歷历厲厉壓压厭厌縣县參参雙双'
+    '發发變变敘叙疊叠號号嘆叹嚇吓嗎吗啟启吳吴嗚呜員员聽听響响啞哑問问喚唤團团園园圍围'
+    '國国圖图圓圆聖圣場场壞坏塊块堅坚壇坛塗涂墳坟壩坝執执報报墊垫處处複复夠够頭头夾夹'
+    '奪夺奮奋獎奖媽妈婦妇嬰婴孫孙學学寧宁寶宝實实寵宠審审憲宪對对導导尋寻將将屆届屬属'
+    '歲岁島岛嶺岭幣币帥帅師师帳帐帶带幫帮廣广庫库應应開开張张彈弹強强歸归錄录徹彻後后'
+    '徑径復复態态總总戀恋悅悦惡恶愛爱懷怀戰战戲戏戶户擁拥擇择掃扫揚扬換换損损搶抢據据'
+    '擔担擋挡撥拨擴扩攜携數数斷断無无時时晝昼顯显暫暂曆历術术機机殺杀雜杂權权條条來来'
+    '楊杨極极構构槍枪標标樣样橋桥檢检歡欢殘残毆殴氣气漢汉湯汤溝沟沒没滬沪準准滅灭潔洁'
+    '濟济濤涛濃浓澤泽淚泪灑洒灣湾災灾燈灯點点煉炼爐炉燒烧營营牆墙狀状獨独獄狱瑪玛環环'
+    '現现畫画當当療疗盜盗盤盘睜睁著着礦矿碼码確确禮礼禍祸種种稱称穩稳窮穷競竞筆笔簡简'
+    '節节範范築筑籃篮類类粵粤緊紧紅红約约級级紀纪純纯紙纸紛纷細细終终組组結结絕绝給给'
+    '統统經经綠绿線线練练網网緒绪編编緣缘縮缩績绩織织繼继續续罰罚羅罗聯联聲声職职肅肃'
+    '腦脑腳脚臉脸舊旧艦舰藝艺蘋苹萊莱蕭萧薦荐藥药蟲虫螢萤補补裝装製制見见規规視视覽览'
+    '覺觉觀观計计訂订認认討讨讓让訓训議议記记講讲許许論论設设訪访證证評评識识詞词試试'
+    '話话詳详語语誤误說说請请諸诸讀读課课調调談谈謝谢譯译護护貝贝負负財财貢贡貧贫貨货'
+    '販贩貪贪責责費费賀贺資资賓宾賺赚購购賞赏賠赔賭赌贏赢趙赵車车軟软輕轻載载輔辅輛辆'
+    '輪轮轉转這这進进遠远運运連连遲迟適适選选遺遗邊边郵邮鄧邓醬酱釋释針针釣钓鈴铃鉛铅'
+    '銀银銅铜銷销鋒锋鋼钢錢钱錯错鍵键鎖锁鏡镜鐘钟鐵铁長长門门閃闪閉闭閒闲間间閱阅闆板'
+    '隊队陽阳陰阴階阶際际陸陆險险隨随隱隐難难雞鸡雖虽電电霧雾靜静韓韩頁页頂顶項项順顺'
+    '須须預预領领頻频題题額额顏颜風风飛飞飯饭飲饮館馆饑饥馬马駕驾驗验騙骗鬥斗魚鱼鮮鲜'
+    '鳥鸟鴨鸭鵝鹅麥麦黃黄齊齐齒齿龍龙龜龟贈赠獲获贊赞訊讯'
+)
+
+
+SEPARATOR_RULE = "插入符号"
+
+
+@dataclass(frozen=True, slots=True)
+class NormalizationRule:
+    name: str
+    table: Dict[int, Optional[str]]
+
+
+def _iter_ranges(ranges: Iterable[Tuple[int, int]]):
+    for start, end in ranges:
+        yield from (chr(code) for code in range(start, end + 1))
+
+
+def _compat_table() -> Dict[int, Optional[str]]:
+    table = {}
+    for char in _iter_ranges(_COMPAT_RANGES):
+        folded = unicodedata.normalize('NFKC', char).lower()
+        if folded != char:
+            table[ord(char)] = folded
+    table[0x3000] = ' '
+    return table
+
+
+def _invisible_table() -> Dict[int, Optional[str]]:
+    table = {ord(char): None for char in _INVISIBLE_CHARS}
+    table.update((ord(char), None) for char in _iter_ranges((_COMBINING_RANGE,)))
+    return table
+
+
+def _separator_table() -> Dict[int, Optional[str]]:
+    return {
+        ord(char): None
+        for char in _iter_ranges(_SEPARATOR_RANGES)
+        if unicodedata.category(char).startswith(_SEPARATOR_CATEGORIES)
+    }
+
+
+def _traditional_table() -> Dict[int, Optional[str]]:
+    pairs = _TRADITIONAL_PAIRS
+    return {ord(pairs[i]): pairs[i + 1] for i in range(0, len(pairs), 2)}
+
+
+@lru_cache(maxsize=1)
+def get_rules() -> Tuple[NormalizationRule, ...]:
+    """归一化规则，按应用顺序排列（首次使用时构建）"""
+    return (
+        NormalizationRule("全角/兼容字符", _compat_table()),
+        NormalizationRule("不可见字符", _invisible_table()),
+        NormalizationRule("形近字母", {ord(k): v for k, v in _HOMOGLYPHS.items()}),
+        NormalizationRule(SEPARATOR_RULE, _separator_table()),
+        NormalizationRule("繁体字", _traditional_table()),
+    )
+
+
+def _compose(rules: Tuple[NormalizationRule, ...]) -> Dict[int, Optional[str]]:
+    """把多条规则合成一张码表，使归一化只需一次 str.translate"""
+    combined: Dict[int, Optional[str]] = {}
+    for code in {code for rule in rules for code in rule.table}:
+        value = chr(code)
+        for rule in rules:
+            value = value.translate(rule.table)
+        combined[code] = value or None
+    return combined
+
+
+@lru_cache(maxsize=1)
+def _combined_table() -> Dict[int, Optional[str]]:
+    return _compose(get_rules())
+
+
+@lru_cache(maxsize=None)
+def _table_without(rule_name: str) -> Dict[int, Optional[str]]:
+    """去掉某条规则后的合成码表，用于判断命中依赖了哪条规则"""
+    return _compose(tuple(rule for rule in get_rules() if rule.name != rule_name))
+
+
+def normalize(text: str, keep_separators: bool = False) -> str:
+    """转小写并按码表归一化，消息和禁言词使用同一套规则
+
+    keep_separators 为 True 时保留标点和空白，供需要判断单词边界的模式规则使用。
+    """
+    table = _table_without(SEPARATOR_RULE) if keep_separators else _combined_table()
+    return text.lower().translate(table)
+
+
+def normalize_pattern(source: str) -> str:
+    """按 normalize(keep_separators=True) 的规则归一化正则源码中的字面字符
+
+    反斜杠转义（如 \\D、\\uFF21）原样保留。正则匹配的是 normalize(text, keep_separators=True)
+    的结果：已转小写、全角/繁体/形近字已替换，但保留标点和空白。
+    """
+    table = _table_without(SEPARATOR_RULE)
+    parts = []
+    escaped = False
+    for char in source:
+        if escaped:
+            parts.append(char)
+            escaped = False
+        elif char == '\\':
+            parts.append(char)
+            escaped = True
+        else:
+            mapped = char.lower().translate(table)
+            # 全角括号等归一化后可能变成元字符，需要转义以保持字面含义
+            parts.append(re.escape(mapped) if mapped != char else char)
+    return ''.join(parts)
+
+
+def fired_rules(text: str, word: str) -> Tuple[str, ...]:
+    """返回命中 word 所依赖的归一化规则（去掉该规则后就无法命中），仅在命中后调用"""
+    lowered = text.lower()
+    return tuple(
+        rule.name for rule in get_rules()
+        if word not in lowered.translate(_table_without(rule.name))
+    )
@@ -0,0 +1,14 @@
+import pytest
+
+
+class FakeApplication:
+    """测试用的 application：只有 bot_data 和 bot（WeakKeyDictionary 需要可弱引用的对象）"""
+
+    def __init__(self, bot=None):
+        self.bot_data = {}
+        self.bot = bot
+
+
+@pytest.fixture
+def make_app():
+    return FakeApplication
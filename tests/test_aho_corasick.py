@@ -0,0 +1,28 @@
+from src.utils.aho_corasick import AhoCorasick
+
+
+def test_finds_all_keywords_in_one_scan():
+    automaton = AhoCorasick(['he', 'she', 'his', 'hers'])
+    assert list(automaton.iter_matches('ushers')) == [(3, 'she'), (5, 'hers')]
+    assert automaton.search('ahishers') == 'his'
+    assert automaton.search('nothing') is None
+
+
+def test_longest_keyword_wins_at_the_same_position():
+    automaton = AhoCorasick(['信', '微信'])
+    assert list(automaton.iter_matches('加微信')) == [(2, '微信')]
+
+
+def test_incremental_add_and_remove():
+    automaton = AhoCorasick(['abc'])
+    assert automaton.search('xabcx') == 'abc'
+    assert automaton.add('bc')
+    assert not automaton.add('bc')
+    assert not automaton.add('')
+    assert automaton.search('xbcx') == 'bc'
+    assert automaton.remove('abc')
+    assert not automaton.remove('abc')
+    # 删除后共享前缀的节点仍在，但不再输出
+    assert list(automaton.iter_matches('abc')) == [(2, 'bc')]
+    assert 'abc' not in automaton and 'bc' in automaton
+    assert len(automaton) == 1
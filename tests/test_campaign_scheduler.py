@@ -0,0 +1,79 @@
+import time
+from datetime import datetime
+
+from src.models.chat_group import ChatGroup
+from src.repositories.data_repository import DataRepository
+from src.services.campaign_scheduler import CampaignScheduler
+from src.services.message_service import MessageService
+from src.utils.cron import CronExpression, parse_quiet_hours
+
+
+def brute_force_next_send(scheduler, group_id, after):
+    """逐个触发时间检查免打扰时段，作为跳跃搜索的对照"""
+    cron, quiet_hours = scheduler._schedules[group_id]
+    moment = datetime.fromtimestamp(after, scheduler.tz)
+    offset = scheduler.stagger_offset(group_id)
+    for _ in range(100000):
+        moment = cron.next_after(moment)
+        send_at = moment.timestamp() + offset
+        if not quiet_hours.contains(datetime.fromtimestamp(send_at, scheduler.tz)):
+            return send_at, moment.timestamp()
+    return None
+
+
+def test_quiet_skip_matches_brute_force(make_app):
+    scheduler = CampaignScheduler(make_app())
+    start = datetime(2026, 3, 1, 20, 0, tzinfo=scheduler.tz).timestamp()
+    cases = [('*/5 * * * *', '23:00-08:00'), ('0 */2 * * *', '22:30-09:10'), ('*/7 * * * *', '08:00-20:00')]
+    for expression, quiet in cases:
+        for group_id in range(-1000, -980):
+            scheduler._schedules[group_id] = (CronExpression(expression), parse_quiet_hours(quiet))
+            after = start
+            for _ in range(5):
+                expected = brute_force_next_send(scheduler, group_id, after)
+                assert scheduler._next_send(group_id, after) == expected
+                after = expected[1]
+
+
+def test_all_quiet_schedule_is_detected_once(make_app):
+    scheduler = CampaignScheduler(make_app())
+    cron = CronExpression('0 */2 * * *')
+    assert scheduler._always_quiet(cron, parse_quiet_hours('00:00-23:59'))
+    # 23:59-00:00 不在免打扰时段内，但错开偏移最多 10 分钟，00:00 触发的群组仍可能发送
+    assert not scheduler._always_quiet(CronExpression('59 23 * * *'), parse_quiet_hours('00:00-23:59'))
+    assert not scheduler._always_quiet(cron, None)
+
+
+async def test_reload_with_all_quiet_groups_is_fast(make_app, monkeypatch):
+    app = make_app()
+    repository = DataRepository(app)
+    for index in range(800):
+        await repository.save_group(ChatGroup(id=-100 - index, title=f'g{index}', type='supergroup', is_ad_group=True))
+    await repository.set_quiet_hours('00:00-23:59')
+
+    async def fail(self):
+        raise AssertionError('reload 不应逐个群组记录日志')
+    monkeypatch.setattr(MessageService, 'get_ad_groups', fail)
+
+    scheduler = CampaignScheduler(app)
+    started = time.perf_counter()
+    await scheduler.reload()
+    assert time.perf_counter() - started < 1.0
+    assert len(scheduler._schedules) == 800
+    assert scheduler.scheduled_groups == 0
+
+    # 免打扰时段缩短后正常调度
+    await repository.set_quiet_hours('23:00-08:00')
+    await scheduler.reload()
+    assert scheduler.scheduled_groups == 800
+    for send_at, _, _ in scheduler._heap:
+        assert not parse_quiet_hours('23:00-08:00').contains(datetime.fromtimestamp(send_at, scheduler.tz))
+
+
+def test_day_constrained_quiet_search_is_bounded(make_app):
+    scheduler = CampaignScheduler(make_app())
+    # 每年只在 1 月 1 日 03:00 触发且总落在免打扰时段：跳过次数有上限，不会一直查找
+    scheduler._schedules[-1] = (CronExpression('0 3 1 1 *'), parse_quiet_hours('02:00-05:00'))
+    started = time.perf_counter()
+    assert scheduler._next_send(-1, time.time()) is None
+    assert time.perf_counter() - started < 1.0
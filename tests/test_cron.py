@@ -0,0 +1,53 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.utils.cron import CronError, CronExpression, QuietHours, parse_quiet_hours
+
+TZ = ZoneInfo('Asia/Shanghai')
+
+
+def at(*args):
+    return datetime(*args, tzinfo=TZ)
+
+
+def test_next_after_steps_and_ranges():
+    cron = CronExpression('0 */2 * * *')
+    assert cron.next_after(at(2026, 1, 1, 0, 0)) == at(2026, 1, 1, 2, 0)
+    assert cron.next_after(at(2026, 1, 1, 23, 30)) == at(2026, 1, 2, 0, 0)
+    assert CronExpression('30 9 * * 1-5').next_after(at(2026, 1, 2, 10, 0)) == at(2026, 1, 5, 9, 30)
+
+
+def test_day_and_weekday_match_either():
+    # 1 日或星期日
+    cron = CronExpression('0 0 1 * 0')
+    assert cron.next_after(at(2026, 1, 1, 0, 0)) == at(2026, 1, 4, 0, 0)
+
+
+def test_invalid_expressions():
+    with pytest.raises(CronError):
+        CronExpression('0 24 * * *')
+    with pytest.raises(CronError):
+        CronExpression('* * *')
+    with pytest.raises(CronError):
+        CronExpression('0 0 30 2 *').next_after(at(2026, 1, 1))
+
+
+def test_quiet_hours_across_midnight():
+    quiet = parse_quiet_hours('23:00-08:00')
+    assert quiet.contains(at(2026, 1, 1, 23, 0))
+    assert quiet.contains(at(2026, 1, 1, 7, 59))
+    assert not quiet.contains(at(2026, 1, 1, 8, 0))
+    assert quiet.end_after(at(2026, 1, 1, 23, 30)) == at(2026, 1, 2, 8, 0)
+    assert quiet.end_after(at(2026, 1, 2, 3, 0)) == at(2026, 1, 2, 8, 0)
+    assert quiet.covers(23 * 60, 60)
+    assert not quiet.covers(7 * 60 + 55, 10)
+
+
+def test_quiet_hours_parse_errors():
+    assert parse_quiet_hours('') is None
+    with pytest.raises(CronError):
+        QuietHours.parse('08:00-08:00')
+    with pytest.raises(CronError):
+        QuietHours.parse('25:00-08:00')
@@ -0,0 +1,70 @@
+import random
+
+from src.models.ad import Advertisement
+from src.repositories.data_repository import DataRepository
+
+
+def make_ad(ad_id):
+    return Advertisement(media_id='m', media_type='photo', welcome_text='', ad_text=ad_id, buttons=[], id=ad_id)
+
+
+async def make_repository(make_app, count):
+    repository = DataRepository(make_app())
+    for index in range(count):
+        await repository.save_ad(make_ad(f'ad{index}'))
+    return repository
+
+
+async def rotated_ids(repository, times):
+    return [(await repository.rotate_ad())[0].id for _ in range(times)]
+
+
+async def test_delete_keeps_rotation_order(make_app):
+    repository = await make_repository(make_app, 5)
+    assert await rotated_ids(repository, 2) == ['ad0', 'ad1']
+    # 删除刚轮询到的广告和之前的广告，下一个仍是 ad2
+    assert await repository.delete_ad('ad1')
+    assert await repository.delete_ad('ad0')
+    assert not await repository.delete_ad('ad0')
+    assert await repository.get_ad_count() == 3
+    assert [ad.id for ad in await repository.get_all_ads()] == ['ad2', 'ad3', 'ad4']
+    assert await rotated_ids(repository, 4) == ['ad2', 'ad3', 'ad4', 'ad2']
+
+    await repository.save_ad(make_ad('ad5'))
+    await repository.delete_ad('ad3')
+    assert (await repository.get_ad_at(2)).id == 'ad5'
+    assert await rotated_ids(repository, 2) == ['ad4', 'ad5']
+
+
+async def test_saved_ad_keeps_position_after_deletes(make_app):
+    repository = await make_repository(make_app, 3)
+    await repository.delete_ad('ad0')
+    await repository.save_ad(make_ad('ad2'))
+    await repository.save_ad(make_ad('ad3'))
+    assert [ad.id for ad in await repository.get_all_ads()] == ['ad1', 'ad2', 'ad3']
+
+
+async def test_delete_leaves_a_tombstone_and_compacts_lazily(make_app):
+    repository = await make_repository(make_app, 6)
+    ad_order = repository.app.bot_data['ad_order']
+    # 删除不移动其余元素，只留下空位
+    await repository.delete_ad('ad2')
+    assert ad_order == ['ad0', 'ad1', None, 'ad3', 'ad4', 'ad5']
+    await repository.delete_ad('ad4')
+    await repository.delete_ad('ad0')
+    assert ad_order == [None, 'ad1', None, 'ad3', None, 'ad5']
+    # 空位多于剩余广告时压缩
+    await repository.delete_ad('ad5')
+    assert ad_order == ['ad1', 'ad3']
+    assert repository.app.bot_data['ad_order'] is ad_order
+
+
+async def test_many_random_deletes(make_app):
+    repository = await make_repository(make_app, 2000)
+    ad_ids = [f'ad{index}' for index in range(2000)]
+    random.Random(1).shuffle(ad_ids)
+    for ad_id in ad_ids[:1990]:
+        assert await repository.delete_ad(ad_id)
+    remaining = [f'ad{index}' for index in range(2000) if f'ad{index}' in ad_ids[1990:]]
+    assert [ad.id for ad in await repository.get_all_ads()] == remaining
+    assert len(repository.app.bot_data['ad_order']) <= 2 * len(remaining)
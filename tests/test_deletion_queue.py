@@ -0,0 +1,59 @@
+import asyncio
+
+from src.utils.deletion_queue import DELETE_BATCH_SIZE, DeletionQueue
+
+
+class DeleteBot:
+    def __init__(self):
+        self.single = []
+        self.batches = []
+
+    async def delete_message(self, chat_id, message_id):
+        self.single.append((chat_id, message_id))
+
+    async def delete_messages(self, chat_id, message_ids):
+        self.batches.append((chat_id, list(message_ids)))
+
+
+def cancel_timers(queue):
+    """取消仍在等待窗口结束的任务，避免测试结束时留下未完成的任务"""
+    for task in queue._tasks:
+        task.cancel()
+
+
+async def test_deletes_in_the_window_are_batched_per_chat(make_app):
+    bot = DeleteBot()
+    queue = DeletionQueue(make_app(bot), window=0.01)
+    for message_id in (1, 2, 3):
+        queue.delete(-1, message_id)
+    queue.delete(-2, 9)
+    await asyncio.sleep(0.05)
+    assert bot.batches == [(-1, [1, 2, 3])]
+    assert bot.single == [(-2, 9)]
+    assert (queue.requests, queue.deleted) == (2, 4)
+
+
+async def test_full_batch_is_sent_without_waiting(make_app):
+    bot = DeleteBot()
+    queue = DeletionQueue(make_app(bot), window=60)
+    for message_id in range(DELETE_BATCH_SIZE):
+        queue.delete(-1, message_id)
+    await asyncio.sleep(0)
+    assert bot.batches == [(-1, list(range(DELETE_BATCH_SIZE)))]
+    await queue.flush_all()
+    assert len(bot.batches) == 1
+    cancel_timers(queue)
+
+
+async def test_flush_all_sends_delayed_deletes_early(make_app):
+    bot = DeleteBot()
+    queue = DeletionQueue(make_app(bot), window=60)
+    queue.delete_later(-1, 1, delay=3600)
+    queue.delete_later(-1, 1, delay=3600)
+    queue.delete_later(-1, 2, delay=3600)
+    queue.delete(-2, 5)
+    await queue.flush_all()
+    assert bot.batches == [(-1, [1, 2])]
+    assert bot.single == [(-2, 5)]
+    assert not queue._delayed
+    cancel_timers(queue)
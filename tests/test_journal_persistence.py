@@ -0,0 +1,91 @@
+from src.repositories import journal_persistence
+from src.repositories.journal_persistence import JournalPersistence
+
+
+async def reopen(path):
+    persistence = JournalPersistence(str(path), compact_threshold=1 << 30)
+    return await persistence.get_user_data(), persistence
+
+
+async def test_journal_replay_survives_restart(tmp_path):
+    path = tmp_path / 'data'
+    persistence = JournalPersistence(str(path), compact_threshold=1 << 30)
+    await persistence.get_user_data()
+    await persistence.update_user_data(1, {'n': 1})
+    await persistence.update_user_data(2, {'n': 2})
+    await persistence.drop_user_data(1)
+    await persistence.flush()
+    # 末尾写了一半的记录会被截断
+    with persistence.journal_path.open('ab') as file:
+        file.write(b'\x80\x05broken')
+
+    user_data, reopened = await reopen(path)
+    assert user_data == {2: {'n': 2}}
+    await reopened.flush()
+
+
+async def test_compaction_merges_journal_into_snapshot(tmp_path):
+    path = tmp_path / 'data'
+    persistence = JournalPersistence(str(path), compact_threshold=1)
+    await persistence.get_user_data()
+    for user_id in range(5):
+        await persistence.update_user_data(user_id, {'n': user_id})
+    await persistence.flush()
+    assert persistence.snapshot_path.exists()
+    assert not persistence.old_journal_path.exists()
+
+    user_data, reopened = await reopen(path)
+    assert user_data == {user_id: {'n': user_id} for user_id in range(5)}
+    await reopened.flush()
+
+
+async def test_failed_compaction_keeps_unmerged_records(tmp_path, monkeypatch):
+    path = tmp_path / 'data'
+    persistence = JournalPersistence(str(path), compact_threshold=1)
+    await persistence.get_user_data()
+
+    real_write_snapshot = journal_persistence._write_snapshot
+    failures = []
+
+    def failing_write_snapshot(*args, **kwargs):
+        if not failures:
+            failures.append(True)
+            raise OSError('disk full')
+        return real_write_snapshot(*args, **kwargs)
+
+    monkeypatch.setattr(journal_persistence, '_write_snapshot', failing_write_snapshot)
+    await persistence.update_user_data(1, {'n': 1})
+    await persistence._compaction_task
+    # 第一次合并失败，旧日志保留
+    assert persistence.old_journal_path.exists()
+
+    # 下一次切换不能覆盖未合并的旧日志
+    await persistence.update_user_data(2, {'n': 2})
+    await persistence.flush()
+    assert not persistence.old_journal_path.exists()
+
+    user_data, reopened = await reopen(path)
+    assert user_data == {1: {'n': 1}, 2: {'n': 2}}
+    await reopened.flush()
+
+
+async def test_leftover_old_journal_is_merged_on_startup(tmp_path, monkeypatch):
+    path = tmp_path / 'data'
+    persistence = JournalPersistence(str(path), compact_threshold=1)
+    await persistence.get_user_data()
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(journal_persistence, '_write_snapshot', fail)
+    await persistence.update_user_data(1, {'n': 1})
+    await persistence._compaction_task
+    await persistence.update_user_data(2, {'n': 2})
+    await persistence.flush()
+    assert persistence.old_journal_path.exists()
+    monkeypatch.undo()
+
+    user_data, reopened = await reopen(path)
+    assert user_data == {1: {'n': 1}, 2: {'n': 2}}
+    assert not reopened.old_journal_path.exists()
+    await reopened.flush()
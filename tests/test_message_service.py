@@ -0,0 +1,58 @@
+import asyncio
+
+from src.repositories.data_repository import DataRepository
+from src.services.message_service import MessageService
+
+CHANNEL_ID = -1001
+
+
+class ChatMember:
+    def __init__(self, status):
+        self.status = status
+
+
+class MemberBot:
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return ChatMember(self.statuses.pop(0))
+
+
+async def make_service(make_app):
+    repository = DataRepository(make_app())
+    await repository.set_target_channel(CHANNEL_ID)
+    return MessageService(repository)
+
+
+async def test_api_results_expire_with_the_cache_ttl(make_app):
+    service = await make_service(make_app)
+    bot = MemberBot('left', 'member')
+    assert await service.check_channel_subscription(5, bot) is False
+    assert await service.check_channel_subscription(5, bot) is False
+    assert bot.calls == 1
+    # 负结果的 TTL 到期后重新查询，成员表中没有查询结果
+    service.get_subscription_cache().clear()
+    assert await service.check_channel_subscription(5, bot) is True
+    assert bot.calls == 2
+    assert service.get_subscription_stats()['members_known'] == 0
+
+
+async def test_chat_member_events_take_precedence(make_app):
+    service = await make_service(make_app)
+    bot = MemberBot('member')
+    assert await service.check_channel_subscription(5, bot) is True
+    service.record_channel_member(CHANNEL_ID, 5, 'left')
+    assert await service.check_channel_subscription(5, bot) is False
+    assert bot.calls == 1
+
+
+async def test_concurrent_checks_share_one_request(make_app):
+    service = await make_service(make_app)
+    bot = MemberBot('member')
+    results = await asyncio.gather(*(service.check_channel_subscription(7, bot) for _ in range(5)))
+    assert results == [True] * 5
+    assert bot.calls == 1
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from src.services.banned_word_service import BannedWordService
+from src.utils.pattern_rules import (
+    MATCH_REGEX,
+    MATCH_WILDCARD,
+    MAX_WILDCARD_STARS,
+    PatternSet,
+    UnsafePatternError,
+    compile_rule,
+)
+from src.utils.text_normalizer import normalize
+
+
+def search(patterns: PatternSet, text: str):
+    return patterns.search(normalize(text, keep_separators=True))
+
+
+@pytest.mark.parametrize('source', [r'\d+\d+x', r'.*.*a', r'(a+)+b', r'\w+\s*\d+'])
+def test_regex_with_stacked_unbounded_repeats_is_rejected(source):
+    started = time.perf_counter()
+    with pytest.raises(UnsafePatternError):
+        compile_rule(source, MATCH_REGEX)
+    assert time.perf_counter() - started < 0.1
+
+
+def test_wildcard_star_count_is_capped():
+    with pytest.raises(UnsafePatternError):
+        compile_rule('a*a*a*a*a*a*b', MATCH_WILDCARD)
+    with pytest.raises(UnsafePatternError):
+        PatternSet().add('a*a*a*a*a*a*b', MATCH_WILDCARD)
+
+
+def test_consecutive_stars_are_merged():
+    assert compile_rule('加**微*信', MATCH_WILDCARD).count('{0,') == MAX_WILDCARD_STARS
+
+
+def test_accepted_wildcard_stays_fast_on_worst_case_input():
+    patterns = PatternSet()
+    patterns.add('a*b*c', MATCH_WILDCARD)
+    started = time.perf_counter()
+    assert patterns.search('a' * 4096) is None
+    assert time.perf_counter() - started < 0.5
+
+
+async def test_slow_wildcard_is_rejected_by_probe():
+    # 两个 * 能通过静态检查，但在 'aaa…' 上的试跑超出耗时上限
+    assert await BannedWordService.validate_rule('a*a*b', MATCH_WILDCARD)
+    assert await BannedWordService.validate_rule('加*微信', MATCH_WILDCARD) is None
+
+
+def test_regex_literals_are_normalized():
+    patterns = PatternSet()
+    patterns.add('發財.{0,3}群', MATCH_REGEX)
+    patterns.add(r'ＶＩＰ\d{2,4}', MATCH_REGEX)
+    assert search(patterns, '发财 大群') == ('發財.{0,3}群', MATCH_REGEX)
+    assert search(patterns, 'ＶＩＰ888') == (r'ＶＩＰ\d{2,4}', MATCH_REGEX)
+
+
+def test_fullwidth_metacharacters_stay_literal():
+    assert compile_rule('（加）微信', MATCH_REGEX) == r'\(加\)微信'
+
+
+async def test_add_banned_word_validates_once_and_returns_the_error(make_app, monkeypatch):
+    import src.services.banned_word_service as module
+    from src.repositories.data_repository import DataRepository
+
+    probes = []
+    monkeypatch.setattr(module, 'probe_rule', lambda word, match_type: probes.append(word))
+    service = BannedWordService(DataRepository(make_app()))
+    assert await service.add_banned_word(r'\d+\d+x', 1, match_type=MATCH_REGEX)
+    assert await service.add_banned_word(r'vip\d{2,4}', 1, match_type=MATCH_REGEX) is None
+    assert probes == [r'vip\d{2,4}']
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from src.utils.single_flight import SingleFlight
+
+
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    started = []
+
+    async def fetch():
+        started.append(True)
+        await asyncio.sleep(0.01)
+        return 42
+
+    results = await asyncio.gather(*(flight.run('key', fetch) for _ in range(5)))
+    assert results == [42] * 5
+    assert len(started) == 1
+    assert (flight.calls, flight.shared) == (1, 4)
+    # 请求结束后不再复用
+    assert len(flight) == 0
+    assert await flight.run('key', fetch) == 42
+    assert len(started) == 2
+
+
+async def test_errors_are_shared_and_not_cached():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError('boom')
+
+    results = await asyncio.gather(flight.run('key', fail), flight.run('key', fail), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.calls == 1
+    with pytest.raises(RuntimeError):
+        await flight.run('key', fail)
+    assert flight.calls == 2
+
+
+async def test_cancelled_caller_does_not_cancel_others():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return 'done'
+
+    first = asyncio.create_task(flight.run('key', fetch))
+    second = asyncio.create_task(flight.run('key', fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == 'done'
+    with pytest.raises(asyncio.CancelledError):
+        await first
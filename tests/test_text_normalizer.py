@@ -0,0 +1,28 @@
+from src.utils.text_normalizer import SEPARATOR_RULE, fired_rules, normalize, normalize_pattern
+
+
+def test_normalize_folds_common_obfuscation():
+    assert normalize('ＶＸ') == 'vx'
+    assert normalize('𝐀𝐁') == 'ab'
+    assert normalize('微​信') == '微信'
+    # 西里尔字母 х
+    assert normalize('vх') == 'vx'
+    assert normalize('點擊') == '点击'
+    assert normalize('加 微-信') == '加微信'
+
+
+def test_keep_separators_keeps_word_boundaries():
+    assert normalize('Hello, World', keep_separators=True) == 'hello, world'
+    assert normalize('Hello, World') == 'helloworld'
+
+
+def test_fired_rules_names_the_rule_a_hit_depends_on():
+    assert fired_rules('加 微-信', '加微信') == (SEPARATOR_RULE,)
+    assert fired_rules('ＶＸ', 'vx') == ('全角/兼容字符',)
+    assert fired_rules('vx', 'vx') == ()
+
+
+def test_normalize_pattern_keeps_escapes_and_escapes_new_metacharacters():
+    assert normalize_pattern(r'Ｖ\DＸ') == r'v\Dx'
+    # 全角括号归一化为半角后按字面匹配
+    assert normalize_pattern('（') == r'\('
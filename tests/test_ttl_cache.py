@@ -0,0 +1,44 @@
+import pytest
+
+from src.utils import ttl_cache
+from src.utils.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_entries_expire_with_their_own_ttl(clock):
+    cache = TTLCache(10)
+    cache.set('short', 1, ttl=5)
+    cache.set('long', 2, ttl=60)
+    clock[0] += 10
+    assert cache.get('short') is None
+    assert cache.get('long') == 2
+    # 过期条目在读取时移除
+    assert len(cache) == 1
+
+
+def test_lru_eviction_keeps_recently_used(clock):
+    cache = TTLCache(2)
+    cache.set('a', 1, ttl=60)
+    cache.set('b', 2, ttl=60)
+    assert cache.get('a') == 1
+    cache.set('c', 3, ttl=60)
+    assert cache.get('b', 'missing') == 'missing'
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+
+def test_stats(clock):
+    cache = TTLCache(1)
+    cache.set('a', 1, ttl=60)
+    cache.get('a')
+    cache.get('b')
+    cache.set('b', 2, ttl=60)
+    assert cache.pop('b') == 2
+    assert cache.stats() == {
+        'size': 0, 'maxsize': 1, 'hits': 1, 'misses': 1, 'evictions': 1, 'hit_rate': 0.5,
+    }